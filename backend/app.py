@@ -2,6 +2,7 @@ import os
 from flask import Flask
 from flask_cors import CORS
 from flask_migrate import Migrate
+from werkzeug.middleware.proxy_fix import ProxyFix
 from dotenv import load_dotenv
 
 from backend.database import db
@@ -14,6 +15,7 @@ from backend.routes.study_groups import groups_bp
 from backend.routes.onboarding import onboarding_bp
 from backend.routes.gamification import gamification_bp, initialize_achievements
 from backend.config import DevelopmentConfig, ProductionConfig
+from backend.llm import configure_gateway
 from backend.utils.scheduler import start_scheduler
 
 # Load environment variables
@@ -32,12 +34,20 @@ def create_app():
     else:
         app.config.from_object(DevelopmentConfig)
 
+    # Behind a reverse proxy request.remote_addr is the proxy's; take the client's from its headers
+    hops = app.config.get('TRUSTED_PROXY_HOPS', 0)
+    if hops:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops)
+
     # Initialize database
     db.init_app(app)
     Migrate(app, db)
 
+    # Shared LLM client for chat and the scheduler
+    configure_gateway(app.config)
+
     # ✅ Proper CORS (let frontend call backend)
-    CORS(app, origins=["https://ai-study-coach.vercel.app", "https://ai-study-coach.onrender.com"], supports_credentials=True)
+    CORS(app, origins=["https://ai-study-coach.vercel.app", "https://ai-study-coach.onrender.com"], supports_credentials=True, expose_headers=["X-Next-Cursor", "X-Next-Offset", "X-Cache"])
     
     # Special handler for OPTIONS requests (preflight)
     @app.route('/', defaults={'path': ''}, methods=['OPTIONS'])
@@ -0,0 +1,95 @@
+"""Compare the materialized leaderboard with the old SQL leaderboard query.
+
+Usage (from the repository root):
+    python -m backend.benchmarks.bench_leaderboard --users 100000 1000000
+    python -m backend.benchmarks.bench_leaderboard --database-url postgresql://...
+
+The SQL side seeds `user` and `user_points` in the given database (in-memory
+SQLite by default) and times the ORDER BY total_points DESC LIMIT 10 join that
+/gamification/leaderboard used to run, plus a COUNT(*)-based rank lookup.
+The leaderboard side times the in-process skiplist store.
+"""
+import argparse
+import random
+import time
+from flask import Flask
+from sqlalchemy import insert, func
+from backend.database import db
+from backend.database.models import User, UserPoints
+from backend.utils.leaderboard import MemoryLeaderboard
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def seed(n_users, rng):
+    UserPoints.query.delete()
+    User.query.delete()
+    for start in range(0, n_users, 50000):
+        ids = range(start + 1, min(start + 50000, n_users) + 1)
+        db.session.execute(insert(User), [
+            {'id': i, 'username': f'user{i}', 'email': f'user{i}@example.com', 'password': 'x'} for i in ids
+        ])
+        db.session.execute(insert(UserPoints), [
+            {'user_id': i, 'total_points': rng.randint(0, 50000), 'level': 1} for i in ids
+        ])
+    db.session.commit()
+
+
+def bench(n_users, repeat, rng):
+    seed(n_users, rng)
+    probe_ids = [rng.randint(1, n_users) for _ in range(repeat)]
+
+    def sql_top10():
+        db.session.query(UserPoints, User.username).join(
+            User, UserPoints.user_id == User.id
+        ).order_by(UserPoints.total_points.desc()).limit(10).all()
+
+    def sql_rank():
+        user_id = rng.choice(probe_ids)
+        points = db.session.query(UserPoints.total_points).filter_by(user_id=user_id).scalar()
+        db.session.query(func.count(UserPoints.id)).filter(UserPoints.total_points > points).scalar()
+
+    board = MemoryLeaderboard()
+    load_start = time.perf_counter()
+    board.load(db.session.query(UserPoints.user_id, UserPoints.total_points).yield_per(10000))
+    load_ms = (time.perf_counter() - load_start) * 1000
+
+    results = {
+        'sql top-10': timed(sql_top10, repeat),
+        'sql rank': timed(sql_rank, repeat),
+        'skiplist top-10': timed(lambda: board.range(0, 10), repeat),
+        'skiplist rank': timed(lambda: board.rank(rng.choice(probe_ids)), repeat),
+        'skiplist page @50%': timed(lambda: board.range(n_users // 2, 50), repeat),
+        'skiplist update': timed(lambda: board.update(rng.choice(probe_ids), rng.randint(0, 50000)), repeat),
+    }
+    print(f"\n{n_users:,} users (skiplist load {load_ms:,.0f} ms)")
+    for name, ms in results.items():
+        print(f"  {name:<20} {ms:10.3f} ms/op")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--database-url', default='sqlite:///:memory:')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = args.database_url
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+
+    rng = random.Random(0)
+    with app.app_context():
+        db.create_all()
+        for n_users in args.users:
+            bench(n_users, args.repeat, rng)
+
+
+if __name__ == '__main__':
+    main()
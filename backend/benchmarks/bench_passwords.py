@@ -0,0 +1,67 @@
+"""Measure login throughput per core for the configured password hashing.
+
+Usage (from the repository root):
+    python -m backend.benchmarks.bench_passwords --scheme scrypt --target-ms 250 --clients 16
+
+Calibrates the cost for the scheme (or takes --cost), then has `--clients`
+threads verify passwords the way /auth/login does, once inline on the
+request threads and once through the process pool, and reports logins per
+second per core with median and p99 latency. The legacy pbkdf2 hashes the
+app stored before are measured too for comparison. Run it with
+--clients above the core count to see queueing at the p99.
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import generate_password_hash
+from backend.utils.passwords import PasswordHasher, calibrate, parse_cost
+
+
+def logins_per_second(hasher, stored, clients, logins):
+    def login(_):
+        started = time.perf_counter()
+        ok, _ = hasher.verify(stored, 'correct horse battery staple')
+        assert ok
+        return time.perf_counter() - started
+
+    hasher.verify(stored, 'correct horse battery staple')  # warm up (pool start-up)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(clients) as threads:
+        latencies = sorted(threads.map(login, range(logins)))
+    elapsed = time.perf_counter() - start
+    return logins / elapsed, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scheme', default='scrypt', choices=['scrypt', 'argon2', 'pbkdf2'])
+    parser.add_argument('--cost', help="fixed cost, e.g. '32768:8:1' (default: calibrate)")
+    parser.add_argument('--target-ms', type=float, default=250)
+    parser.add_argument('--clients', type=int, default=16, help='concurrent login requests')
+    parser.add_argument('--logins', type=int, default=64)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    cost = parse_cost(args.cost) if args.cost else calibrate(args.scheme, args.target_ms / 1000)
+    cores = args.workers
+    print(f"{args.scheme} cost {':'.join(map(str, cost))}, {cores} worker process(es), {args.clients} clients")
+
+    legacy = generate_password_hash('correct horse battery staple', method='pbkdf2:sha256')
+    runs = [('legacy pbkdf2, inline', PasswordHasher('pbkdf2', cost=legacy.split('$')[0].split(':')[2], workers=0),
+             legacy)]
+    for label, workers in (('inline', 0), ('pool', cores)):
+        hasher = PasswordHasher(args.scheme, cost=':'.join(map(str, cost)), workers=workers,
+                                max_pending=args.clients)
+        runs.append((label, hasher, hasher.hash('correct horse battery staple')))
+
+    for label, hasher, stored in runs:
+        rate, p50, p99 = logins_per_second(hasher, stored, args.clients, args.logins)
+        per_core = rate / (os.cpu_count() or 1)
+        print(f"{label:>22}: {rate:7.1f} logins/s ({per_core:.1f}/s per core), "
+              f"p50 {p50 * 1000:.0f} ms, p99 {p99 * 1000:.0f} ms")
+        hasher.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Measure how many users per second the local rescheduling solver plans.
+
+Usage (from the repository root):
+    python -m backend.benchmarks.bench_reschedule_solver --users 10000 --missed 3
+
+Every synthetic user gets a history of completed sessions clustered around a
+few habitual weekday/hour slots, some already-booked upcoming sessions and
+`--missed` sessions to place. No database or model calls are involved.
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from backend.utils.reschedule_solver import ReschedulingSolver, WEEKDAYS
+
+
+def synthetic_user(rng, now, history_size, missed_count):
+    habits = [(rng.randrange(7), rng.randrange(8, 22)) for _ in range(rng.randint(1, 4))]
+    history = []
+    for _ in range(history_size):
+        weekday, hour = rng.choice(habits)
+        history.append({"weekday": WEEKDAYS[weekday], "hour": hour, "subject": "Math", "duration": 60})
+    busy = [(now + timedelta(hours=rng.randrange(1, 168)), rng.choice([30, 60, 90])) for _ in range(rng.randint(0, 5))]
+    missed = [{"id": i, "duration": rng.choice([30, 45, 60, 90])} for i in range(missed_count)]
+    return history, missed, busy
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--missed', type=int, default=3, help='missed sessions per user')
+    parser.add_argument('--history', type=int, default=50, help='completed sessions per user')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    now = datetime.now()
+    users = [synthetic_user(rng, now, args.history, args.missed) for _ in range(args.users)]
+    solver = ReschedulingSolver()
+
+    start = time.perf_counter()
+    confidences = [solver.solve(history, missed, busy, now).confidence for history, missed, busy in users]
+    elapsed = time.perf_counter() - start
+
+    confident = sum(1 for c in confidences if c >= 0.6)
+    print(f"{args.users:,} users, {args.missed} missed each: {elapsed:.2f} s "
+          f"({args.users / elapsed:,.0f} users/s), {confident / args.users:.0%} above 0.6 confidence")
+
+
+if __name__ == '__main__':
+    main()
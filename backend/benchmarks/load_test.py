@@ -0,0 +1,309 @@
+"""Load-test /chat/ and the missed-session rescheduler against the fake OpenAI server.
+
+Usage (from the repository root):
+    python -m backend.benchmarks.load_test chat --qps 50 --duration 30 --latency lognormal:0.8,0.5
+    python -m backend.benchmarks.load_test chat --stream --qps 100 --error-rate 0.02 --rpm 3000
+    python -m backend.benchmarks.load_test chat --url http://127.0.0.1:5000 --qps 200
+    python -m backend.benchmarks.load_test reschedule --users 2000 --qps 20 --latency uniform:0.5,2
+
+`chat` is an open-loop asyncio driver: requests start on a fixed schedule
+whatever the response times, and latency is measured from the scheduled
+start, so a stalled server shows up as latency instead of as fewer requests.
+Without --url the app is served in-process (in a thread) with a fake OpenAI
+server behind it; with --url, point that server's OPENAI_BASE_URL at
+`python -m backend.tools.fake_openai` yourself.
+
+`reschedule` seeds users with missed sessions into DATABASE_URL (a temporary
+SQLite file by default), runs ai_reschedule_missed_sessions once with model
+requests paced at --qps and reports their latencies.
+"""
+import argparse
+import asyncio
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+import httpx
+from backend.tools.fake_openai import FakeOpenAIServer
+
+TOPICS = ['photosynthesis', 'integration by parts', 'the French revolution', 'linked lists', 'supply and demand',
+          'mitosis', 'Newton\'s laws', 'essay structure', 'organic chemistry', 'probability']
+
+
+class LatencyHistogram:
+    """Latencies in log-spaced buckets (each sqrt(2) wider than the last, from 1 ms) plus exact percentiles."""
+
+    BASE = 0.001
+
+    def __init__(self):
+        self.samples = []
+        self.buckets = Counter()
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+        self.buckets[self.bucket(seconds)] += 1
+
+    def bucket(self, seconds):
+        return max(0, int(math.floor(2 * math.log2(max(seconds, self.BASE) / self.BASE))))
+
+    def bound(self, bucket):
+        return self.BASE * 2 ** (bucket / 2)
+
+    def percentile(self, pct):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+    def summary(self):
+        return {
+            'count': len(self.samples),
+            'p50_ms': round(self.percentile(50) * 1000, 1),
+            'p90_ms': round(self.percentile(90) * 1000, 1),
+            'p99_ms': round(self.percentile(99) * 1000, 1),
+            'max_ms': round(max(self.samples, default=0) * 1000, 1),
+        }
+
+    def render(self, width=50):
+        if not self.buckets:
+            return '(no samples)'
+        peak = max(self.buckets.values())
+        lines = []
+        for bucket in range(min(self.buckets), max(self.buckets) + 1):
+            count = self.buckets.get(bucket, 0)
+            label = f"{self.bound(bucket) * 1000:>9.1f} - {self.bound(bucket + 1) * 1000:>9.1f} ms"
+            lines.append(f"{label} | {'#' * math.ceil(count / peak * width) if count else '':<{width}} {count}")
+        return '\n'.join(lines)
+
+
+class LoadResult:
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.first_byte = LatencyHistogram()
+        self.statuses = Counter()
+        self.elapsed = 0.0
+
+    def report(self, title):
+        sent = sum(self.statuses.values())
+        lines = [
+            f"== {title}: {sent} requests in {self.elapsed:.1f} s ({sent / self.elapsed if self.elapsed else 0:.1f}/s)",
+            f"status: {dict(self.statuses)}",
+            f"latency: {self.latency.summary()}",
+        ]
+        if self.first_byte.samples:
+            lines.append(f"first byte: {self.first_byte.summary()}")
+        lines.append(self.latency.render())
+        return '\n'.join(lines)
+
+
+async def drive(url, payload_for, qps, duration, concurrency=256, stream=False, headers=None):
+    """POST payload_for(i) to url at qps for duration seconds (open loop) and return a LoadResult.
+
+    At most `concurrency` requests are in flight; requests that wait for a
+    slot still count their wait as latency.
+    """
+    result = LoadResult()
+    loop = asyncio.get_running_loop()
+    slots = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(timeout=120, limits=limits, headers=headers) as client:
+        async def one(i, scheduled):
+            async with slots:
+                try:
+                    if stream:
+                        async with client.stream('POST', url, json=payload_for(i)) as response:
+                            first = True
+                            async for _ in response.aiter_bytes():
+                                if first:
+                                    result.first_byte.record(loop.time() - scheduled)
+                                    first = False
+                            status = response.status_code
+                    else:
+                        response = await client.post(url, json=payload_for(i))
+                        status = response.status_code
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+            result.latency.record(loop.time() - scheduled)
+            result.statuses[status] += 1
+
+        started = loop.time()
+        tasks = []
+        for i in range(max(1, int(qps * duration))):
+            scheduled = started + i / qps
+            delay = scheduled - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(one(i, scheduled)))
+        await asyncio.gather(*tasks)
+        result.elapsed = loop.time() - started
+    return result
+
+
+def fake_server(args, reply=None):
+    return FakeOpenAIServer(reply=reply, chunk_size=args.chunk_size, chunk_delay=args.chunk_delay,
+                            latency=args.latency, error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+                            rpm=args.rpm, seed=args.seed, keep_requests=False)
+
+
+def load_app(database_url, base_url, **env):
+    """Import the app configured for a load run; the config is read from the environment at import time."""
+    os.environ.update({
+        'DATABASE_URL': database_url,
+        'OPENAI_API_KEY': os.getenv('OPENAI_API_KEY') or 'fake',
+        'OPENAI_BASE_URL': base_url,
+        'USE_OPENAI_API': 'True',
+        'SCHEDULER_MODE': 'off',
+    }, **env)
+    from backend.app import app
+    return app
+
+
+def serve_in_thread(app):
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def run_chat(args):
+    fake, server = None, None
+    url = args.url
+    if url is None:
+        fake = fake_server(args, reply='Break the topic into small chunks and test yourself on each one.').start()
+        app = load_app(args.database_url or 'sqlite://', fake.base_url,
+                       CHAT_CACHE_BACKEND='memory' if args.cache else 'none',
+                       LLM_RATE_LIMIT_BACKEND='memory' if args.rate_limit else 'none')
+        server, url = serve_in_thread(app)
+
+    def payload_for(i):
+        return {'message': f"Question {i}: how should I revise {TOPICS[i % len(TOPICS)]}?"}
+
+    path = '/chat/stream' if args.stream else '/chat/'
+    try:
+        result = asyncio.run(drive(url.rstrip('/') + path, payload_for, args.qps, args.duration,
+                                   args.concurrency, args.stream))
+    finally:
+        if server is not None:
+            server.shutdown()
+        if fake is not None:
+            fake.stop()
+    print(result.report(f"POST {path} at {args.qps} qps"))
+    if fake is not None:
+        print(f"fake OpenAI: {fake.stats}")
+
+
+def seed_missed_sessions(db, n_users, missed, history, rng):
+    from sqlalchemy import insert
+    from backend.database.models import StudySession, User
+    now = datetime.now()
+    first_id = (db.session.query(db.func.max(User.id)).scalar() or 0) + 1
+    users, sessions = [], []
+    for user_id in range(first_id, first_id + n_users):
+        users.append({'id': user_id, 'username': f'load{user_id}', 'email': f'load{user_id}@example.com',
+                      'password': 'x'})
+        habits = [(rng.randrange(7), rng.randrange(8, 22)) for _ in range(rng.randint(1, 3))]
+        for _ in range(history):
+            weekday, hour = rng.choice(habits)
+            days_back = rng.randrange(1, 8) * 7 + (now.weekday() - weekday) % 7
+            when = (now - timedelta(days=days_back)).replace(hour=hour, minute=0, second=0, microsecond=0)
+            sessions.append({'user_id': user_id, 'subject': 'Math', 'duration': 60, 'scheduled_time': when,
+                             'completed': True})
+        for _ in range(missed):
+            sessions.append({'user_id': user_id, 'subject': rng.choice(['Math', 'Biology', 'History']),
+                             'duration': rng.choice([30, 45, 60]), 'completed': False,
+                             'scheduled_time': now - timedelta(minutes=rng.randrange(10, 48 * 60))})
+    db.session.execute(insert(User), users)
+    for start in range(0, len(sessions), 5000):
+        db.session.execute(insert(StudySession), sessions[start:start + 5000])
+    db.session.commit()
+
+
+def run_reschedule(args):
+    import json
+    import re
+
+    def reschedule_all(body):
+        # Move every session in the prompt to tomorrow evening, in the shape the prompt asked for
+        prompt = body['messages'][-1]['content']
+        when = (datetime.now() + timedelta(days=1)).replace(hour=18, minute=0, second=0, microsecond=0).isoformat()
+        batch = next((line for line in prompt.splitlines() if line.startswith('{"users"')), None)
+        if batch is not None:
+            return json.dumps({str(user['user_id']): {str(s['id']): when for s in user['missed_sessions']}
+                               for user in json.loads(batch)['users']})
+        return json.dumps({session_id: when for session_id in re.findall(r'"id": (\d+)', prompt)})
+
+    database_url = args.database_url
+    if database_url is None:
+        database_url = f"sqlite:///{tempfile.mkdtemp()}/load_test.db"
+    with fake_server(args, reply=reschedule_all) as fake:
+        app = load_app(database_url, fake.base_url)
+        from backend.database import db
+        from backend.utils.scheduler import ai_reschedule_missed_sessions
+        app.config.update({
+            'RESCHEDULE_RATE_LIMIT': args.qps,
+            'RESCHEDULE_WORKERS': args.workers,
+            'RESCHEDULE_SOLVER_CONFIDENCE': args.solver_confidence,
+            'RESCHEDULE_PROMPT_TOKEN_BUDGET': args.token_budget,
+        })
+        with app.app_context():
+            db.create_all()
+            seed_missed_sessions(db, args.users, args.missed, args.history, random.Random(args.seed or 0))
+        report = ai_reschedule_missed_sessions(app)
+
+    histogram = LatencyHistogram()
+    for latency in report.latencies:
+        histogram.record(latency)
+    print(f"== reschedule: {report}")
+    print(f"model requests: {histogram.summary()}")
+    print(histogram.render())
+    print(f"fake OpenAI: {fake.stats}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('scenario', choices=['chat', 'reschedule'])
+    parser.add_argument('--qps', type=float, default=20, help='chat requests, or model requests, per second')
+    parser.add_argument('--duration', type=float, default=10, help='chat: seconds to keep sending')
+    parser.add_argument('--concurrency', type=int, default=256, help='chat: most requests in flight')
+    parser.add_argument('--url', default=None, help='chat: drive a running server instead of an in-process one')
+    parser.add_argument('--stream', action='store_true', help='chat: use /chat/stream')
+    parser.add_argument('--cache', action='store_true', help='chat: keep the response cache on')
+    parser.add_argument('--rate-limit', action='store_true', help='chat: keep the token budgets on')
+    parser.add_argument('--database-url', default=None)
+    parser.add_argument('--users', type=int, default=500, help='reschedule: users to seed')
+    parser.add_argument('--missed', type=int, default=2, help='reschedule: missed sessions per user')
+    parser.add_argument('--history', type=int, default=5, help='reschedule: completed sessions per user')
+    parser.add_argument('--workers', type=int, default=8, help='reschedule: parallel model requests')
+    parser.add_argument('--solver-confidence', type=float, default=1.01,
+                        help='reschedule: solver confidence needed to skip the model (above 1 sends every user)')
+    parser.add_argument('--token-budget', type=int, default=8000, help='reschedule: batch prompt budget (0 = per user)')
+    fake = parser.add_argument_group('fake OpenAI server')
+    fake.add_argument('--latency', default='lognormal:0.5,0.4', help='first-token latency distribution')
+    fake.add_argument('--chunk-size', type=int, default=8)
+    fake.add_argument('--chunk-delay', type=float, default=0.01)
+    fake.add_argument('--error-rate', type=float, default=0.0)
+    fake.add_argument('--rate-limit-rate', type=float, default=0.0)
+    fake.add_argument('--rpm', type=float, default=None)
+    fake.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.scenario == 'chat':
+        run_chat(args)
+    else:
+        run_reschedule(args)
+    print(f"total {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -6,8 +6,97 @@ class Config:
     #SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+    # LLM gateway: provider URL override (e.g. a local stub), per-call deadline, retries,
+    # concurrent calls per process and circuit breaker (failures in a row, seconds open)
+    OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL')
+    LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', '30'))
+    LLM_CONNECT_TIMEOUT = float(os.getenv('LLM_CONNECT_TIMEOUT', '5'))
+    LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '2'))
+    LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '16'))
+    LLM_BREAKER_THRESHOLD = int(os.getenv('LLM_BREAKER_THRESHOLD', '5'))
+    LLM_BREAKER_RESET = float(os.getenv('LLM_BREAKER_RESET', '30'))
+    # Model token budgets: 'memory' (per worker), 'redis' (shared) or 'none'; rates are tokens per minute
+    LLM_RATE_LIMIT_BACKEND = os.getenv('LLM_RATE_LIMIT_BACKEND', 'memory')
+    LLM_USER_TOKENS_PER_MINUTE = float(os.getenv('LLM_USER_TOKENS_PER_MINUTE', '4000'))
+    LLM_USER_TOKEN_BURST = float(os.getenv('LLM_USER_TOKEN_BURST', '8000'))
+    LLM_GLOBAL_TOKENS_PER_MINUTE = float(os.getenv('LLM_GLOBAL_TOKENS_PER_MINUTE', '100000'))
+    LLM_GLOBAL_TOKEN_BURST = float(os.getenv('LLM_GLOBAL_TOKEN_BURST', '100000'))
+    # Seconds between writes of buffered usage to llm_usage_daily
+    LLM_USAGE_FLUSH_SECONDS = float(os.getenv('LLM_USAGE_FLUSH_SECONDS', '10'))
+    # Longest chat message and caller-supplied system prompt accepted, in characters
+    CHAT_MAX_MESSAGE_CHARS = int(os.getenv('CHAT_MAX_MESSAGE_CHARS', '4000'))
+    CHAT_MAX_SYSTEM_CHARS = int(os.getenv('CHAT_MAX_SYSTEM_CHARS', '2000'))
+    # Conversation threads: recent turns sent verbatim (estimated tokens) and the size of the running summary
+    CHAT_MEMORY_WINDOW_TOKENS = int(os.getenv('CHAT_MEMORY_WINDOW_TOKENS', '1500'))
+    CHAT_MEMORY_SUMMARY_TOKENS = int(os.getenv('CHAT_MEMORY_SUMMARY_TOKENS', '300'))
+    # Per-worker LRU of profile-derived coach contexts; other workers' edits show up after the TTL (seconds)
+    COACH_CONTEXT_CACHE_SIZE = int(os.getenv('COACH_CONTEXT_CACHE_SIZE', '10000'))
+    COACH_CONTEXT_TTL = float(os.getenv('COACH_CONTEXT_TTL', '300'))
+    # Password hashing: 'scrypt', 'argon2' (needs argon2-cffi) or 'pbkdf2'. PASSWORD_COST pins the
+    # parameters (e.g. '32768:8:1'); otherwise they are calibrated to PASSWORD_TARGET_MS per hash.
+    # Hashing runs on PASSWORD_HASH_WORKERS processes in *each* web worker (0 = inline). The default
+    # splits the cores between the WEB_CONCURRENCY web workers gunicorn starts: max(1, cores // WEB_CONCURRENCY).
+    PASSWORD_SCHEME = os.getenv('PASSWORD_SCHEME', 'scrypt')
+    PASSWORD_COST = os.getenv('PASSWORD_COST')
+    PASSWORD_TARGET_MS = float(os.getenv('PASSWORD_TARGET_MS', '250'))
+    PASSWORD_HASH_WORKERS = os.getenv('PASSWORD_HASH_WORKERS')
+    PASSWORD_HASH_QUEUE = int(os.getenv('PASSWORD_HASH_QUEUE', '0'))
+    WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', '2'))  # same default as gunicorn.conf.py
     FRONTEND_URL = os.getenv('FRONTEND_URL', 'http://localhost:3000')
+    # Reverse proxies in front of the app whose X-Forwarded-For/-Proto are trusted; client addresses
+    # (e.g. rate limit keys of anonymous callers) are read through them. Render puts one in front.
+    TRUSTED_PROXY_HOPS = int(os.getenv('TRUSTED_PROXY_HOPS', '0'))
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY')
+    # Comma-separated user ids allowed on admin endpoints (e.g. the global task listing)
+    ADMIN_USER_IDS = os.getenv('ADMIN_USER_IDS', '')
+    # Key rotation: JWT_SIGNING_KEYS is 'kid=secret,...' and new tokens are signed with JWT_ACTIVE_KID;
+    # tokens without a kid keep verifying against JWT_SECRET_KEY
+    JWT_SIGNING_KEYS = os.getenv('JWT_SIGNING_KEYS')
+    JWT_ACTIVE_KID = os.getenv('JWT_ACTIVE_KID')
+    # Token lifetimes in seconds: access tokens are short, refresh tokens rotate on every use
+    JWT_ACCESS_SECONDS = int(os.getenv('JWT_ACCESS_SECONDS', '900'))
+    JWT_REFRESH_SECONDS = int(os.getenv('JWT_REFRESH_SECONDS', str(30 * 24 * 60 * 60)))
+    # Revoked token ids live in a per-worker Bloom filter, re-synced from revoked_token every few seconds
+    REVOCATION_BLOOM_CAPACITY = int(os.getenv('REVOCATION_BLOOM_CAPACITY', '100000'))
+    REVOCATION_BLOOM_ERROR_RATE = float(os.getenv('REVOCATION_BLOOM_ERROR_RATE', '0.001'))
+    REVOCATION_SYNC_SECONDS = float(os.getenv('REVOCATION_SYNC_SECONDS', '5'))
+    # Per-worker caches of verified tokens and of users behind them (TTL in seconds)
+    JWT_VERIFY_CACHE_SIZE = int(os.getenv('JWT_VERIFY_CACHE_SIZE', '10000'))
+    USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '10000'))
+    USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', '30'))
+    # Seconds between checks of the achievement table for changes made by other workers
+    ACHIEVEMENT_CATALOG_CHECK_SECONDS = float(os.getenv('ACHIEVEMENT_CATALOG_CHECK_SECONDS', '5'))
+    # Leaderboard store: 'sql' reads user_points per request; 'redis' is a shared sorted set;
+    # 'memory' is a per-worker copy that only sees its own worker's commits (single process only)
+    LEADERBOARD_BACKEND = os.getenv('LEADERBOARD_BACKEND', 'sql')
+    REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+    # Chat response cache: 'memory', 'redis' or 'none'
+    CHAT_CACHE_BACKEND = os.getenv('CHAT_CACHE_BACKEND', 'memory')
+    CHAT_CACHE_TTL = int(os.getenv('CHAT_CACHE_TTL', '86400'))
+    CHAT_CACHE_MAX_ENTRIES = int(os.getenv('CHAT_CACHE_MAX_ENTRIES', '5000'))
+    CHAT_CACHE_NEAR_DUPLICATES = os.getenv('CHAT_CACHE_NEAR_DUPLICATES', 'False') == 'True'
+    CHAT_CACHE_SIMILARITY = float(os.getenv('CHAT_CACHE_SIMILARITY', '0.9'))
+    # 'cluster' elects a single runner among all processes sharing the database, 'local' runs background
+    # jobs in every process (single-process deployments only), 'off' disables them
+    SCHEDULER_MODE = os.getenv('SCHEDULER_MODE', 'cluster')
+    SCHEDULER_LOCK_TTL = int(os.getenv('SCHEDULER_LOCK_TTL', '60'))
+    # Missed-session rescheduling: parallel model calls, requests per second, retries, rows per commit
+    RESCHEDULE_WORKERS = int(os.getenv('RESCHEDULE_WORKERS', '8'))
+    RESCHEDULE_RATE_LIMIT = float(os.getenv('RESCHEDULE_RATE_LIMIT', '5'))
+    RESCHEDULE_MAX_RETRIES = int(os.getenv('RESCHEDULE_MAX_RETRIES', '3'))
+    RESCHEDULE_COMMIT_BATCH = int(os.getenv('RESCHEDULE_COMMIT_BATCH', '200'))
+    # The local solver handles users it is confident about; the rest go to the model if enabled
+    RESCHEDULE_USE_LLM = os.getenv('RESCHEDULE_USE_LLM', 'True') == 'True'
+    RESCHEDULE_SOLVER_CONFIDENCE = float(os.getenv('RESCHEDULE_SOLVER_CONFIDENCE', '0.6'))
+    # Pack several users into one model prompt up to this many estimated tokens (0 = one prompt per user)
+    RESCHEDULE_PROMPT_TOKEN_BUDGET = int(os.getenv('RESCHEDULE_PROMPT_TOKEN_BUDGET', '8000'))
+    RESCHEDULE_PROMPT_MAX_USERS = int(os.getenv('RESCHEDULE_PROMPT_MAX_USERS', '50'))
+    # Incremental runs: how often, how far back the first run looks, how much of the previous run each run
+    # rescans, and when to give up on a session
+    RESCHEDULE_INTERVAL_MINUTES = int(os.getenv('RESCHEDULE_INTERVAL_MINUTES', '5'))
+    RESCHEDULE_LOOKBACK_DAYS = int(os.getenv('RESCHEDULE_LOOKBACK_DAYS', '7'))
+    RESCHEDULE_OVERLAP_MINUTES = int(os.getenv('RESCHEDULE_OVERLAP_MINUTES', '30'))
+    RESCHEDULE_MAX_ATTEMPTS = int(os.getenv('RESCHEDULE_MAX_ATTEMPTS', '3'))
     @staticmethod
     def get_database_url():
         uri = os.getenv('DATABASE_URL')
@@ -27,6 +116,7 @@ class DevelopmentConfig(Config):
 class ProductionConfig(Config):
     DEBUG = False
     ENV = 'production'
+    TRUSTED_PROXY_HOPS = int(os.getenv('TRUSTED_PROXY_HOPS', '1'))
     # Get the database URL with proper format
     SQLALCHEMY_DATABASE_URI = Config.get_database_url()
     
@@ -13,6 +13,31 @@ class User(db.Model):
     tasks      = db.relationship('Task', backref='user', lazy=True)
 
 
+class RefreshToken(db.Model):
+    # Single-use refresh tokens; each refresh replaces the token with a new one in the same family
+    id          = db.Column(db.Integer, primary_key=True)
+    user_id     = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    family_id   = db.Column(db.String(32), nullable=False)  # one per login
+    token_hash  = db.Column(db.String(64), unique=True, nullable=False)  # sha256 of the token, never the token
+    access_jti  = db.Column(db.String(32))  # access token issued alongside, revoked with the family
+    expires_at  = db.Column(db.DateTime, nullable=False)
+    used_at     = db.Column(db.DateTime)
+    revoked_at  = db.Column(db.DateTime)
+    created_at  = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (db.Index('ix_refresh_token_family', 'family_id'),
+                      db.Index('ix_refresh_token_user', 'user_id'))
+
+
+class RevokedToken(db.Model):
+    # Access token jti values, or 'user:<id>' cut-offs, rejected until expires_at
+    id         = db.Column(db.Integer, primary_key=True)
+    key        = db.Column(db.String(64), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    revoked_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    __table_args__ = (db.Index('ix_revoked_token_key', 'key'),
+                      db.Index('ix_revoked_token_expires', 'expires_at'))
+
+
 # ──────────────── Personal Study Sessions ────────────────
 class StudySession(db.Model):
     id             = db.Column(db.Integer, primary_key=True)
@@ -24,6 +49,21 @@ class StudySession(db.Model):
     completed      = db.Column(db.Boolean, default=False)
     created_at     = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at     = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Set on copies fanned out from a GroupStudySession so group edits can propagate
+    group_session_id = db.Column(db.Integer, db.ForeignKey('group_study_session.id'))
+    __table_args__ = (
+        db.Index('ix_study_session_user_completed_scheduled', 'user_id', 'completed', 'scheduled_time'),
+        db.Index('ix_study_session_user_scheduled', 'user_id', 'scheduled_time', 'id'),
+        db.Index('ix_study_session_group_session_id', 'group_session_id'),
+        # Only overdue candidates for the rescheduler: incomplete sessions, by time
+        db.Index('ix_study_session_incomplete_scheduled', 'scheduled_time',
+                 postgresql_where=db.text('completed = false'),
+                 sqlite_where=db.text('completed = 0')),
+        # Sessions created or moved since the rescheduler's last run, by updated_at
+        db.Index('ix_study_session_incomplete_updated', 'updated_at',
+                 postgresql_where=db.text('completed = false'),
+                 sqlite_where=db.text('completed = 0')),
+    )
 
 
 # ──────────────── Study Groups ────────────────
@@ -40,6 +80,10 @@ class GroupMembership(db.Model):
     group_id  = db.Column(db.Integer, db.ForeignKey('study_group.id'), nullable=False)
     user_id   = db.Column(db.Integer, db.ForeignKey('user.id'),        nullable=False)
     joined_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        db.UniqueConstraint('group_id', 'user_id', name='uq_group_membership_group_user'),
+        db.Index('ix_group_membership_user_id', 'user_id'),
+    )
 
 
 class GroupStudySession(db.Model):
@@ -49,6 +93,7 @@ class GroupStudySession(db.Model):
     scheduled_time = db.Column(db.DateTime, nullable=False)
     duration       = db.Column(db.Integer, nullable=False)
     created_at     = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (db.Index('ix_group_study_session_group_id', 'group_id'),)
 
 
 # ──────────────── Tasks / Kanban ────────────────
@@ -57,7 +102,10 @@ class Task(db.Model):
     user_id    = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     title      = db.Column(db.String(255), nullable=False)
     status     = db.Column(db.String(50), default='todo')  # e.g., 'todo', 'inProgress', 'done'
+    position   = db.Column(db.Float, nullable=False, default=0, server_default='0')  # order within the column
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (db.Index('ix_task_user_id', 'user_id'),
+                      db.Index('ix_task_user_status_position', 'user_id', 'status', 'position'))
 
 
 # ──────────────── Gamification ────────────────
@@ -68,6 +116,7 @@ class Achievement(db.Model):
     badge_image = db.Column(db.String(255))  # Path or URL to badge image
     points      = db.Column(db.Integer, default=0)
     created_at  = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at  = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
 class UserAchievement(db.Model):
@@ -76,6 +125,9 @@ class UserAchievement(db.Model):
     achievement_id = db.Column(db.Integer, db.ForeignKey('achievement.id'),  nullable=False)
     earned_at      = db.Column(db.DateTime, default=datetime.utcnow)
     achievement    = db.relationship('Achievement', backref='users_earned')
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'achievement_id', name='uq_user_achievement_user_achievement'),
+    )
 
 
 class UserPoints(db.Model):
@@ -86,12 +138,48 @@ class UserPoints(db.Model):
     updated_at   = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
+# Leaderboard order (points descending, then user id); an expression index, so it is declared after the class
+db.Index('ix_user_points_ranking', db.func.coalesce(UserPoints.total_points, db.literal_column('0')).desc(),
+         UserPoints.user_id)
+
+
 class PointTransaction(db.Model):
     id         = db.Column(db.Integer, primary_key=True)
     user_id    = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     amount     = db.Column(db.Integer, nullable=False)
     reason     = db.Column(db.String(255))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (db.Index('ix_point_transaction_user_created', 'user_id', 'created_at'),)
+
+
+# Running aggregates over completed sessions, maintained by utils/achievement_engine.py
+class UserStudyStats(db.Model):
+    id                   = db.Column(db.Integer, primary_key=True)
+    user_id              = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, unique=True)
+    completed_count      = db.Column(db.Integer, nullable=False, default=0)
+    total_minutes        = db.Column(db.Integer, nullable=False, default=0)
+    current_streak       = db.Column(db.Integer, nullable=False, default=0)  # consecutive days ending at last_study_date
+    longest_streak       = db.Column(db.Integer, nullable=False, default=0)
+    last_study_date      = db.Column(db.Date)
+    max_daily_sessions   = db.Column(db.Integer, nullable=False, default=0)
+    max_subject_sessions = db.Column(db.Integer, nullable=False, default=0)
+    updated_at           = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class UserSubjectStats(db.Model):
+    id       = db.Column(db.Integer, primary_key=True)
+    user_id  = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    subject  = db.Column(db.String(100), nullable=False)
+    sessions = db.Column(db.Integer, nullable=False, default=0)
+    __table_args__ = (db.UniqueConstraint('user_id', 'subject'),)
+
+
+class UserDailyStats(db.Model):
+    id       = db.Column(db.Integer, primary_key=True)
+    user_id  = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    day      = db.Column(db.Date, nullable=False)
+    sessions = db.Column(db.Integer, nullable=False, default=0)
+    __table_args__ = (db.UniqueConstraint('user_id', 'day'),)
 
 
 # ──────────────── User Profile / Onboarding ────────────────
@@ -104,8 +192,12 @@ class UserProfile(db.Model):
     subjects             = db.Column(db.Text)  # Stored as JSON
     goals                = db.Column(db.Text)
     quiz_responses       = db.Column(db.Text)  # Stored as JSON
+    # Prompt text derived from the fields above; rebuilt (and versioned) whenever they change
+    coach_context        = db.Column(db.Text)
+    context_version      = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     created_at           = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at           = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    __table_args__ = (db.Index('ix_user_profile_user_id', 'user_id'),)
 
     def set_subjects(self, subjects_list):
         self.subjects = json.dumps(subjects_list)
@@ -118,3 +210,59 @@ class UserProfile(db.Model):
 
     def get_quiz_responses(self):
         return json.loads(self.quiz_responses) if self.quiz_responses else {}
+
+
+# ──────────────── Background Scheduler ────────────────
+class SchedulerLock(db.Model):
+    # Lease-based leader election for databases without advisory locks (SQLite)
+    name       = db.Column(db.String(64), primary_key=True)
+    owner      = db.Column(db.String(128), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+
+class JobWatermark(db.Model):
+    # High-water mark of the last completed incremental run of a background job
+    name       = db.Column(db.String(64), primary_key=True)
+    value      = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class SessionRescheduleState(db.Model):
+    session_id          = db.Column(db.Integer, db.ForeignKey('study_session.id', ondelete='CASCADE'), primary_key=True)
+    attempts            = db.Column(db.Integer, nullable=False, default=0)
+    last_rescheduled_at = db.Column(db.DateTime)
+    last_outcome        = db.Column(db.String(20))  # 'claimed' while planned, then 'solver', 'ai', 'fallback', 'changed' or 'unplanned'
+
+
+# ──────────────── Chat ────────────────
+class LLMUsageDaily(db.Model):
+    # Model token usage per day, caller and operation; user_id 0 is anonymous callers and background jobs
+    day               = db.Column(db.Date, primary_key=True)
+    user_id           = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    operation         = db.Column(db.String(32), primary_key=True)
+    requests          = db.Column(db.Integer, nullable=False, default=0)
+    rejected          = db.Column(db.Integer, nullable=False, default=0)
+    prompt_tokens     = db.Column(db.Integer, nullable=False, default=0)
+    completion_tokens = db.Column(db.Integer, nullable=False, default=0)
+    __table_args__ = (db.Index('ix_llm_usage_daily_user_day', 'user_id', 'day'),)
+
+
+class ChatThread(db.Model):
+    id         = db.Column(db.Integer, primary_key=True)
+    user_id    = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    title      = db.Column(db.String(200))
+    summary    = db.Column(db.LargeBinary)  # zlib-compressed running summary of compacted turns
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    __table_args__ = (db.Index('ix_chat_thread_user_updated', 'user_id', 'updated_at'),)
+
+
+class ChatTurn(db.Model):
+    id         = db.Column(db.Integer, primary_key=True)
+    thread_id  = db.Column(db.Integer, db.ForeignKey('chat_thread.id', ondelete='CASCADE'), nullable=False)
+    role       = db.Column(db.String(16), nullable=False)  # 'user' or 'assistant'
+    content    = db.Column(db.LargeBinary, nullable=False)  # zlib-compressed text
+    tokens     = db.Column(db.Integer, nullable=False, default=0)
+    summarized = db.Column(db.Boolean, nullable=False, default=False)  # folded into the thread summary
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (db.Index('ix_chat_turn_thread_summarized', 'thread_id', 'summarized', 'id'),)
@@ -0,0 +1,39 @@
+from sqlalchemy import insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+# Dialects with INSERT ... ON CONFLICT DO UPDATE ... RETURNING
+_UPSERT_INSERTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert,
+}
+
+
+def upsert(session, table, rows, index_elements, set_, returning=None):
+    """Insert rows (dicts) into table, updating the ones whose unique key already exists.
+
+    index_elements names the columns of that key. set_(incoming) returns the
+    {column: expression} assignments for an existing row, where
+    incoming[name] is the value the row would have been inserted with.
+    Runs one INSERT ... ON CONFLICT DO UPDATE where the dialect has it, else
+    an UPDATE per row and an INSERT for the rows it missed. With returning
+    (a column), returns that column's new value for each row, in order.
+    """
+    dialect_insert = _UPSERT_INSERTS.get(session.get_bind().dialect.name)
+
+    if dialect_insert is not None:
+        stmt = dialect_insert(table)
+        stmt = stmt.on_conflict_do_update(index_elements=index_elements, set_=set_(stmt.excluded))
+        if returning is None:
+            session.execute(stmt, rows)
+            return None
+        stmt = stmt.returning(returning)
+        return [session.execute(stmt.values(row)).scalar_one() for row in rows]
+
+    returned = []
+    for row in rows:
+        key = [table.c[name] == row[name] for name in index_elements]
+        if session.execute(update(table).where(*key).values(set_(row))).rowcount == 0:
+            session.execute(insert(table).values(row))
+        if returning is not None:
+            returned.append(session.execute(select(returning).where(*key)).scalar_one())
+    return returned if returning is not None else None
@@ -0,0 +1,9 @@
+from backend.llm.breaker import CircuitBreaker, CircuitOpenError
+from backend.llm.gateway import (
+    LLMBusyError, LLMGateway, RETRYABLE_ERRORS, configure_gateway, get_gateway, set_gateway
+)
+from backend.llm.limiter import (
+    MemoryBucketStore, RedisBucketStore, TokenRateLimiter, estimate_prompt_tokens, estimate_tokens, get_rate_limiter
+)
+from backend.llm.metrics import LLMMetrics
+from backend.llm.usage import ANONYMOUS, UsageLedger, usage_ledger
@@ -0,0 +1,77 @@
+# backend/llm/breaker.py
+import threading
+import time
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider that has been failing."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"LLM circuit open; retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker.
+
+    closed: calls go through; `failure_threshold` failures in a row open it.
+    open: calls fail fast with CircuitOpenError for `reset_timeout` seconds.
+    half-open: one trial call is let through; success closes the circuit,
+    failure opens it again, and a trial that ends without a verdict (e.g. an
+    abandoned stream) must be released so the next call can try.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._trial_running = False
+        return self._state
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go ahead; returns whether it is the half-open trial."""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return False
+            if state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            retry_after = max(self.reset_timeout - (self._clock() - self._opened_at), 0.0)
+            raise CircuitOpenError(retry_after)
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+                self._trial_running = False
+
+    def release_trial(self):
+        """Let another call try after a trial that gave no verdict; no-op once one was recorded."""
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._trial_running = False
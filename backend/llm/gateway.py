@@ -0,0 +1,222 @@
+# backend/llm/gateway.py
+import os
+import random
+import threading
+import time
+import httpx
+import openai
+from backend.llm.breaker import CircuitBreaker, CircuitOpenError
+from backend.llm.metrics import LLMMetrics
+
+DEFAULT_MODEL = "gpt-4o"
+# Worth another attempt; anything else (bad request, auth, ...) fails straight away
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APITimeoutError,
+                    openai.APIConnectionError, openai.InternalServerError)
+
+
+def _backoff(attempt, error):
+    """Full-jitter exponential backoff, but never sooner than the provider's Retry-After."""
+    backoff = random.uniform(0, 0.5 * 2 ** attempt)
+    response = getattr(error, 'response', None)
+    if response is not None:
+        try:
+            backoff = max(backoff, float(response.headers.get('retry-after', 0)))
+        except ValueError:
+            pass  # an HTTP date; the jittered backoff will do
+    return backoff
+
+
+class LLMBusyError(Exception):
+    """Every concurrency slot stayed taken until the call's deadline."""
+
+
+class LLMGateway:
+    """The one way this backend talks to the model provider.
+
+    One pooled httpx client per process (rebuilt after a fork), a total
+    deadline per call that bounds every attempt and backoff, retries with
+    full jitter on transient errors, a circuit breaker that fails fast with
+    CircuitOpenError while the provider is down, a cap on concurrent calls,
+    and per-operation latency/token metrics.
+    """
+
+    def __init__(self, api_key, base_url=None, timeout=30.0, connect_timeout=5.0, max_retries=2,
+                 max_concurrency=16, breaker=None, metrics=None, model=DEFAULT_MODEL):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_retries = max_retries
+        self.max_concurrency = max_concurrency
+        self.model = model
+        self.breaker = breaker or CircuitBreaker()
+        self.metrics = metrics or LLMMetrics()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._client = None
+        self._client_pid = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        """The process's openai client over a shared keep-alive connection pool."""
+        if self._client is None or self._client_pid != os.getpid():
+            with self._client_lock:
+                if self._client is None or self._client_pid != os.getpid():
+                    http_client = httpx.Client(
+                        timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+                        limits=httpx.Limits(max_connections=self.max_concurrency,
+                                            max_keepalive_connections=self.max_concurrency),
+                    )
+                    self._client = openai.Client(api_key=self.api_key, base_url=self.base_url,
+                                                 http_client=http_client, max_retries=0)
+                    self._client_pid = os.getpid()
+        return self._client
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    def chat(self, messages, operation='chat', deadline=None, max_retries=None, on_retry=None, **params):
+        """Create a chat completion; raises CircuitOpenError, LLMBusyError or the provider's error."""
+        params.setdefault('model', self.model)
+        max_retries = self.max_retries if max_retries is None else max_retries
+        started = time.monotonic()
+        expires = started + (deadline or self.timeout)
+        self._acquire(expires)
+        attempt, trial = 0, False
+        try:
+            trial = self.breaker.before_call()
+            while True:
+                remaining = expires - time.monotonic()
+                try:
+                    if remaining <= 0:
+                        raise openai.APITimeoutError(request=httpx.Request('POST', 'chat/completions'))
+                    response = self.client.with_options(timeout=min(self.timeout, remaining)).chat.completions.create(
+                        messages=messages, **params
+                    )
+                    break
+                except RETRYABLE_ERRORS as e:
+                    backoff = _backoff(attempt, e)
+                    if attempt >= max_retries or time.monotonic() + backoff >= expires:
+                        self._failed(operation, started, attempt, e)
+                        raise
+                    time.sleep(backoff)
+                    attempt += 1
+                    if on_retry is not None:
+                        on_retry()
+                except openai.OpenAIError as e:
+                    self._failed(operation, started, attempt, e)
+                    raise
+            self.breaker.record_success()
+        finally:
+            if trial:
+                self.breaker.release_trial()
+            self._slots.release()
+
+        usage = response.usage
+        self.metrics.record(operation, time.monotonic() - started, retries=attempt,
+                            prompt_tokens=usage.prompt_tokens if usage else 0,
+                            completion_tokens=usage.completion_tokens if usage else 0)
+        return response
+
+    def stream(self, messages, operation='chat_stream', deadline=None, **params):
+        """Yield streamed completion chunks; the concurrency slot is held until the stream ends.
+
+        Only opening the stream is retried; `deadline` bounds opening it, and
+        each later read is bounded by the client timeout.
+        """
+        params.setdefault('model', self.model)
+        params.setdefault('stream_options', {"include_usage": True})
+        started = time.monotonic()
+        expires = started + (deadline or self.timeout)
+        self._acquire(expires)
+        attempt, usage, trial = 0, None, False
+        try:
+            trial = self.breaker.before_call()
+            while True:
+                try:
+                    remaining = max(expires - time.monotonic(), 0.001)
+                    stream = self.client.with_options(timeout=min(self.timeout, remaining)).chat.completions.create(
+                        messages=messages, stream=True, **params
+                    )
+                    break
+                except RETRYABLE_ERRORS as e:
+                    backoff = _backoff(attempt, e)
+                    if attempt >= self.max_retries or time.monotonic() + backoff >= expires:
+                        raise
+                    time.sleep(backoff)
+                    attempt += 1
+            with stream:
+                for chunk in stream:
+                    if chunk.usage:
+                        usage = chunk.usage
+                    yield chunk
+            self.breaker.record_success()
+        except openai.OpenAIError as e:
+            self._failed(operation, started, attempt, e)
+            raise
+        finally:
+            # Also reached when the consumer abandons the stream (GeneratorExit)
+            if trial:
+                self.breaker.release_trial()
+            self._slots.release()
+
+        self.metrics.record(operation, time.monotonic() - started, retries=attempt,
+                            prompt_tokens=usage.prompt_tokens if usage else 0,
+                            completion_tokens=usage.completion_tokens if usage else 0)
+
+    def _acquire(self, expires):
+        if not self._slots.acquire(timeout=max(expires - time.monotonic(), 0)):
+            raise LLMBusyError("Too many concurrent LLM calls")
+
+    def _failed(self, operation, started, attempt, error):
+        # Client errors (bad request, auth) mean the provider is up and answering
+        if isinstance(error, RETRYABLE_ERRORS):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        self.metrics.record(operation, time.monotonic() - started, ok=False, retries=attempt)
+
+
+_gateway = None
+_init_lock = threading.Lock()
+
+
+def gateway_from_config(config):
+    return LLMGateway(
+        api_key=config.get('OPENAI_API_KEY') or os.getenv('OPENAI_API_KEY'),
+        base_url=config.get('OPENAI_BASE_URL') or None,
+        timeout=float(config.get('LLM_TIMEOUT', 30)),
+        connect_timeout=float(config.get('LLM_CONNECT_TIMEOUT', 5)),
+        max_retries=int(config.get('LLM_MAX_RETRIES', 2)),
+        max_concurrency=int(config.get('LLM_MAX_CONCURRENCY', 16)),
+        breaker=CircuitBreaker(int(config.get('LLM_BREAKER_THRESHOLD', 5)),
+                               float(config.get('LLM_BREAKER_RESET', 30))),
+    )
+
+
+def configure_gateway(config):
+    """Build the process-wide gateway from app config; called from create_app."""
+    global _gateway
+    with _init_lock:
+        _gateway = gateway_from_config(config)
+    return _gateway
+
+
+def set_gateway(gateway):
+    """Swap the process-wide gateway (tests, tools) and return the previous one."""
+    global _gateway
+    previous, _gateway = _gateway, gateway
+    return previous
+
+
+def get_gateway():
+    """Return the process-wide gateway, building it from the environment if create_app has not."""
+    global _gateway
+    if _gateway is None:
+        with _init_lock:
+            if _gateway is None:
+                from backend.config import Config
+                _gateway = gateway_from_config(vars(Config))
+    return _gateway
@@ -0,0 +1,167 @@
+# backend/llm/limiter.py
+import threading
+import time
+
+
+def estimate_tokens(text):
+    """Cheap token estimate for one chat message (~4 characters per token plus message framing)."""
+    return len(text or '') // 4 + 4
+
+
+def estimate_prompt_tokens(messages):
+    return sum(estimate_tokens(message.get('content')) for message in messages) + 2
+
+
+class MemoryBucketStore:
+    """Token buckets kept in this process; each worker enforces its own share."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def _level(self, key, rate, capacity, now):
+        tokens, updated = self._buckets.get(key, (capacity, now))
+        return min(capacity, tokens + (now - updated) * rate)
+
+    def take(self, key, cost, rate, capacity):
+        """Take cost tokens if available; return 0, or the seconds until they would be."""
+        now = time.monotonic()
+        with self._lock:
+            tokens = self._level(key, rate, capacity, now)
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now)
+                return 0.0
+            self._buckets[key] = (tokens, now)
+            return (cost - tokens) / rate
+
+    def adjust(self, key, amount, rate, capacity):
+        """Give back (positive) or charge (negative, may go into debt) tokens."""
+        now = time.monotonic()
+        with self._lock:
+            self._buckets[key] = (min(capacity, self._level(key, rate, capacity, now) + amount), now)
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+# KEYS[1] bucket; ARGV: cost, rate, capacity, now. Returns the wait in seconds as a string (0 = taken).
+_TAKE_SCRIPT = """
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local cost, rate, capacity, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) * 2 + 1)
+return tostring(wait)
+"""
+
+# Same refill, then add ARGV[1] (which may be negative)
+_ADJUST_SCRIPT = """
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local amount, rate, capacity, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate + amount)
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) * 2 + 1)
+return 1
+"""
+
+
+class RedisBucketStore:
+    """Token buckets in Redis, shared by all workers; each update is one atomic script call."""
+
+    PREFIX = 'llmlimit:'
+
+    def __init__(self, url):
+        import redis  # optional dependency, only needed for this backend
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self._take = self._redis.register_script(_TAKE_SCRIPT)
+        self._adjust = self._redis.register_script(_ADJUST_SCRIPT)
+
+    def take(self, key, cost, rate, capacity):
+        return float(self._take(keys=[self.PREFIX + key], args=[cost, rate, capacity, time.time()]))
+
+    def adjust(self, key, amount, rate, capacity):
+        self._adjust(keys=[self.PREFIX + key], args=[amount, rate, capacity, time.time()])
+
+    def clear(self):
+        keys = list(self._redis.scan_iter(self.PREFIX + '*'))
+        if keys:
+            self._redis.delete(*keys)
+
+
+class TokenRateLimiter:
+    """Per-caller and global token buckets for model calls.
+
+    A call reserves its estimated tokens (prompt estimate plus the completion
+    cap) from the caller's bucket and the global one before it is made, and
+    settles against the provider's reported usage afterwards: unused tokens
+    are given back, overruns are charged as debt. Rates are tokens per
+    minute; a bucket holds up to `burst` tokens.
+    """
+
+    GLOBAL = 'global'
+
+    def __init__(self, store, user_rate, user_burst, global_rate, global_burst):
+        self.store = store
+        self.user = (user_rate / 60.0, user_burst)
+        self.shared = (global_rate / 60.0, global_burst)
+
+    def reserve(self, caller, tokens):
+        """Reserve tokens for caller; return 0 if admitted, otherwise the seconds to wait."""
+        rate, burst = self.user
+        wait = self.store.take(f'user:{caller}', min(tokens, burst), rate, burst)
+        if wait:
+            return wait
+        rate, burst = self.shared
+        wait = self.store.take(self.GLOBAL, min(tokens, burst), rate, burst)
+        if wait:
+            # Not admitted after all: don't let the caller pay for it
+            self.store.adjust(f'user:{caller}', min(tokens, self.user[1]), *self.user)
+        return wait
+
+    def settle(self, caller, reserved, used):
+        """Correct a reservation to the tokens actually used (0 when the call failed)."""
+        difference = reserved - used
+        if difference:
+            self.store.adjust(f'user:{caller}', difference, *self.user)
+            self.store.adjust(self.GLOBAL, difference, *self.shared)
+
+    def clear(self):
+        self.store.clear()
+
+
+_STORES = {
+    'memory': lambda config: MemoryBucketStore(),
+    'redis': lambda config: RedisBucketStore(config['REDIS_URL']),
+}
+_limiter = None
+_init_lock = threading.Lock()
+
+
+def get_rate_limiter(config):
+    """Return the configured limiter for model calls, or None when limiting is disabled."""
+    global _limiter
+    backend = config.get('LLM_RATE_LIMIT_BACKEND', 'memory')
+    if backend == 'none':
+        return None
+    if _limiter is None:
+        with _init_lock:
+            if _limiter is None:
+                _limiter = TokenRateLimiter(
+                    _STORES[backend](config),
+                    user_rate=float(config.get('LLM_USER_TOKENS_PER_MINUTE', 4000)),
+                    user_burst=float(config.get('LLM_USER_TOKEN_BURST', 8000)),
+                    global_rate=float(config.get('LLM_GLOBAL_TOKENS_PER_MINUTE', 100000)),
+                    global_burst=float(config.get('LLM_GLOBAL_TOKEN_BURST', 100000)),
+                )
+    return _limiter
@@ -0,0 +1,60 @@
+# backend/llm/metrics.py
+import threading
+from collections import defaultdict, deque
+
+
+class _OperationStats:
+    __slots__ = ('calls', 'errors', 'retries', 'prompt_tokens', 'completion_tokens', 'latencies')
+
+    def __init__(self, window):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latencies = deque(maxlen=window)
+
+
+def _percentile(ordered, pct):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class LLMMetrics:
+    """Per-operation call counts, token usage and latency percentiles over the last `window` calls."""
+
+    def __init__(self, window=1000):
+        self.window = window
+        self._lock = threading.Lock()
+        self._stats = defaultdict(lambda: _OperationStats(self.window))
+
+    def record(self, operation, latency, ok=True, retries=0, prompt_tokens=0, completion_tokens=0):
+        with self._lock:
+            stats = self._stats[operation]
+            stats.calls += 1
+            stats.errors += 0 if ok else 1
+            stats.retries += retries
+            stats.prompt_tokens += prompt_tokens or 0
+            stats.completion_tokens += completion_tokens or 0
+            stats.latencies.append(latency)
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for operation, stats in self._stats.items():
+                ordered = sorted(stats.latencies)
+                result[operation] = {
+                    'calls': stats.calls,
+                    'errors': stats.errors,
+                    'retries': stats.retries,
+                    'prompt_tokens': stats.prompt_tokens,
+                    'completion_tokens': stats.completion_tokens,
+                    'p50_latency_ms': round(_percentile(ordered, 50) * 1000, 1),
+                    'p95_latency_ms': round(_percentile(ordered, 95) * 1000, 1),
+                }
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
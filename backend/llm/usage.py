@@ -0,0 +1,77 @@
+# backend/llm/usage.py
+import threading
+import time
+from datetime import date
+from sqlalchemy.orm import Session
+from backend.database.models import LLMUsageDaily, db
+from backend.database.upsert import upsert
+
+ANONYMOUS = 0  # user_id for unauthenticated callers and background jobs
+
+_COUNTERS = ('requests', 'rejected', 'prompt_tokens', 'completion_tokens')
+
+
+class UsageLedger:
+    """Buffers model usage in memory and adds it to the llm_usage_daily rows on flush().
+
+    record() is cheap and safe from any thread (streaming pumps, rescheduler
+    workers); flush() needs an app context and writes one upsert per
+    (day, user, operation) touched since the last flush, then commits. It
+    uses a session of its own, so flushing in the middle of a request never
+    commits or rolls back the request's work.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._last_flush = time.monotonic()
+
+    def record(self, user_id, operation, prompt_tokens=0, completion_tokens=0, rejected=False, day=None):
+        key = (day or date.today(), user_id or ANONYMOUS, operation)
+        with self._lock:
+            counts = self._pending.setdefault(key, dict.fromkeys(_COUNTERS, 0))
+            counts['rejected' if rejected else 'requests'] += 1
+            counts['prompt_tokens'] += prompt_tokens or 0
+            counts['completion_tokens'] += completion_tokens or 0
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def maybe_flush(self, interval):
+        """Flush if more than `interval` seconds passed since the last flush."""
+        if self._pending and time.monotonic() - self._last_flush >= interval:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+        rows = [dict(counts, day=day, user_id=user_id, operation=operation)
+                for (day, user_id, operation), counts in pending.items()]
+        try:
+            with Session(db.session.get_bind()) as session:
+                _add_usage(session, rows)
+                session.commit()
+        except Exception as e:
+            print(f"LLM usage flush failed, keeping {len(rows)} rows for the next one: {e}")
+            with self._lock:
+                for key, counts in pending.items():
+                    merged = self._pending.setdefault(key, dict.fromkeys(_COUNTERS, 0))
+                    for name in _COUNTERS:
+                        merged[name] += counts[name]
+
+    def clear(self):
+        with self._lock:
+            self._pending.clear()
+
+
+def _add_usage(session, rows):
+    table = LLMUsageDaily.__table__
+    upsert(session, table, rows, ['day', 'user_id', 'operation'],
+           lambda incoming: {name: table.c[name] + incoming[name] for name in _COUNTERS})
+
+
+usage_ledger = UsageLedger()
@@ -0,0 +1,79 @@
+"""Add indexes for hot filter paths
+
+Revision ID: 682b2ee015f7
+Revises: 1fb46280522c
+Create Date: 2026-10-18 11:47:05.902113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '682b2ee015f7'
+down_revision = '1fb46280522c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Drop duplicate rows before the unique constraints go on, keeping the oldest
+    op.execute(
+        'DELETE FROM group_membership WHERE id NOT IN '
+        '(SELECT MIN(id) FROM group_membership GROUP BY group_id, user_id)'
+    )
+    op.execute(
+        'DELETE FROM user_achievement WHERE id NOT IN '
+        '(SELECT MIN(id) FROM user_achievement GROUP BY user_id, achievement_id)'
+    )
+
+    with op.batch_alter_table('study_session', schema=None) as batch_op:
+        batch_op.create_index('ix_study_session_user_completed_scheduled',
+                              ['user_id', 'completed', 'scheduled_time'], unique=False)
+        batch_op.create_index('ix_study_session_incomplete_scheduled', ['scheduled_time'], unique=False,
+                              postgresql_where=sa.text('completed = false'),
+                              sqlite_where=sa.text('completed = 0'))
+
+    with op.batch_alter_table('group_membership', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_group_membership_group_user', ['group_id', 'user_id'])
+        batch_op.create_index('ix_group_membership_user_id', ['user_id'], unique=False)
+
+    with op.batch_alter_table('group_study_session', schema=None) as batch_op:
+        batch_op.create_index('ix_group_study_session_group_id', ['group_id'], unique=False)
+
+    with op.batch_alter_table('task', schema=None) as batch_op:
+        batch_op.create_index('ix_task_user_id', ['user_id'], unique=False)
+
+    with op.batch_alter_table('user_achievement', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_user_achievement_user_achievement', ['user_id', 'achievement_id'])
+
+    with op.batch_alter_table('point_transaction', schema=None) as batch_op:
+        batch_op.create_index('ix_point_transaction_user_created', ['user_id', 'created_at'], unique=False)
+
+    with op.batch_alter_table('user_profile', schema=None) as batch_op:
+        batch_op.create_index('ix_user_profile_user_id', ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('user_profile', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_profile_user_id')
+
+    with op.batch_alter_table('point_transaction', schema=None) as batch_op:
+        batch_op.drop_index('ix_point_transaction_user_created')
+
+    with op.batch_alter_table('user_achievement', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_user_achievement_user_achievement', type_='unique')
+
+    with op.batch_alter_table('task', schema=None) as batch_op:
+        batch_op.drop_index('ix_task_user_id')
+
+    with op.batch_alter_table('group_study_session', schema=None) as batch_op:
+        batch_op.drop_index('ix_group_study_session_group_id')
+
+    with op.batch_alter_table('group_membership', schema=None) as batch_op:
+        batch_op.drop_index('ix_group_membership_user_id')
+        batch_op.drop_constraint('uq_group_membership_group_user', type_='unique')
+
+    with op.batch_alter_table('study_session', schema=None) as batch_op:
+        batch_op.drop_index('ix_study_session_incomplete_scheduled')
+        batch_op.drop_index('ix_study_session_user_completed_scheduled')
@@ -1,25 +1,34 @@
 # backend/routes/auth.py - Add JWT functionality
-from flask import Blueprint, request, jsonify, make_response
+from functools import wraps
+from flask import Blueprint, current_app, request, jsonify, make_response, g
+from werkzeug.local import LocalProxy
 from backend.database.models import User, db
-from werkzeug.security import generate_password_hash, check_password_hash
 from sqlalchemy.exc import IntegrityError
 from backend.utils.error_handler import handle_error
+from backend.utils.passwords import PasswordHasherBusy, get_password_hasher
+from backend.utils.revocation import get_revocation_list
+from backend.utils.tokens import (
+    InvalidRefreshToken, TokenRevoked, get_user_cache, issue_tokens, revoke_refresh_token, rotate_refresh_token,
+    verify_access_token
+)
 import jwt
 import datetime
-import os
 
 auth_bp = Blueprint('auth', __name__)
 
-# Get JWT secret from environment or config
-JWT_SECRET = os.getenv('JWT_SECRET_KEY', 'default_secret_key')
-JWT_EXPIRATION = 24 * 60 * 60  # 24 hours in seconds
-
 @auth_bp.route('/register', methods=['OPTIONS'])
 @auth_bp.route('/login', methods=['OPTIONS'])
+@auth_bp.route('/refresh', methods=['OPTIONS'])
+@auth_bp.route('/logout', methods=['OPTIONS'])
 def auth_options():
     response = make_response()
     return response
 
+def busy():
+    response, status = handle_error('Too many sign-ins right now, please retry shortly', 503)
+    response.headers['Retry-After'] = '1'
+    return response, status
+
 @auth_bp.route('/register', methods=['POST'])
 def register():
     try:
@@ -27,7 +36,7 @@ def register():
         if not data.get('username') or not data.get('email') or not data.get('password'):
             return handle_error('Missing required fields', 400)
 
-        hashed_password = generate_password_hash(data['password'], method='pbkdf2:sha256')
+        hashed_password = get_password_hasher().hash(data['password'])
         new_user = User(username=data['username'], email=data['email'], password=hashed_password)
 
         db.session.add(new_user)
@@ -41,6 +50,8 @@ def register():
     except IntegrityError:
         db.session.rollback()
         return handle_error('User with this email or username already exists.', 409)
+    except PasswordHasherBusy:
+        return busy()
     except Exception as e:
         print(f"Registration error: {str(e)}")
         return handle_error('An error occurred during registration.', 500)
@@ -53,33 +64,76 @@ def login():
             return handle_error('Missing email or password', 400)
 
         user = User.query.filter_by(email=data['email']).first()
+        valid, new_hash = get_password_hasher().verify(user.password if user else None, data['password'])
 
-        if user and check_password_hash(user.password, data['password']):
-            # Generate JWT token
-            payload = {
-                'user_id': user.id,
-                'username': user.username,
-                'exp': datetime.datetime.utcnow() + datetime.timedelta(seconds=JWT_EXPIRATION)
-            }
-            token = jwt.encode(payload, JWT_SECRET, algorithm='HS256')
+        if user and valid:
+            # Upgrade legacy or weaker hashes while we have the plain password
+            if new_hash:
+                user.password = new_hash
+
+            # Short-lived access token plus a refresh token to renew it
+            tokens = issue_tokens(user)
+            db.session.commit()
             
             return jsonify({
                 'message': 'Login successful!',
                 'user_id': user.id,
                 'username': user.username,
-                'token': token
+                **tokens
             }), 200
         else:
             return handle_error('Invalid email or password', 401)
 
+    except PasswordHasherBusy:
+        return busy()
     except Exception as e:
         print(f"Login error: {str(e)}")
         return handle_error('An error occurred during login', 500)
 
+@auth_bp.route('/refresh', methods=['POST'])
+def refresh():
+    data = request.get_json(silent=True) or {}
+    if not data.get('refresh_token'):
+        return handle_error('Missing refresh token', 400)
+    try:
+        tokens = rotate_refresh_token(data['refresh_token'])
+        db.session.commit()
+        return jsonify(tokens), 200
+    except InvalidRefreshToken as e:
+        db.session.commit()  # keep the family revocation when a spent token was replayed
+        return handle_error(str(e), 401)
+    except Exception as e:
+        db.session.rollback()
+        print(f"Token refresh error: {str(e)}")
+        return handle_error('An error occurred while refreshing the token', 500)
+
+@auth_bp.route('/logout', methods=['POST'])
+def logout():
+    """Revoke the Bearer access token and, if given, the refresh token's whole login."""
+    data = request.get_json(silent=True) or {}
+    auth_header = request.headers.get('Authorization', '')
+    revoked = False
+    try:
+        if auth_header.startswith('Bearer '):
+            try:
+                claims = verify_access_token(auth_header[7:])
+            except jwt.InvalidTokenError:
+                claims = {}  # expired or already revoked: nothing left to revoke
+            if claims.get('jti') and claims.get('exp'):
+                get_revocation_list().revoke(claims['jti'], datetime.datetime.utcfromtimestamp(claims['exp']))
+                revoked = True
+        if data.get('refresh_token'):
+            revoked = revoke_refresh_token(data['refresh_token']) or revoked
+        db.session.commit()
+        return jsonify({'message': 'Logged out' if revoked else 'Nothing to revoke'}), 200
+    except Exception as e:
+        db.session.rollback()
+        print(f"Logout error: {str(e)}")
+        return handle_error('An error occurred during logout', 500)
+
 # Authentication middleware - to be used with other routes
 def token_required(f):
-    from functools import wraps
-    
+    """Reject requests without a valid Bearer token; sets g.current_user_id and g.token_claims."""
     @wraps(f)
     def decorated(*args, **kwargs):
         token = None
@@ -92,15 +146,51 @@ def token_required(f):
             return handle_error('Token is missing', 401)
         
         try:
-            payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
-            user_id = payload['user_id']
-            # You can attach the user to the request here if needed
-            # g.user = User.query.get(user_id)
+            # Repeat tokens are answered from the verifier's cache, revocations from a Bloom filter
+            claims = verify_access_token(token)
+            user_id = claims['user_id']
         except jwt.ExpiredSignatureError:
             return handle_error('Token has expired', 401)
-        except jwt.InvalidTokenError:
+        except TokenRevoked:
+            return handle_error('Token has been revoked', 401)
+        except (jwt.InvalidTokenError, KeyError):
             return handle_error('Invalid token', 401)
-            
+
+        g.token_claims = claims
+        g.current_user_id = user_id
+        g.pop('current_user', None)  # loaded on first use by current_user
         return f(*args, **kwargs)
     
     return decorated
+
+def is_admin(user_id):
+    admins = current_app.config.get('ADMIN_USER_IDS') or ''
+    return str(user_id) in {item.strip() for item in admins.split(',') if item.strip()}
+
+def admin_required(f):
+    """Like token_required, and the token's user must be listed in ADMIN_USER_IDS."""
+    @wraps(f)
+    @token_required
+    def decorated(*args, **kwargs):
+        if not is_admin(g.current_user_id):
+            return handle_error('Admin access required', 403)
+        return f(*args, **kwargs)
+
+    return decorated
+
+def get_current_user():
+    """The authenticated User for this request (None if it no longer exists), from the per-worker user cache."""
+    if 'current_user' not in g:
+        user_id = g.get('current_user_id')
+        g.current_user = get_user_cache().get(user_id) if user_id is not None else None
+    return g.current_user
+
+current_user = LocalProxy(get_current_user)
+
+@auth_bp.route('/me', methods=['GET'])
+@token_required
+def me():
+    user = current_user._get_current_object()
+    if user is None:
+        return handle_error('User not found', 404)
+    return jsonify({'user_id': user.id, 'username': user.username, 'email': user.email}), 200
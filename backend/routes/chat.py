@@ -1,8 +1,26 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, g, request, jsonify, Response
+import datetime
+import functools
+import jwt
+import math
 import openai
 import os
+import json
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from backend.llm import (
+    ANONYMOUS, CircuitBreaker, CircuitOpenError, LLMBusyError, estimate_prompt_tokens, get_gateway,
+    get_rate_limiter, usage_ledger
+)
+from backend.database.models import ChatThread, ChatTurn, LLMUsageDaily, db
+from backend.routes.auth import admin_required, token_required
+from backend.utils.coach_context import get_coach_context_cache
+from backend.utils.conversation import ConversationMemory, summarize_with_model
 from backend.utils.error_handler import handle_error
+from backend.utils.response_cache import get_response_cache
+from backend.utils.tokens import verify_access_token
 
 load_dotenv()
 
@@ -16,8 +34,138 @@ USE_OPENAI_API = os.getenv("USE_OPENAI_API", "False") == "True"
 if not OPENAI_API_KEY:
     raise ValueError("OpenAI API Key is missing. Please check your .env file.")
 
-# Initialize OpenAI client
-client = openai.Client(api_key=OPENAI_API_KEY)
+DEFAULT_SYSTEM_PROMPT = "You are a helpful study assistant. You help students plan, stay motivated, and understand difficult concepts."
+
+MOCK_RESPONSES = {
+    "Tell me a joke.": "Why did the chicken cross the road? To get to the other side!",
+    "What is AI?": "AI stands for Artificial Intelligence, which enables machines to simulate human intelligence.",
+    "Who are you?": "I am your AI-powered study assistant, here to help you learn efficiently!"
+}
+
+MAX_COMPLETION_TOKENS = 300
+
+# Streaming completions run on their own bounded pool so upstream concurrency is capped
+# independently of the number of request workers
+STREAM_WORKERS = int(os.getenv("CHAT_STREAM_WORKERS", "16"))
+STREAM_IDLE_TIMEOUT = float(os.getenv("CHAT_STREAM_IDLE_TIMEOUT", "60"))
+_stream_pool = ThreadPoolExecutor(max_workers=STREAM_WORKERS, thread_name_prefix='chat-stream')
+_stream_slots = threading.BoundedSemaphore(STREAM_WORKERS)
+
+
+def mock_response(user_message):
+    # Return a predefined response if available, otherwise a generic message
+    return MOCK_RESPONSES.get(user_message, f"(Mock Response) You asked: '{user_message}'. Here's a helpful suggestion.")
+
+
+def check_message(data):
+    """Return an error response if the message or system prompt is missing, malformed or too long."""
+    user_message = data.get('message', '')
+    system_prompt = data.get('system', DEFAULT_SYSTEM_PROMPT)
+    if not user_message:
+        return handle_error('Message is required', 400)
+    if not isinstance(user_message, str) or not isinstance(system_prompt, str):
+        return handle_error('Message and system prompt must be strings', 400)
+    if len(user_message) > current_app.config.get('CHAT_MAX_MESSAGE_CHARS', 4000):
+        return handle_error('Message is too long', 413)
+    if len(system_prompt) > current_app.config.get('CHAT_MAX_SYSTEM_CHARS', 2000):
+        return handle_error('System prompt is too long', 413)
+    return None
+
+
+def caller_identity():
+    """Return (rate limit key, usage user_id): the token's user if one is sent, else the client address."""
+    auth_header = request.headers.get('Authorization', '')
+    if auth_header.startswith('Bearer '):
+        try:
+            user_id = verify_access_token(auth_header[7:])['user_id']
+            return str(user_id), user_id
+        except (jwt.InvalidTokenError, KeyError):
+            pass
+    return f"anon:{request.remote_addr}", ANONYMOUS
+
+
+def reserve_tokens(operation, messages):
+    """Reserve the call's estimated tokens against the caller's and the global budget.
+
+    Returns (settle, None) when admitted, or (None, 429 response with
+    Retry-After) when over budget. settle() must be called once the call
+    ends, with the provider's usage (None if the call failed); pass
+    abandoned=True to keep the whole reservation charged when the client
+    went away part way through.
+    """
+    caller, user_id = caller_identity()
+    limiter = get_rate_limiter(current_app.config)
+    reserved = estimate_prompt_tokens(messages) + MAX_COMPLETION_TOKENS
+    if limiter is not None:
+        wait = limiter.reserve(caller, reserved)
+        if wait:
+            usage_ledger.record(user_id, operation, rejected=True)
+            body, status = handle_error('Token budget exceeded, please retry later', 429)
+            return None, (body, status, {'Retry-After': str(math.ceil(wait))})
+
+    def settle(usage=None, abandoned=False):
+        prompt_tokens = usage.prompt_tokens if usage else 0
+        completion_tokens = usage.completion_tokens if usage else 0
+        if limiter is not None and not abandoned:
+            limiter.settle(caller, reserved, prompt_tokens + completion_tokens)
+        usage_ledger.record(user_id, operation, prompt_tokens, completion_tokens)
+
+    return settle, None
+
+
+def flush_usage():
+    usage_ledger.maybe_flush(current_app.config.get('LLM_USAGE_FLUSH_SECONDS', 10))
+
+
+def memory_options():
+    config = current_app.config
+    return {'window_tokens': int(config.get('CHAT_MEMORY_WINDOW_TOKENS', 1500)),
+            'summary_tokens': int(config.get('CHAT_MEMORY_SUMMARY_TOKENS', 300))}
+
+
+def load_memory(data):
+    """Return (memory, None) for the request's thread_id (None without one), or (None, error response)."""
+    thread_id = data.get('thread_id')
+    if thread_id is None:
+        return None, None
+    if not isinstance(thread_id, int):
+        return None, handle_error('thread_id must be an integer', 400)
+    _, user_id = caller_identity()
+    if user_id == ANONYMOUS:
+        return None, handle_error('Token is missing', 401)
+    memory = ConversationMemory.load(user_id, thread_id, **memory_options())
+    if memory is None:
+        return None, handle_error('Thread not found', 404)
+    return memory, None
+
+
+def remember(memory, user_message, answer):
+    """Store the exchange in its thread, compacting the thread once its window overflows, and commit."""
+    memory.add_exchange(user_message, answer)
+    if memory.needs_compaction():
+        summarize = None
+        if USE_OPENAI_API and get_gateway().breaker.state != CircuitBreaker.OPEN:
+            summarize = functools.partial(summarize_with_model, user_id=memory.thread.user_id)
+        memory.compact(summarize)
+    db.session.commit()
+
+
+def build_messages(data):
+    system_prompt = data.get('system')
+    if system_prompt is None:
+        # The coaching prompt is personalised from the caller's onboarding profile; caller-supplied
+        # prompts are task instructions (e.g. plan extraction) and are sent as given
+        system_prompt = DEFAULT_SYSTEM_PROMPT
+        _, user_id = caller_identity()
+        if user_id != ANONYMOUS:
+            context = get_coach_context_cache().get(user_id)
+            if context:
+                system_prompt += "\n\n" + context
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": data.get('message', '')}
+    ]
+
 
 # Chat endpoint
 @chat_bp.route('/', methods=['POST'])
@@ -26,32 +174,47 @@ def chat_with_ai():
         data = request.get_json()
         user_message = data.get('message', '')
 
-        if not user_message:
-            return handle_error('Message is required', 400)
+        error = check_message(data)
+        if error is not None:
+            return error
+        memory, error = load_memory(data)
+        if error is not None:
+            return error
 
         # Return mock response if AI response is disabled
         if not USE_OPENAI_API:
-            mock_responses = {
-                "Tell me a joke.": "Why did the chicken cross the road? To get to the other side!",
-                "What is AI?": "AI stands for Artificial Intelligence, which enables machines to simulate human intelligence.",
-                "Who are you?": "I am your AI-powered study assistant, here to help you learn efficiently!"
-            }
-            # Return a predefined response if available, otherwise a generic message
-            mock_response = mock_responses.get(user_message, f"(Mock Response) You asked: '{user_message}'. Here's a helpful suggestion.")
-            return jsonify({'response': mock_response}), 200
-
-        # Call OpenAI API
-        system_prompt = data.get('system', "You are a helpful study assistant. You help students plan, stay motivated, and understand difficult concepts.")
-        user_message = data.get('message', '')
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_message}
-            ],
-            max_tokens=300,
-            temperature=0.7
-        )
+            answer = mock_response(user_message)
+            if memory is not None:
+                remember(memory, user_message, answer)
+            return jsonify({'response': answer}), 200
+
+        # Threads carry their own history, so only stateless questions go through the response cache
+        messages = build_messages(data)
+        system_prompt = messages[0]['content']
+        cache = get_response_cache()
+        if memory is not None:
+            messages = memory.prompt(system_prompt, user_message)
+            cache = None
+        if cache is not None:
+            cached, kind = cache.lookup(system_prompt, user_message)
+            if cached is not None:
+                return jsonify({'response': cached}), 200, {'X-Cache': kind}
+
+        settle, over_budget = reserve_tokens('chat', messages)
+        if over_budget is not None:
+            return over_budget
+
+        # Call OpenAI API through the shared gateway; fail fast to the mock reply while it is down
+        try:
+            response = get_gateway().chat(messages, operation='chat', max_tokens=MAX_COMPLETION_TOKENS, temperature=0.7)
+        except CircuitOpenError:
+            settle()
+            return jsonify({'response': mock_response(user_message), 'degraded': True}), 200, {'X-Cache': 'miss'}
+        except Exception:
+            settle()
+            raise
+        settle(response.usage)
+        flush_usage()
 
         # Parse API response
         choices = response.choices
@@ -59,11 +222,272 @@ def chat_with_ai():
             return handle_error('No valid response from OpenAI', 500)
 
         answer = choices[0].message.content.strip()
-        return jsonify({'response': answer}), 200
+        if cache is not None:
+            tokens = response.usage.total_tokens if response.usage else 0
+            cache.store_response(system_prompt, user_message, answer, tokens)
+        if memory is not None:
+            remember(memory, user_message, answer)
+        return jsonify({'response': answer}), 200, {'X-Cache': 'miss'}
 
+    except LLMBusyError:
+        return handle_error('Chat is busy, please retry shortly', 503)
     except openai.OpenAIError as e:  # Handle OpenAI API errors
         print(f"OpenAI API Error: {str(e)}")
         return handle_error(f"OpenAI API error: {str(e)}", 500)
     except Exception as e:
         print(f"Chatbot Error: {str(e)}")
         return handle_error('An error occurred while processing your request', 500)
+
+
+def sse_event(data, event=None):
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+def _pump_completion(messages, out, cancelled, settle):
+    """Run the streaming OpenAI call and push ('delta'|'done'|'error', payload) items onto out."""
+    usage, abandoned = None, False
+    try:
+        stream = get_gateway().stream(messages, operation='chat_stream', max_tokens=MAX_COMPLETION_TOKENS,
+                                      temperature=0.7)
+        try:
+            for chunk in stream:
+                if cancelled.is_set():
+                    abandoned = True
+                    return
+                if chunk.usage:
+                    usage = chunk.usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    out.put(('delta', chunk.choices[0].delta.content))
+        finally:
+            stream.close()
+        out.put(('done', usage.total_tokens if usage else 0))
+    except CircuitOpenError:
+        out.put(('error', 'The assistant is temporarily unavailable'))
+    except LLMBusyError:
+        out.put(('error', 'Chat is busy, please retry shortly'))
+    except openai.OpenAIError as e:
+        print(f"OpenAI API Error: {str(e)}")
+        out.put(('error', f"OpenAI API error: {str(e)}"))
+    except Exception as e:
+        print(f"Chatbot Error: {str(e)}")
+        out.put(('error', 'An error occurred while processing your request'))
+    finally:
+        settle(usage, abandoned)
+
+
+def _relay(out, cancelled, on_done=None):
+    parts = []
+    while True:
+        try:
+            kind, payload = out.get(timeout=STREAM_IDLE_TIMEOUT)
+        except queue.Empty:
+            yield sse_event({'error': 'Timed out waiting for the model'}, 'error')
+            return
+        if kind == 'delta':
+            parts.append(payload)
+            yield sse_event({'delta': payload})
+        elif kind == 'done':
+            answer = ''.join(parts).strip()
+            if on_done is not None:
+                on_done(answer, payload)
+            yield sse_event({'response': answer}, 'done')
+            return
+        else:
+            yield sse_event({'error': payload}, 'error')
+            return
+
+
+def _stream_closer(cancelled):
+    """Stop the upstream stream and free its slot, once, when the server closes the response.
+
+    The WSGI server closes every response it started, also when the client
+    disconnected before the body was first iterated, which a finally block
+    in the body generator would never see.
+    """
+    lock = threading.Lock()
+
+    def close():
+        with lock:
+            if not cancelled.is_set():
+                cancelled.set()
+                _stream_slots.release()
+    return close
+
+
+def _mock_stream(user_message):
+    text = mock_response(user_message)
+    for word in text.split(' '):
+        yield sse_event({'delta': word + ' '})
+    yield sse_event({'response': text}, 'done')
+
+
+def _cached_stream(text):
+    yield sse_event({'delta': text})
+    yield sse_event({'response': text}, 'done')
+
+
+# Streaming chat endpoint (server-sent events).
+# Emits `data: {"delta": ...}` per token chunk, then `event: done` with the full response
+# (or `event: error`).
+@chat_bp.route('/stream', methods=['POST'])
+def chat_stream():
+    data = request.get_json() or {}
+    user_message = data.get('message', '')
+    error = check_message(data)
+    if error is not None:
+        return error
+    memory, error = load_memory(data)
+    if error is not None:
+        return error
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    if not USE_OPENAI_API:
+        if memory is not None:
+            remember(memory, user_message, mock_response(user_message))
+        return Response(_mock_stream(user_message), mimetype='text/event-stream', headers=headers)
+
+    messages = build_messages(data)
+    system_prompt = messages[0]['content']
+    cache = get_response_cache()
+    on_done = None
+    if memory is not None:
+        # The answer arrives after this request's context is gone; store it from a fresh app context
+        messages = memory.prompt(system_prompt, user_message)
+        cache = None
+        app = current_app._get_current_object()
+        user_id, thread_id, options = memory.thread.user_id, memory.thread.id, memory_options()
+
+        def on_done(answer, tokens):
+            with app.app_context():
+                thread_memory = ConversationMemory.load(user_id, thread_id, **options)
+                if thread_memory is not None:
+                    remember(thread_memory, user_message, answer)
+    if cache is not None:
+        cached, kind = cache.lookup(system_prompt, user_message)
+        if cached is not None:
+            headers['X-Cache'] = kind
+            return Response(_cached_stream(cached), mimetype='text/event-stream', headers=headers)
+
+        def on_done(answer, tokens):
+            cache.store_response(system_prompt, user_message, answer, tokens)
+
+    # Provider is failing: answer from the mock responses instead of waiting on it
+    if get_gateway().breaker.state == CircuitBreaker.OPEN:
+        headers['X-Cache'] = 'miss'
+        return Response(_mock_stream(user_message), mimetype='text/event-stream', headers=headers)
+
+    # Usage of earlier streams was recorded by their pump threads
+    flush_usage()
+    if not _stream_slots.acquire(blocking=False):
+        return handle_error('Chat is busy, please retry shortly', 503)
+    settle, over_budget = reserve_tokens('chat_stream', messages)
+    if over_budget is not None:
+        _stream_slots.release()
+        return over_budget
+
+    out = queue.Queue()
+    cancelled = threading.Event()
+    close = _stream_closer(cancelled)
+    try:
+        _stream_pool.submit(_pump_completion, messages, out, cancelled, settle)
+    except Exception:
+        close()
+        settle()
+        raise
+    headers['X-Cache'] = 'miss'
+    response = Response(_relay(out, cancelled, on_done), mimetype='text/event-stream', headers=headers)
+    response.call_on_close(close)
+    return response
+
+
+# Response cache statistics (admins only)
+@chat_bp.route('/cache/stats', methods=['GET'])
+@admin_required
+def chat_cache_stats():
+    cache = get_response_cache()
+    if cache is None:
+        return jsonify({'enabled': False}), 200
+    return jsonify(dict(cache.stats(), enabled=True)), 200
+
+
+# Model call metrics for this worker
+@chat_bp.route('/llm/stats', methods=['GET'])
+@admin_required
+def llm_stats():
+    gateway = get_gateway()
+    return jsonify({'circuit': gateway.breaker.state, 'operations': gateway.metrics.snapshot()}), 200
+
+
+# Daily model usage of the calling user
+@chat_bp.route('/usage', methods=['GET'])
+@token_required
+def chat_usage():
+    user_id = g.current_user_id
+    days = min(request.args.get('days', 30, type=int), 366)
+    usage_ledger.flush()
+    since = datetime.date.today() - datetime.timedelta(days=days - 1)
+    rows = (LLMUsageDaily.query
+            .filter(LLMUsageDaily.user_id == user_id, LLMUsageDaily.day >= since)
+            .order_by(LLMUsageDaily.day, LLMUsageDaily.operation)
+            .all())
+    return jsonify([{
+        'day': row.day.isoformat(),
+        'operation': row.operation,
+        'requests': row.requests,
+        'rejected': row.rejected,
+        'prompt_tokens': row.prompt_tokens,
+        'completion_tokens': row.completion_tokens,
+    } for row in rows]), 200
+
+
+# Conversation threads of the calling user
+@chat_bp.route('/threads', methods=['POST'])
+@token_required
+def create_thread():
+    user_id = g.current_user_id
+    data = request.get_json(silent=True) or {}
+    thread = ChatThread(user_id=user_id, title=(data.get('title') or '')[:200] or None)
+    db.session.add(thread)
+    db.session.commit()
+    return jsonify({'id': thread.id, 'title': thread.title}), 201
+
+
+@chat_bp.route('/threads', methods=['GET'])
+@token_required
+def list_threads():
+    user_id = g.current_user_id
+    threads = (db.session.query(ChatThread.id, ChatThread.title, ChatThread.updated_at)
+               .filter(ChatThread.user_id == user_id)
+               .order_by(ChatThread.updated_at.desc())
+               .limit(50)
+               .all())
+    return jsonify([{'id': t.id, 'title': t.title, 'updated_at': t.updated_at.isoformat()} for t in threads]), 200
+
+
+@chat_bp.route('/threads/<int:thread_id>', methods=['GET'])
+@token_required
+def get_thread(thread_id):
+    user_id = g.current_user_id
+    memory = ConversationMemory.load(user_id, thread_id, **memory_options())
+    if memory is None:
+        return handle_error('Thread not found', 404)
+    return jsonify({
+        'id': memory.thread.id,
+        'title': memory.thread.title,
+        'summary': memory.summary,
+        'turns': memory.transcript(),
+    }), 200
+
+
+@chat_bp.route('/threads/<int:thread_id>', methods=['DELETE'])
+@token_required
+def delete_thread(thread_id):
+    user_id = g.current_user_id
+    thread = ChatThread.query.filter_by(id=thread_id, user_id=user_id).first()
+    if thread is None:
+        return handle_error('Thread not found', 404)
+    ChatTurn.query.filter_by(thread_id=thread.id).delete()
+    db.session.delete(thread)
+    db.session.commit()
+    return jsonify({'message': 'Thread deleted'}), 200
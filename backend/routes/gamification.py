@@ -6,6 +6,10 @@ from backend.database.models import (
 )
 from backend.utils.error_handler import handle_error
 from backend.routes.auth import token_required
+from backend.utils.achievement_engine import pending_achievements, rebuild_stats
+from backend.utils.achievement_catalog import get_catalog
+from backend.utils.point_ledger import PointLedger, level_for
+from backend.utils.leaderboard import get_leaderboard_store, rebuild_leaderboard
 from datetime import datetime, timedelta
 from sqlalchemy import func
 
@@ -61,123 +65,29 @@ def initialize_achievements():
         print("Default achievements created")
 
 # Helper function to check and award achievements
-def check_achievements(user_id):
-    # Get user's completed study sessions
-    completed_sessions = StudySession.query.filter_by(
-        user_id=user_id, 
-        completed=True
-    ).all()
-    
-    awarded = []
-    
-    # Check for "First Steps" achievement
-    if len(completed_sessions) > 0:
-        first_steps = Achievement.query.filter_by(name='First Steps').first()
-        if first_steps:
-            existing = UserAchievement.query.filter_by(
-                user_id=user_id, 
-                achievement_id=first_steps.id
-            ).first()
-            
-            if not existing:
-                award_achievement(user_id, first_steps.id)
-                awarded.append(first_steps)
-    
-    # Check for "Study Streak" achievement
-    if len(completed_sessions) >= 3:
-        # Group sessions by day
-        days_with_sessions = set()
-        for session in completed_sessions:
-            days_with_sessions.add(session.scheduled_time.date())
-        
-        # Sort days
-        sorted_days = sorted(list(days_with_sessions))
-        
-        # Check for streak of 3 consecutive days
-        for i in range(len(sorted_days) - 2):
-            if (sorted_days[i+1] - sorted_days[i]).days == 1 and \
-               (sorted_days[i+2] - sorted_days[i+1]).days == 1:
-                streak = Achievement.query.filter_by(name='Study Streak').first()
-                if streak:
-                    existing = UserAchievement.query.filter_by(
-                        user_id=user_id, 
-                        achievement_id=streak.id
-                    ).first()
-                    
-                    if not existing:
-                        award_achievement(user_id, streak.id)
-                        awarded.append(streak)
-                break
-    
-    # Check for "Focus Master" achievement
-    if len(completed_sessions) >= 5:
-        # Group sessions by day
-        sessions_by_day = {}
-        for session in completed_sessions:
-            day = session.scheduled_time.date()
-            if day not in sessions_by_day:
-                sessions_by_day[day] = []
-            sessions_by_day[day].append(session)
-        
-        # Find day with most sessions
-        max_sessions_in_day = max([len(sessions) for _, sessions in sessions_by_day.items()])
-        
-        if max_sessions_in_day >= 5:
-            focus = Achievement.query.filter_by(name='Focus Master').first()
-            if focus:
-                existing = UserAchievement.query.filter_by(
-                    user_id=user_id, 
-                    achievement_id=focus.id
-                ).first()
-                
-                if not existing:
-                    award_achievement(user_id, focus.id)
-                    awarded.append(focus)
-    
-    # Check for "Subject Expert" achievement
-    if len(completed_sessions) >= 10:
-        # Group sessions by subject
-        sessions_by_subject = {}
-        for session in completed_sessions:
-            subject = session.subject
-            if subject not in sessions_by_subject:
-                sessions_by_subject[subject] = []
-            sessions_by_subject[subject].append(session)
-        
-        # Find subject with most sessions
-        subject_counts = [(subject, len(sessions)) for subject, sessions in sessions_by_subject.items()]
-        max_subject = max(subject_counts, key=lambda x: x[1])
-        
-        if max_subject[1] >= 10:
-            expert = Achievement.query.filter_by(name='Subject Expert').first()
-            if expert:
-                existing = UserAchievement.query.filter_by(
-                    user_id=user_id, 
-                    achievement_id=expert.id
-                ).first()
-                
-                if not existing:
-                    award_achievement(user_id, expert.id)
-                    awarded.append(expert)
-    
-    # Check for "Time Wizard" achievement
-    total_minutes = sum([session.duration for session in completed_sessions])
-    if total_minutes >= 24 * 60:  # 24 hours in minutes
-        wizard = Achievement.query.filter_by(name='Time Wizard').first()
-        if wizard:
-            existing = UserAchievement.query.filter_by(
-                user_id=user_id, 
-                achievement_id=wizard.id
-            ).first()
-            
-            if not existing:
-                award_achievement(user_id, wizard.id)
-                awarded.append(wizard)
-    
+def check_achievements(user_id, ledger=None):
+    # Rules are evaluated against the running aggregates kept by the achievement
+    # engine, so this no longer scales with the user's session history
+    own_ledger = ledger is None
+    if own_ledger:
+        ledger = PointLedger()
+
+    awarded = pending_achievements(user_id)
+    for achievement in awarded:
+        award_achievement(user_id, achievement.id, ledger)
+
+    if own_ledger:
+        ledger.apply()
+        db.session.commit()
     return awarded
 
 # Helper function to award achievement and points
-def award_achievement(user_id, achievement_id):
+def award_achievement(user_id, achievement_id, ledger=None):
+    # Get achievement points
+    achievement = get_catalog().get(achievement_id)
+    if not achievement:
+        return
+
     # Add user achievement
     user_achievement = UserAchievement(
         user_id=user_id,
@@ -185,51 +95,32 @@ def award_achievement(user_id, achievement_id):
     )
     db.session.add(user_achievement)
     
-    # Get achievement points
-    achievement = Achievement.query.get(achievement_id)
-    if not achievement:
-        return
-    
-    # Add points
-    add_points(user_id, achievement.points, f"Achievement: {achievement.name}")
-    
-    db.session.commit()
+    # Add points; without a ledger this is a standalone write
+    add_points(user_id, achievement.points, f"Achievement: {achievement.name}", ledger)
 
 # Helper function to add points
-def add_points(user_id, amount, reason=""):
-    # Get or create user points record
-    user_points = UserPoints.query.filter_by(user_id=user_id).first()
-    if not user_points:
-        user_points = UserPoints(user_id=user_id)
-        db.session.add(user_points)
-    
-    # Add points
-    user_points.total_points += amount
-    
-    # Update level - simple level system (level = points / 100)
-    new_level = (user_points.total_points // 100) + 1
-    level_up = new_level > user_points.level
-    user_points.level = new_level
-    
-    # Record transaction
-    transaction = PointTransaction(
-        user_id=user_id,
-        amount=amount,
-        reason=reason
-    )
-    db.session.add(transaction)
-    
+def add_points(user_id, amount, reason="", ledger=None):
+    """Queue points on ledger, or apply and commit them immediately when no ledger is given.
+
+    Returns whether the user levelled up (None while the entry is only queued).
+    """
+    if ledger is not None:
+        ledger.add(user_id, amount, reason)
+        return None
+
+    ledger = PointLedger()
+    ledger.add(user_id, amount, reason)
+    result = ledger.apply()[user_id]
     db.session.commit()
-    return level_up
+    return result.level_up
 
 @gamification_bp.route('/achievements', methods=['GET'])
 @token_required
 def get_all_achievements():
     try:
-        achievements = Achievement.query.all()
         result = []
         
-        for achievement in achievements:
+        for achievement in get_catalog().entries:
             result.append({
                 'id': achievement.id,
                 'name': achievement.name,
@@ -249,10 +140,13 @@ def get_all_achievements():
 def get_user_achievements(user_id):
     try:
         user_achievements = UserAchievement.query.filter_by(user_id=user_id).all()
+        catalog = get_catalog()
         result = []
         
         for ua in user_achievements:
-            achievement = ua.achievement
+            achievement = catalog.get(ua.achievement_id)
+            if not achievement:
+                continue
             result.append({
                 'id': achievement.id,
                 'name': achievement.name,
@@ -367,14 +261,20 @@ def award_session_points(session_id):
             bonus = 5  # Bonus for consistency
         
         total_points = duration_points + bonus
+
+        # Session points and any achievement points are written in one transaction
+        ledger = PointLedger()
         add_points(
             session.user_id, 
             total_points, 
-            f"Completed study session: {session.subject} ({session.duration} mins)"
+            f"Completed study session: {session.subject} ({session.duration} mins)",
+            ledger
         )
         
         # Check for new achievements
-        awarded = check_achievements(session.user_id)
+        awarded = check_achievements(session.user_id, ledger)
+        ledger.apply()
+        db.session.commit()
         
         achievement_results = []
         for achievement in awarded:
@@ -395,29 +295,70 @@ def award_session_points(session_id):
         print(f"Error awarding session points: {str(e)}")
         return handle_error('An error occurred while awarding points', 500)
 
+# Turn (user_id, points) pairs from the leaderboard into response rows
+def _leaderboard_entries(rows, first_rank):
+    usernames = dict(db.session.query(User.id, User.username).filter(
+        User.id.in_([user_id for user_id, _ in rows])
+    ).all()) if rows else {}
+
+    return [{
+        'rank': first_rank + i,
+        'user_id': user_id,
+        'username': usernames.get(user_id),
+        'total_points': points,
+        'level': level_for(points)
+    } for i, (user_id, points) in enumerate(rows)]
+
 # Get leaderboard
 @gamification_bp.route('/leaderboard', methods=['GET'])
 def get_leaderboard():
     try:
-        leaderboard = db.session.query(
-            UserPoints, User.username
-        ).join(
-            User, UserPoints.user_id == User.id
-        ).order_by(
-            UserPoints.total_points.desc()
-        ).limit(10).all()
-        
-        result = []
-        for user_points, username in leaderboard:
-            result.append({
-                'user_id': user_points.user_id,
-                'username': username,
-                'total_points': user_points.total_points,
-                'level': user_points.level
-            })
-        
-        return jsonify(result), 200
+        limit = min(request.args.get('limit', 10, type=int), 100)
+        offset = max(request.args.get('offset', 0, type=int), 0)
+
+        rows = get_leaderboard_store().range(offset, limit)
+        return jsonify(_leaderboard_entries(rows, offset + 1)), 200
         
     except Exception as e:
         print(f"Error getting leaderboard: {str(e)}")
-        return handle_error('An error occurred while retrieving leaderboard', 500)    
\ No newline at end of file
+        return handle_error('An error occurred while retrieving leaderboard', 500)
+
+# Get a user's rank and the users around them
+@gamification_bp.route('/leaderboard/user/<int:user_id>', methods=['GET'])
+@token_required
+def get_leaderboard_rank(user_id):
+    try:
+        radius = min(max(request.args.get('radius', 2, type=int), 0), 25)
+        leaderboard = get_leaderboard_store()
+
+        rank = leaderboard.rank(user_id)
+        if rank is None:
+            return handle_error('User is not on the leaderboard', 404)
+
+        start = max(rank - radius, 0)
+        neighbours = _leaderboard_entries(leaderboard.range(start, 2 * radius + 1), start + 1)
+
+        return jsonify({
+            'user_id': user_id,
+            'rank': rank + 1,
+            'total_points': leaderboard.score(user_id),
+            'total_users': leaderboard.size(),
+            'neighbours': neighbours
+        }), 200
+
+    except Exception as e:
+        print(f"Error getting leaderboard rank: {str(e)}")
+        return handle_error('An error occurred while retrieving leaderboard rank', 500)
+
+# Rebuild the achievement engine's aggregates from existing study sessions
+@gamification_bp.cli.command('backfill-stats')
+def backfill_stats_command():
+    users = rebuild_stats()
+    db.session.commit()
+    print(f"Rebuilt study stats for {users} users")
+
+# Reload the leaderboard from UserPoints
+@gamification_bp.cli.command('rebuild-leaderboard')
+def rebuild_leaderboard_command():
+    users = rebuild_leaderboard()
+    print(f"Leaderboard rebuilt with {users} users")
@@ -1,40 +1,103 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, g, stream_with_context
+from sqlalchemy import delete, func, insert, update
 from backend.database.models import Task, db
+from backend.routes.auth import admin_required, token_required
+from backend.routes.study_sessions import parse_iso
 from datetime import datetime
+import base64
+import binascii
+import json
+import math
 
 kanban_bp = Blueprint('kanban', __name__, url_prefix='/kanban')
 
+STATUSES = ('todo', 'inProgress', 'done')
+# Fields a client may change; everything else (id, user_id, created_at) is fixed
+EDITABLE_FIELDS = ('title', 'status', 'position')
+MAX_BATCH_OPS = 500
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 1000
+EXPORT_CHUNK_SIZE = 1000
+TASK_COLUMNS = (Task.id, Task.title, Task.status, Task.position, Task.user_id, Task.created_at)
+BATCH_OP_KEYS = ('op', 'id', 'after_id', 'before_id') + EDITABLE_FIELDS
+
+
+def serialize_task(t):
+    return {
+        'id': t.id,
+        'title': t.title,
+        'status': t.status,
+        'position': t.position,
+        'user_id': t.user_id,
+        'created_at': t.created_at.isoformat()
+    }
+
+
+def encode_cursor(task_id):
+    return base64.urlsafe_b64encode(json.dumps([task_id]).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+    value = json.loads(raw)
+    if not isinstance(value, list) or len(value) != 1 or type(value[0]) is not int:
+        raise ValueError('Cursor must encode [task_id]')
+    return value[0]
+
+
+def export_ndjson(query, after_id):
+    """Yield every row of query as one JSON object per line, reading EXPORT_CHUNK_SIZE rows at a time."""
+    while True:
+        rows = query.filter(Task.id > after_id).order_by(Task.id).limit(EXPORT_CHUNK_SIZE).all()
+        if rows:
+            yield ''.join(json.dumps(serialize_task(row)) + '\n' for row in rows)
+        if len(rows) < EXPORT_CHUNK_SIZE:
+            return
+        after_id = rows[-1].id
+
+
+def clean_fields(data):
+    """Validated subset of data that may be written to a task; raises ValueError naming the problem."""
+    unknown = sorted(set(data) - set(EDITABLE_FIELDS))
+    if unknown:
+        raise ValueError(f"Cannot update {', '.join(unknown)}; editable fields are {', '.join(EDITABLE_FIELDS)}")
+    fields = {key: data[key] for key in EDITABLE_FIELDS if key in data}
+    if 'title' in fields and (not isinstance(fields['title'], str) or not fields['title'].strip()):
+        raise ValueError('Title must be a non-empty string')
+    if 'status' in fields and fields['status'] not in STATUSES:
+        raise ValueError(f"Status must be one of {', '.join(STATUSES)}")
+    if 'position' in fields and (isinstance(fields['position'], bool)
+                                 or not isinstance(fields['position'], (int, float))
+                                 or not math.isfinite(fields['position'])):
+        raise ValueError('Position must be a finite number')
+    return fields
+
+
+def end_of_column(user_id, status):
+    last = (db.session.query(func.max(Task.position))
+            .filter(Task.user_id == user_id, Task.status == status)
+            .scalar())
+    return (last or 0) + 1
+
 
 @kanban_bp.route('/', methods=['POST'])
 def add_task():
     data = request.get_json()
+    status = data.get('status', 'todo')
     task = Task(
         user_id=data['user_id'],
         title=data['title'],
-        status=data.get('status', 'todo')
+        status=status,
+        position=end_of_column(data['user_id'], status)
     )
     db.session.add(task)
     db.session.commit()
-    return jsonify({
-        'id': task.id,
-        'title': task.title,
-        'status': task.status,
-        'user_id': task.user_id,
-        'created_at': task.created_at.isoformat()
-    }), 201
+    return jsonify(serialize_task(task)), 201
 
 @kanban_bp.route('/user/<int:user_id>', methods=['GET'])
 def get_user_tasks(user_id):
-    tasks = Task.query.filter_by(user_id=user_id).all()
-    return jsonify([
-        {
-            'id': t.id,
-            'title': t.title,
-            'status': t.status,
-            'user_id': t.user_id,
-            'created_at': t.created_at.isoformat()
-        } for t in tasks
-    ]), 200
+    tasks = Task.query.filter_by(user_id=user_id).order_by(Task.position, Task.id).all()
+    return jsonify([serialize_task(t) for t in tasks]), 200
 
 @kanban_bp.route('/<int:task_id>', methods=['DELETE'])
 def delete_task(task_id):
@@ -45,32 +108,224 @@ def delete_task(task_id):
         return jsonify({'message': 'Deleted'}), 200
     return jsonify({'error': 'Task not found'}), 404
 
+# Admin listing of every user's tasks, oldest first.
+# Query params: user_id, status, from, to (created_at), limit, cursor (from X-Next-Cursor);
+# format=ndjson streams all matching tasks from the cursor on instead of one page.
 @kanban_bp.route('/', methods=['GET'])
+@admin_required
 def get_all_tasks():
-    tasks = Task.query.all()
-    return jsonify([
-        {
-            'id': t.id,
-            'title': t.title,
-            'status': t.status,
-            'user_id': t.user_id,
-            'created_at': t.created_at.isoformat()
-        } for t in tasks
-    ]), 200
+    try:
+        limit = min(max(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+        query = db.session.query(*TASK_COLUMNS)
+        if request.args.get('user_id'):
+            query = query.filter(Task.user_id == int(request.args['user_id']))
+        if request.args.get('status'):
+            query = query.filter(Task.status == request.args['status'])
+        if request.args.get('from'):
+            query = query.filter(Task.created_at >= parse_iso(request.args['from']))
+        if request.args.get('to'):
+            query = query.filter(Task.created_at < parse_iso(request.args['to']))
+        after_id = decode_cursor(request.args['cursor']) if request.args.get('cursor') else 0
+    except (ValueError, TypeError, IndexError, binascii.Error):
+        return jsonify({'error': 'Invalid cursor or filter'}), 400
+
+    if request.args.get('format') == 'ndjson':
+        return Response(stream_with_context(export_ndjson(query, after_id)), mimetype='application/x-ndjson')
+
+    rows = query.filter(Task.id > after_id).order_by(Task.id).limit(limit + 1).all()
+    response = jsonify([serialize_task(row) for row in rows[:limit]])
+    if len(rows) > limit:
+        response.headers['X-Next-Cursor'] = encode_cursor(rows[limit - 1].id)
+    return response, 200
 
 @kanban_bp.route('/<int:task_id>', methods=['PUT'])
 def update_task(task_id):
     task = Task.query.get(task_id)
     if task:
-        data = request.get_json()
-        for key, value in data.items():
+        try:
+            fields = clean_fields(request.get_json() or {})
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        # A card moved to another column without a position goes to the bottom of it
+        if fields.get('status', task.status) != task.status and 'position' not in fields:
+            fields['position'] = end_of_column(task.user_id, fields['status'])
+        for key, value in fields.items():
             setattr(task, key, value)
         db.session.commit()
-        return jsonify({
-            'id': task.id,
-            'title': task.title,
-            'status': task.status,
-            'user_id': task.user_id,
-            'created_at': task.created_at.isoformat()
-        }), 200
+        return jsonify(serialize_task(task)), 200
     return jsonify({'error': 'Task not found'}), 404
+
+
+class BatchError(Exception):
+    def __init__(self, index, message, status=400):
+        super().__init__(message)
+        self.index = index
+        self.status = status
+
+
+class BoardPlan:
+    """One user's board in memory while a batch is planned, so positions are computed without more queries.
+
+    Positions are floats: a card dropped between two others takes the
+    midpoint, so a move writes one row. Only when two neighbours get too
+    close to split (after ~50 drops into the same gap) is the column
+    renumbered.
+    """
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        # id (or ('new', op index) for cards created in this batch) -> [status, position]
+        self.cards = {row.id: [row.status, row.position] for row in
+                      db.session.query(Task.id, Task.status, Task.position).filter(Task.user_id == user_id)}
+        self.changes = {}  # id -> fields to update
+        self.deleted = set()
+
+    def card(self, index, task_id):
+        if task_id not in self.cards or task_id in self.deleted:
+            raise BatchError(index, f"Task {task_id} not found", 404)
+        return self.cards[task_id]
+
+    def place(self, index, status, after_id=None, before_id=None, moving=None):
+        """Position for a card in `status` right after after_id and/or right before before_id (default: bottom)."""
+        for neighbour in (after_id, before_id):
+            if neighbour is not None and self.card(index, neighbour)[0] != status:
+                raise BatchError(index, f"Task {neighbour} is not in {status}")
+        column = sorted(position for key, (card_status, position) in self.cards.items()
+                        if card_status == status and key != moving and key not in self.deleted)
+        low = self.cards[after_id][1] if after_id is not None else None
+        high = self.cards[before_id][1] if before_id is not None else None
+        if after_id is not None and before_id is None:
+            high = next((p for p in column if p > low), None)
+        elif before_id is not None and after_id is None:
+            low = next((p for p in reversed(column) if p < high), None)
+        elif after_id is None:
+            low = column[-1] if column else None
+
+        if low is None and high is None:
+            return 1.0
+        if high is None:
+            return low + 1
+        if low is None:
+            return high - 1
+        middle = (low + high) / 2
+        if low < middle < high:
+            return middle
+        if low >= high:
+            raise BatchError(index, 'after_id must come before before_id')
+        self.renumber(status, moving)
+        return self.place(index, status, after_id, before_id, moving)
+
+    def renumber(self, status, moving=None):
+        keys = sorted((key for key, (card_status, _) in self.cards.items()
+                       if card_status == status and key != moving and key not in self.deleted),
+                      key=lambda key: self.cards[key][1])
+        for number, key in enumerate(keys, start=1):
+            self.cards[key][1] = float(number)
+            if not isinstance(key, tuple):
+                self.changes.setdefault(key, {})['position'] = float(number)
+
+    def set(self, task_id, **fields):
+        card = self.cards[task_id]
+        card[0] = fields.get('status', card[0])
+        card[1] = fields.get('position', card[1])
+        self.changes.setdefault(task_id, {}).update(fields)
+
+
+def plan_batch(user_id, ops):
+    """Validate ops against the board and work out every row to write; nothing is written here."""
+    board = BoardPlan(user_id)
+    inserts, created, results = [], [], []
+    now = datetime.utcnow()
+    for index, op in enumerate(ops):
+        if not isinstance(op, dict):
+            raise BatchError(index, 'Each op must be an object')
+        kind = op.get('op')
+        unknown = sorted(set(op) - set(BATCH_OP_KEYS))
+        if unknown:
+            raise BatchError(index, f"Unknown keys {', '.join(unknown)}; ops take {', '.join(BATCH_OP_KEYS)}")
+        for key in ('id', 'after_id', 'before_id'):
+            # bool is an int subclass, and True would otherwise match task 1
+            if op.get(key) is not None and type(op[key]) is not int:
+                raise BatchError(index, f'{key} must be an integer')
+        try:
+            fields = clean_fields({k: v for k, v in op.items() if k in EDITABLE_FIELDS})
+        except ValueError as e:
+            raise BatchError(index, str(e))
+        after_id, before_id = op.get('after_id'), op.get('before_id')
+
+        if kind == 'create':
+            if 'title' not in fields:
+                raise BatchError(index, 'Title is required')
+            status = fields.get('status', 'todo')
+            position = fields.get('position')
+            if position is None:
+                position = board.place(index, status, after_id, before_id)
+            board.cards[('new', index)] = [status, position]
+            inserts.append({'user_id': user_id, 'title': fields['title'], 'status': status, 'created_at': now})
+            results.append({'op': kind, 'status': status})
+            created.append(index)
+        elif kind in ('update', 'move'):
+            task_id = op.get('id')
+            status, position = board.card(index, task_id)
+            if kind == 'move' or after_id is not None or before_id is not None:
+                status = fields.get('status', status)
+                fields['position'] = board.place(index, status, after_id, before_id, moving=task_id)
+            elif fields.get('status', status) != status and 'position' not in fields:
+                fields['position'] = board.place(index, fields['status'], moving=task_id)
+            board.set(task_id, **fields)
+            results.append({'op': kind, 'id': task_id, **{k: v for k, v in fields.items() if k != 'title'}})
+        elif kind == 'delete':
+            task_id = op.get('id')
+            board.card(index, task_id)
+            board.deleted.add(task_id)
+            results.append({'op': kind, 'id': task_id})
+        else:
+            raise BatchError(index, "op must be one of create, update, move, delete")
+
+    # Positions are final only now: a later op may have renumbered the column
+    for row, index in zip(inserts, created):
+        row['position'] = results[index]['position'] = board.cards[('new', index)][1]
+    updates = [dict(fields, id=task_id) for task_id, fields in board.changes.items() if task_id not in board.deleted]
+    return inserts, updates, sorted(board.deleted), results
+
+
+@kanban_bp.route('/batch', methods=['POST'])
+@token_required
+def batch():
+    """Apply a list of create/update/move/delete ops to the caller's board in one transaction.
+
+    Ops run in order and either all apply or none do. Moves take after_id
+    and/or before_id (neighbours in the target column) and write only the
+    moved card. Updates are sent as one executemany per set of columns.
+    """
+    ops = (request.get_json(silent=True) or {}).get('ops')
+    if not isinstance(ops, list) or not ops:
+        return jsonify({'error': 'ops must be a non-empty list'}), 400
+    if len(ops) > MAX_BATCH_OPS:
+        return jsonify({'error': f'At most {MAX_BATCH_OPS} ops per batch'}), 400
+
+    try:
+        inserts, updates, deletes, results = plan_batch(g.current_user_id, ops)
+    except BatchError as e:
+        return jsonify({'error': str(e), 'op': e.index}), e.status
+
+    try:
+        if deletes:
+            db.session.execute(delete(Task).where(Task.id.in_(deletes)), execution_options={'synchronize_session': False})
+        for keys in {tuple(sorted(row)) for row in updates}:
+            # ORM bulk UPDATE by primary key: one executemany per distinct set of columns
+            db.session.execute(update(Task), [row for row in updates if tuple(sorted(row)) == keys],
+                               execution_options={'synchronize_session': False})
+        if inserts:
+            new_ids = db.session.scalars(insert(Task).returning(Task.id, sort_by_parameter_order=True), inserts).all()
+            created = iter(new_ids)
+            for result in results:
+                if result['op'] == 'create':
+                    result['id'] = next(created)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Kanban batch error: {str(e)}")
+        return jsonify({'error': 'An error occurred while applying the batch'}), 500
+
+    return jsonify({'results': results}), 200
@@ -3,6 +3,7 @@ from flask import Blueprint, request, jsonify
 from backend.database.models import User, UserProfile, db
 from backend.utils.error_handler import handle_error
 from backend.routes.auth import token_required
+from backend.utils.coach_context import get_coach_context_cache, refresh_coach_context
 
 onboarding_bp = Blueprint('onboarding', __name__)
 
@@ -33,9 +34,11 @@ def create_profile():
         
         if 'quiz_responses' in data:
             new_profile.set_quiz_responses(data['quiz_responses'])
-            
+
+        refresh_coach_context(new_profile)
         db.session.add(new_profile)
         db.session.commit()
+        get_coach_context_cache().put(new_profile.user_id, new_profile.context_version, new_profile.coach_context)
         
         return jsonify({'message': 'Profile created successfully', 'profile_id': new_profile.id}), 201
         
@@ -100,8 +103,11 @@ def update_profile(user_id):
             
         if 'quiz_responses' in data:
             profile.set_quiz_responses(data['quiz_responses'])
-            
+
+        changed = refresh_coach_context(profile)
         db.session.commit()
+        if changed:
+            get_coach_context_cache().put(profile.user_id, profile.context_version, profile.coach_context)
         
         return jsonify({'message': 'Profile updated successfully'}), 200
         
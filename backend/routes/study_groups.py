@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify
 from backend.database.models import StudyGroup, GroupMembership, GroupStudySession, User, StudySession
 from backend.database import db
+from sqlalchemy import select, insert, update, delete, literal
+from datetime import datetime
 import random
 import string
 
@@ -70,41 +72,61 @@ def join_group():
 
     return jsonify({'message': 'Successfully joined', 'group_id': group.id})
 
-# Get all groups the user is in
+# Read limit/offset pagination arguments
+def get_page_args(default_limit=100, max_limit=500):
+    limit = min(max(request.args.get('limit', default_limit, type=int), 1), max_limit)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    return limit, offset
+
+# Run one page of a query; returns (rows, offset of the next page or None on the last one)
+def fetch_page(query, limit, offset):
+    rows = query.limit(limit + 1).offset(offset).all()
+    if len(rows) > limit:
+        return rows[:limit], offset + limit
+    return rows, None
+
+# JSON list response that points at the next page with X-Next-Offset
+def page_response(items, next_offset):
+    response = jsonify(items)
+    if next_offset is not None:
+        response.headers['X-Next-Offset'] = str(next_offset)
+    return response
+
+# Get the groups the user is in; paged by limit/offset, X-Next-Offset is set while more remain
 @groups_bp.route('/my', methods=['GET'])
 def my_groups():
     user_id = request.args.get('user_id')
-    memberships = GroupMembership.query.filter_by(user_id=user_id).all()
-
-    groups = []
-    for m in memberships:
-        group = StudyGroup.query.get(m.group_id)
-        if group:
-            groups.append({
-                'group_id': group.id,
-                'name': group.name,
-                'description': group.description,
-                'join_code': group.join_code
-            })
-
-    return jsonify(groups)
-
-# Get members of a group
+    limit, offset = get_page_args()
+
+    groups, next_offset = fetch_page(db.session.query(StudyGroup).join(
+        GroupMembership, GroupMembership.group_id == StudyGroup.id
+    ).filter(
+        GroupMembership.user_id == user_id
+    ).order_by(GroupMembership.id), limit, offset)
+
+    return page_response([{
+        'group_id': group.id,
+        'name': group.name,
+        'description': group.description,
+        'join_code': group.join_code
+    } for group in groups], next_offset)
+
+# Get members of a group; paged like /my
 @groups_bp.route('/<int:group_id>/members', methods=['GET'])
 def group_members(group_id):
-    memberships = GroupMembership.query.filter_by(group_id=group_id).all()
+    limit, offset = get_page_args()
 
-    members = []
-    for m in memberships:
-        user = User.query.get(m.user_id)
-        if user:
-            members.append({
-                'user_id': user.id,
-                'username': user.username,
-                'email': user.email
-            })
+    members, next_offset = fetch_page(db.session.query(User.id, User.username, User.email).join(
+        GroupMembership, GroupMembership.user_id == User.id
+    ).filter(
+        GroupMembership.group_id == group_id
+    ).order_by(GroupMembership.id), limit, offset)
 
-    return jsonify(members)
+    return page_response([{
+        'user_id': user_id,
+        'username': username,
+        'email': email
+    } for user_id, username, email in members], next_offset)
 
 # Leave a group
 @groups_bp.route('/leave', methods=['POST'])
@@ -122,12 +144,16 @@ def leave_group():
 
     return jsonify({'message': 'Successfully left the group.'})
 
+# Parse an ISO 8601 timestamp sent by the frontend
+def parse_datetime(value):
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
 # Add study session to group
 @groups_bp.route('/<int:group_id>/sessions', methods=['POST'])
 def add_group_session(group_id):
     data = request.get_json()
     subject = data.get('subject')
-    scheduled_time = data.get('scheduled_time')
+    scheduled_time = parse_datetime(data.get('scheduled_time'))
     duration = data.get('duration')
 
     session = GroupStudySession(
@@ -139,19 +165,84 @@ def add_group_session(group_id):
     db.session.add(session)
     db.session.flush() 
 
-    memberships = GroupMembership.query.filter_by(group_id=group_id).all()
-    for member in memberships:
-        personal_session = StudySession(
-            user_id=member.user_id,
-            subject=subject,
-            scheduled_time=scheduled_time,
-            duration=duration
-        )
-        db.session.add(personal_session)
+    # Copy the session to every member with one INSERT ... SELECT over the memberships.
+    # INSERT ... SELECT skips the model's Python-side defaults, so the columns they
+    # filled for ORM-created copies (start_time, completed, timestamps) are given here
+    now = datetime.utcnow()
+    member_sessions = select(
+        GroupMembership.user_id,
+        literal(subject),
+        literal(duration),
+        literal(scheduled_time),
+        literal(now),
+        literal(False),
+        literal(now),
+        literal(now),
+        literal(session.id)
+    ).where(GroupMembership.group_id == group_id)
+    result = db.session.execute(insert(StudySession).from_select(
+        ['user_id', 'subject', 'duration', 'scheduled_time', 'start_time',
+         'completed', 'created_at', 'updated_at', 'group_session_id'],
+        member_sessions
+    ))
+
+    db.session.commit()
+
+    return jsonify({
+        'message': 'Group session added and synced to all members',
+        'group_session_id': session.id,
+        'member_sessions': result.rowcount
+    }), 201
+
+# Edit a group session; members' copies that are not completed yet follow along
+@groups_bp.route('/<int:group_id>/sessions/<int:session_id>', methods=['PUT'])
+def update_group_session(group_id, session_id):
+    session = GroupStudySession.query.filter_by(id=session_id, group_id=group_id).first()
+    if not session:
+        return jsonify({'error': 'Group session not found'}), 404
+
+    data = request.get_json()
+    changes = {}
+    if 'subject' in data:
+        changes['subject'] = data['subject']
+    if 'duration' in data:
+        changes['duration'] = data['duration']
+    if 'scheduled_time' in data:
+        changes['scheduled_time'] = parse_datetime(data['scheduled_time'])
+    if not changes:
+        return jsonify({'error': 'Nothing to update'}), 400
+
+    for key, value in changes.items():
+        setattr(session, key, value)
+    result = db.session.execute(
+        update(StudySession)
+        .where(StudySession.group_session_id == session_id, StudySession.completed == False)
+        .values(updated_at=datetime.utcnow(), **changes)
+    )
+    db.session.commit()
+
+    return jsonify({'message': 'Group session updated', 'member_sessions': result.rowcount})
 
+# Delete a group session; completed member copies are kept as history
+@groups_bp.route('/<int:group_id>/sessions/<int:session_id>', methods=['DELETE'])
+def delete_group_session(group_id, session_id):
+    session = GroupStudySession.query.filter_by(id=session_id, group_id=group_id).first()
+    if not session:
+        return jsonify({'error': 'Group session not found'}), 404
+
+    result = db.session.execute(
+        delete(StudySession)
+        .where(StudySession.group_session_id == session_id, StudySession.completed == False)
+    )
+    db.session.execute(
+        update(StudySession)
+        .where(StudySession.group_session_id == session_id)
+        .values(group_session_id=None)
+    )
+    db.session.delete(session)
     db.session.commit()
 
-    return jsonify({'message': 'Group session added and synced to all members'}), 201
+    return jsonify({'message': 'Group session deleted', 'member_sessions': result.rowcount})
 
 
 # Get all study sessions of a group
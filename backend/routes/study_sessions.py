@@ -1,7 +1,12 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response
 from backend.database.models import StudySession, db
 from backend.utils.error_handler import handle_error
+from backend.utils.achievement_engine import record_completed_session, remove_completed_session
 from datetime import datetime, timedelta
+from sqlalchemy import or_, and_
+import base64
+import binascii
+import json
 
 
 sessions_bp = Blueprint('study_sessions', __name__)
@@ -26,24 +31,82 @@ def create_study_session():
         print(f"Study Session Error: {str(e)}")
         return handle_error('Failed to create study session', 500)
 
-# Retrieve study sessions for a specific user
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+# Fields clients may request with ?fields=, and how each one is serialized
+SESSION_FIELDS = {
+    'id': (StudySession.id, None),
+    'subject': (StudySession.subject, None),
+    'duration': (StudySession.duration, None),
+    'scheduled_time': (StudySession.scheduled_time, _isoformat),
+    'start_time': (StudySession.start_time, _isoformat),
+    'completed': (StudySession.completed, None),
+}
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 1000
+
+def encode_cursor(scheduled_time, session_id):
+    raw = json.dumps([scheduled_time.isoformat(), session_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+    scheduled_time, session_id = json.loads(raw)
+    return datetime.fromisoformat(scheduled_time), int(session_id)
+
+def parse_iso(value):
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+def stream_json_array(rows, fields):
+    """Yield a JSON array item by item instead of building the whole document in memory."""
+    formatters = [(name, SESSION_FIELDS[name][1]) for name in fields]
+    yield '['
+    for i, row in enumerate(rows):
+        item = {name: (fmt(value) if fmt else value) for (name, fmt), value in zip(formatters, row)}
+        yield (',' if i else '') + json.dumps(item)
+    yield ']'
+
+# Retrieve study sessions for a specific user, oldest first.
+# Query params: limit, cursor (from X-Next-Cursor), from, to, completed, fields
 @sessions_bp.route('/<int:user_id>', methods=['GET'])
 def get_study_sessions(user_id):
     try:
-        sessions = StudySession.query.filter_by(user_id=user_id).all()
-        session_data = [
-            {
-                'id': session.id,
-                'subject': session.subject,
-                'duration': session.duration,
-                'start_time': session.start_time.isoformat(),
-                'scheduled_time': session.scheduled_time.isoformat() if session.scheduled_time else None,
-                'start_time': session.start_time.isoformat() if session.start_time else None,
-                'completed': session.completed
-            }
-            for session in sessions
-        ]
-        return jsonify(session_data), 200
+        fields = request.args.get('fields')
+        fields = fields.split(',') if fields else list(SESSION_FIELDS)
+        if any(name not in SESSION_FIELDS for name in fields):
+            return handle_error(f"Unknown field; choose from {', '.join(SESSION_FIELDS)}", 400)
+
+        limit = min(max(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+        query = StudySession.query.filter(StudySession.user_id == user_id)
+
+        if request.args.get('from'):
+            query = query.filter(StudySession.scheduled_time >= parse_iso(request.args['from']))
+        if request.args.get('to'):
+            query = query.filter(StudySession.scheduled_time < parse_iso(request.args['to']))
+        if request.args.get('completed') in ('true', 'false'):
+            query = query.filter(StudySession.completed == (request.args['completed'] == 'true'))
+        if request.args.get('cursor'):
+            after_time, after_id = decode_cursor(request.args['cursor'])
+            query = query.filter(or_(
+                StudySession.scheduled_time > after_time,
+                and_(StudySession.scheduled_time == after_time, StudySession.id > after_id)
+            ))
+    except (ValueError, TypeError, binascii.Error):
+        return handle_error('Invalid cursor or date filter', 400)
+
+    try:
+        # The keyset columns ride along at the end of each row to build the next cursor
+        columns = [SESSION_FIELDS[name][0] for name in fields]
+        rows = query.order_by(StudySession.scheduled_time, StudySession.id)\
+            .with_entities(*columns, StudySession.scheduled_time, StudySession.id)\
+            .limit(limit + 1).all()
+
+        next_cursor = encode_cursor(*rows[limit - 1][-2:]) if len(rows) > limit else None
+        response = Response(stream_json_array(rows[:limit], fields), mimetype='application/json')
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response, 200
     except Exception as e:
         print(f"Retrieving Sessions Error: {str(e)}")
         return handle_error('Failed to retrieve study sessions', 500)
@@ -56,6 +119,8 @@ def complete_study_session(session_id):
         if not session:
             return handle_error('Session not found'), 404
 
+        if not session.completed:
+            record_completed_session(session)
         session.completed = True
         db.session.commit()
         return jsonify({'message': 'Session marked as completed'}), 200
@@ -71,6 +136,8 @@ def delete_study_session(session_id):
         if not session:
             return handle_error('Session not found', 404)
         
+        if session.completed:
+            remove_completed_session(session)
         db.session.delete(session)
         db.session.commit()
         return jsonify({'message': 'Session deleted successfully'}), 200
@@ -109,9 +176,13 @@ def update_study_session(session_id):
         if not session:
             return handle_error('Session not found', 404)
 
+        if session.completed:
+            remove_completed_session(session)
         session.subject = data['subject']
         session.duration = data['duration']
         session.scheduled_time = datetime.fromisoformat(data['scheduled_time'].replace('Z', '+00:00'))
+        if session.completed:
+            record_completed_session(session)
 
         db.session.commit()
         return jsonify({'message': 'Session updated successfully'}), 200
@@ -127,6 +198,8 @@ def redo_study_session(session_id):
         if not session:
             return handle_error('Session not found', 404)
 
+        if session.completed:
+            remove_completed_session(session)
         session.completed = False
         db.session.commit()
         return jsonify({'message': 'Session marked as incomplete'}), 200
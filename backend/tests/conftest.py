@@ -1,6 +1,11 @@
 import os
+# No background jobs (or their leader election) against the test database
+os.environ.setdefault('SCHEDULER_MODE', 'off')
 import pytest
 import tempfile
+from contextlib import contextmanager
+from sqlalchemy import event
+from sqlalchemy.orm import scoped_session, sessionmaker
 from backend.app import create_app
 from backend.database import db as _db
 from backend.database.models import User, StudySession, Task, Achievement
@@ -19,6 +24,10 @@ def app():
         'SQLALCHEMY_TRACK_MODIFICATIONS': False,
         'SECRET_KEY': 'test_secret_key',
         'JWT_SECRET_KEY': 'test_jwt_secret',
+        'ADMIN_USER_IDS': '1',
+        # Cheapest allowed scrypt, inline, so tests neither calibrate nor start a process pool
+        'PASSWORD_COST': '16384:8:1',
+        'PASSWORD_HASH_WORKERS': 0,
     })
 
     # Create application context
@@ -42,19 +51,20 @@ def db(app):
         connection = _db.engine.connect()
         transaction = connection.begin()
         
-        # Create a session bound to the connection
-        options = dict(bind=connection, binds={})
-        session = _db.create_scoped_session(options=options)
+        # Create a session bound to the connection; it joins the outer transaction, so commits don't end it
+        session = scoped_session(sessionmaker(bind=connection))
         
         # Replace the session with our test session
+        original_session = _db.session
         _db.session = session
         
         yield _db
         
         # Roll back the transaction
+        session.remove()
         transaction.rollback()
         connection.close()
-        session.remove()
+        _db.session = original_session
 
 @pytest.fixture(scope='function')
 def client(app):
@@ -78,6 +88,38 @@ def auth_headers(app):
     # Return headers with the token
     return {'Authorization': f'Bearer {token}'}
 
+@pytest.fixture(scope='function')
+def record_queries(app):
+    """Return a context manager that collects (statement, parameters) for every SELECT"""
+    @contextmanager
+    def recorder():
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            if not executemany and statement.lstrip().upper().startswith('SELECT'):
+                statements.append((statement, parameters))
+
+        engine = _db.engine
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+    return recorder
+
+@pytest.fixture(scope='function')
+def use_llm(monkeypatch):
+    """Return a function that points the shared LLM gateway at base_url for the rest of the test"""
+    from backend.llm import LLMGateway
+
+    def use(base_url, **options):
+        gateway = LLMGateway(api_key='x', base_url=base_url, **options)
+        monkeypatch.setattr('backend.llm.gateway._gateway', gateway)
+        return gateway
+
+    return use
+
 def seed_test_data(db):
     """Seed the database with test data"""
     # Create test user
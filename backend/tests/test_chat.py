@@ -0,0 +1,341 @@
+import json
+import time
+import pytest
+from backend.routes import chat
+from backend.llm import MemoryBucketStore, TokenRateLimiter, usage_ledger
+from backend.tools.fake_openai import FakeOpenAIServer
+from backend.utils.response_cache import MemoryCacheStore, ResponseCache, cache_key, get_response_cache
+
+
+def parse_sse(body):
+    """Split an SSE body into (event, data) pairs"""
+    events = []
+    for block in body.strip().split('\n\n'):
+        event, data = 'message', None
+        for line in block.split('\n'):
+            if line.startswith('event: '):
+                event = line[len('event: '):]
+            elif line.startswith('data: '):
+                data = json.loads(line[len('data: '):])
+        events.append((event, data))
+    return events
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(app):
+    with app.app_context():
+        cache = get_response_cache()
+    cache.clear()
+    yield cache
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def fresh_budgets(monkeypatch):
+    monkeypatch.setattr('backend.llm.limiter._limiter', None)
+    usage_ledger.clear()
+    yield
+    usage_ledger.clear()
+
+
+@pytest.fixture
+def fake_openai(monkeypatch, use_llm):
+    with FakeOpenAIServer(reply='Spaced repetition beats cramming.', chunk_size=5, chunk_delay=0.02) as server:
+        use_llm(server.base_url)
+        monkeypatch.setattr(chat, 'USE_OPENAI_API', True)
+        yield server
+
+
+def test_chat_stream_relays_chunks(client, fake_openai):
+    """Test that /chat/stream relays upstream chunks as SSE deltas"""
+    response = client.post('/chat/stream', json={'message': 'How should I revise?'}, buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+
+    first = next(response.response)
+    first_at = time.monotonic()
+    body = first.decode() + b''.join(response.response).decode()
+    response.close()
+    # The first token arrives well before the upstream finishes (timed from it: the first
+    # client in a process pays for openai's lazy imports)
+    assert time.monotonic() - first_at > 0.08
+
+    events = parse_sse(body)
+    deltas = [data['delta'] for event, data in events if event == 'message']
+    assert len(deltas) > 1
+    assert ''.join(deltas) == 'Spaced repetition beats cramming.'
+    assert events[-1] == ('done', {'response': 'Spaced repetition beats cramming.'})
+    assert fake_openai.requests[0]['stream'] is True
+
+
+def test_chat_stream_frees_its_slot_when_closed_unread(app, client, fake_openai):
+    """Test that a stream closed before its body is read still frees the slot and stops the upstream call"""
+    from werkzeug.test import EnvironBuilder
+    free = chat._stream_slots._value
+    # Drive the WSGI app directly: the test client reads the first chunk itself
+    environ = EnvironBuilder(path='/chat/stream', method='POST', json={'message': 'How should I revise?'}).get_environ()
+    body = app.wsgi_app(environ, lambda status, headers, exc_info=None: None)
+    assert chat._stream_slots._value == free - 1
+    body.close()  # what the server does when the client disconnects before the first write
+    assert chat._stream_slots._value == free
+
+    response = client.post('/chat/stream', json={'message': 'How should I revise?'}, buffered=False)
+    b''.join(response.response)
+    response.close()
+    assert chat._stream_slots._value == free
+
+
+def test_chat_stream_reports_upstream_errors(client, fake_openai, use_llm):
+    """Test that upstream failures end the stream with an error event"""
+    use_llm('http://127.0.0.1:9/v1', max_retries=0)
+    response = client.post('/chat/stream', json={'message': 'Hello'})
+
+    events = parse_sse(response.get_data(as_text=True))
+    assert events[-1][0] == 'error'
+
+
+def test_chat_stream_mock_mode(client, monkeypatch):
+    """Test that the stream falls back to mock responses when the API is disabled"""
+    monkeypatch.setattr(chat, 'USE_OPENAI_API', False)
+    response = client.post('/chat/stream', json={'message': 'What is AI?'})
+
+    events = parse_sse(response.get_data(as_text=True))
+    assert events[-1] == ('done', {'response': chat.MOCK_RESPONSES['What is AI?']})
+
+
+def test_chat_stream_requires_message(client):
+    """Test that an empty message is rejected before streaming starts"""
+    response = client.post('/chat/stream', json={})
+    assert response.status_code == 400
+
+
+def test_chat_cache_serves_repeated_questions(client, fake_openai, empty_cache, auth_headers):
+    """Test that normalized repeats are answered from the cache without calling the model"""
+    first = client.post('/chat/', json={'message': 'What is a derivative?'})
+    assert first.headers['X-Cache'] == 'miss'
+
+    second = client.post('/chat/', json={'message': '  what is a DERIVATIVE? '})
+    assert second.headers['X-Cache'] == 'hit'
+    assert second.get_json() == first.get_json()
+    assert len(fake_openai.requests) == 1
+
+    # A different system prompt is a different conversation
+    other = client.post('/chat/', json={'message': 'What is a derivative?', 'system': 'Answer in French.'})
+    assert other.headers['X-Cache'] == 'miss'
+    assert len(fake_openai.requests) == 2
+
+    assert client.get('/chat/cache/stats').status_code == 401
+    stats = client.get('/chat/cache/stats', headers=auth_headers).get_json()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 2
+    assert stats['hit_rate'] == round(1 / 3, 4)
+    assert stats['tokens_saved'] > 0
+
+
+def test_chat_stream_uses_cache(client, fake_openai):
+    """Test that a completed stream is cached and replayed for the next request"""
+    client.post('/chat/stream', json={'message': 'Explain photosynthesis'}).get_data()
+    response = client.post('/chat/stream', json={'message': 'explain  Photosynthesis'})
+
+    assert response.headers['X-Cache'] == 'hit'
+    events = parse_sse(response.get_data(as_text=True))
+    assert events[-1] == ('done', {'response': 'Spaced repetition beats cramming.'})
+    assert len(fake_openai.requests) == 1
+
+
+def test_response_cache_exact_key_keeps_punctuation():
+    """Test that questions differing only in an operator or comparison do not share an exact entry"""
+    cache = ResponseCache(MemoryCacheStore(100, 60))
+    cache.store_response('sys', 'What is 5*3?', '15', 10)
+    cache.store_response('sys', 'Is x > y?', 'Yes.', 10)
+
+    assert cache.lookup('sys', 'What is 5+3?') == (None, 'miss')
+    assert cache.lookup('sys', 'Is x < y?') == (None, 'miss')
+    assert cache.lookup('sys', '  what IS 5*3?') == ('15', 'hit')
+
+
+def test_response_cache_near_duplicates():
+    """Test the MinHash tier matches reworded questions but not different ones"""
+    cache = ResponseCache(MemoryCacheStore(100, 60), near_duplicates=True, threshold=0.7)
+    cache.store_response('sys', 'Can you explain photosynthesis in plants', 'Light to sugar.', 50)
+
+    assert cache.lookup('sys', 'can you explain photosynthesis in plants please') == ('Light to sugar.', 'near')
+    assert cache.lookup('sys', 'What is a derivative?') == (None, 'miss')
+    assert cache.lookup('other', 'Can you explain photosynthesis in plants') == (None, 'miss')
+    assert cache.stats()['near_hits'] == 1
+
+
+def test_memory_cache_store_drops_expired_entries_from_bands(monkeypatch):
+    """Test that expired entries leave the LSH bands instead of lingering as candidates"""
+    store = MemoryCacheStore(max_entries=10, ttl=60)
+    cache = ResponseCache(store, near_duplicates=True, threshold=0.7)
+    cache.store_response('sys', 'Can you explain photosynthesis in plants', 'Light to sugar.', 50)
+    cache.store_response('sys', 'What is a derivative?', 'A rate of change.', 50)
+    later = time.time() + 61
+    monkeypatch.setattr('backend.utils.response_cache.time.time', lambda: later)
+
+    assert cache.lookup('sys', 'can you explain photosynthesis in plants please') == (None, 'miss')
+    cache.store_response('sys', 'Explain the chain rule', 'Derivatives compose.', 50)
+    assert store.size() == 1
+    assert all(keys == {cache_key('sys', 'Explain the chain rule')} for keys in store._bands.values())
+
+
+def test_memory_cache_store_evicts_lru_and_expired(monkeypatch):
+    """Test LRU eviction, TTL expiry and per-entry hit counters"""
+    store = MemoryCacheStore(max_entries=2, ttl=60)
+    entry = {'response': 'r', 'tokens': 1, 'signature': None}
+    store.put('a', entry, [])
+    store.put('b', entry, [])
+    assert store.get('a')['hits'] == 1
+    assert store.get('a')['hits'] == 2
+    store.put('c', entry, [])  # evicts b, the least recently used
+    assert store.get('b') is None
+    assert store.get('c') is not None
+
+    later = time.time() + 61
+    monkeypatch.setattr('backend.utils.response_cache.time.time', lambda: later)
+    assert store.get('a') is None
+    assert store.size() == 1
+
+
+def test_chat_fails_fast_to_mock_responses_when_circuit_opens(client, fake_openai, use_llm, auth_headers):
+    """Test that repeated provider errors open the circuit and chat answers from the mock responses"""
+    from backend.llm import CircuitBreaker
+    gateway = use_llm(fake_openai.base_url, max_retries=1, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+    fake_openai.fail(times=4, status=503)
+
+    for question in ('First?', 'Second?'):
+        assert client.post('/chat/', json={'message': question}).status_code == 500
+    assert gateway.breaker.state == 'open'
+    calls = len(fake_openai.requests)
+
+    response = client.post('/chat/', json={'message': 'What is AI?'})
+    assert response.status_code == 200
+    assert response.get_json() == {'response': chat.MOCK_RESPONSES['What is AI?'], 'degraded': True}
+    assert len(fake_openai.requests) == calls  # no provider call while open
+
+    assert client.get('/chat/llm/stats').status_code == 401
+    stats = client.get('/chat/llm/stats', headers=auth_headers).get_json()
+    assert stats['circuit'] == 'open'
+    assert stats['operations']['chat']['errors'] == 2
+    assert stats['operations']['chat']['retries'] == 2
+
+
+def test_half_open_trial_always_settles(fake_openai, use_llm):
+    """Test that a half-open trial ending in a client error or an abandoned stream doesn't wedge the circuit"""
+    import openai
+    from backend.llm import CircuitBreaker, CircuitOpenError
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=lambda: now[0])
+    gateway = use_llm(fake_openai.base_url, max_retries=0, breaker=breaker)
+    messages = [{'role': 'user', 'content': 'Hello'}]
+
+    fake_openai.fail(times=1, status=503)
+    with pytest.raises(openai.InternalServerError):
+        gateway.chat(messages)
+    assert breaker.state == 'open'
+
+    now[0] += 10
+    fake_openai.fail(times=1, status=400)
+    with pytest.raises(openai.BadRequestError):
+        gateway.chat(messages)
+    assert breaker.state == 'closed'  # the provider answered
+
+    breaker.record_failure()
+    now[0] += 10
+    stream = gateway.stream(messages)
+    next(stream)
+    with pytest.raises(CircuitOpenError):
+        gateway.chat(messages)  # the trial is still running
+    stream.close()
+    assert breaker.state == 'half_open'
+    assert gateway.chat(messages).choices[0].message.content
+    assert breaker.state == 'closed'
+
+
+def test_gateway_enforces_deadline_and_records_usage(fake_openai, use_llm):
+    """Test per-call deadlines against a slow provider and token metrics on success"""
+    import openai
+    gateway = use_llm(fake_openai.base_url, max_retries=0)
+    response = gateway.chat([{'role': 'user', 'content': 'Hello'}], operation='probe')
+    assert response.choices[0].message.content == 'Spaced repetition beats cramming.'
+    assert gateway.metrics.snapshot()['probe']['completion_tokens'] > 0
+
+    fake_openai.first_token_delay = 1.0
+    started = time.monotonic()
+    with pytest.raises(openai.APITimeoutError):
+        gateway.chat([{'role': 'user', 'content': 'Hello'}], operation='probe', deadline=0.2)
+    assert time.monotonic() - started < 0.8
+
+
+def test_token_bucket_refunds_unused_reservations():
+    """Test that reservations drain the bucket and settling returns what was not used"""
+    limiter = TokenRateLimiter(MemoryBucketStore(), user_rate=60, user_burst=1000,
+                               global_rate=6000, global_burst=1500)
+    assert limiter.reserve('1', 600) == 0
+    wait = limiter.reserve('1', 600)
+    assert 199 < wait <= 200  # 200 tokens short at one token per second
+
+    limiter.settle('1', 600, 100)
+    assert limiter.reserve('1', 600) == 0
+    # Another user is only held back by the global bucket
+    assert limiter.reserve('2', 1000) > 0
+    assert limiter.reserve('2', 300) == 0
+
+
+def test_chat_rate_limits_per_user_and_records_daily_usage(client, db, fake_openai, auth_headers, monkeypatch):
+    """Test that an over-budget caller gets 429 with Retry-After and usage is aggregated per day"""
+    monkeypatch.setattr('backend.llm.limiter._limiter', TokenRateLimiter(
+        MemoryBucketStore(), user_rate=60, user_burst=700, global_rate=100000, global_burst=100000))
+    question = 'Explain the forgetting curve. ' * 70
+
+    response = client.post('/chat/', json={'message': question}, headers=auth_headers)
+    assert response.status_code == 200
+    response = client.post('/chat/', json={'message': question + 'Again?'}, headers=auth_headers)
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) > 60
+    # Anonymous callers have their own bucket
+    assert client.post('/chat/', json={'message': 'Short one?'}).status_code == 200
+
+    rows = client.get('/chat/usage', headers=auth_headers).get_json()
+    assert len(rows) == 1
+    assert rows[0]['operation'] == 'chat'
+    assert (rows[0]['requests'], rows[0]['rejected']) == (1, 1)
+    assert rows[0]['prompt_tokens'] > 500
+    assert rows[0]['completion_tokens'] > 0
+    assert client.get('/chat/usage').status_code == 401
+
+
+def test_anonymous_callers_are_told_apart_behind_the_proxy(app, client, fake_openai, monkeypatch):
+    """Test that anonymous budgets are keyed by the forwarded client address, not the proxy's"""
+    from werkzeug.middleware.proxy_fix import ProxyFix
+    monkeypatch.setattr(app, 'wsgi_app', ProxyFix(app.wsgi_app, x_for=1))
+    monkeypatch.setattr('backend.llm.limiter._limiter', TokenRateLimiter(
+        MemoryBucketStore(), user_rate=60, user_burst=700, global_rate=100000, global_burst=100000))
+
+    def ask(address, question):
+        return client.post('/chat/', json={'message': 'Explain the forgetting curve. ' * 70 + question},
+                           headers={'X-Forwarded-For': address}).status_code
+
+    assert ask('203.0.113.7', 'First?') == 200
+    assert ask('203.0.113.7', 'Second?') == 429
+    assert ask('198.51.100.2', 'Third?') == 200
+
+
+def test_usage_flush_leaves_the_request_session_alone(db):
+    """Test that flushing usage neither commits nor rolls back the caller's pending work"""
+    from backend.database.models import LLMUsageDaily, Task
+    task = Task(user_id=1, title='Pending', status='todo')
+    db.session.add(task)
+    usage_ledger.record(1, 'probe', 10, 5)
+    usage_ledger.flush()
+    assert task in db.session.new
+    assert LLMUsageDaily.query.filter_by(user_id=1, operation='probe').one().prompt_tokens == 10
+
+
+def test_chat_rejects_oversized_prompts(client, fake_openai):
+    """Test that overlong messages and system prompts never reach the model"""
+    assert client.post('/chat/', json={'message': 'x' * 5000}).status_code == 413
+    assert client.post('/chat/stream', json={'message': 'Hi', 'system': 'y' * 3000}).status_code == 413
+    assert client.post('/chat/', json={'message': ['not', 'text']}).status_code == 400
+    assert fake_openai.requests == []
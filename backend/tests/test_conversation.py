@@ -0,0 +1,101 @@
+import jwt
+import pytest
+from datetime import datetime, timedelta
+from backend.database.models import ChatTurn
+from backend.llm import usage_ledger
+from backend.routes import chat
+from backend.tools.fake_openai import FakeOpenAIServer
+
+
+def coach_reply(body):
+    """Fake model: notes for summary requests, otherwise echo how much context the prompt carried"""
+    if 'memory notes' in body['messages'][0]['content']:
+        return 'Student studies biology; struggles with cell division.'
+    return f"Noted ({len(body['messages'])} messages of context). Keep going with mitosis."
+
+
+@pytest.fixture(autouse=True)
+def small_window(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'CHAT_MEMORY_WINDOW_TOKENS', 120)
+    monkeypatch.setitem(app.config, 'CHAT_MEMORY_SUMMARY_TOKENS', 60)
+    monkeypatch.setattr('backend.llm.limiter._limiter', None)
+    usage_ledger.clear()
+
+
+@pytest.fixture
+def fake_coach(monkeypatch, use_llm):
+    with FakeOpenAIServer(reply=coach_reply) as server:
+        use_llm(server.base_url)
+        monkeypatch.setattr(chat, 'USE_OPENAI_API', True)
+        yield server
+
+
+def start_thread(client, headers):
+    response = client.post('/chat/threads', json={'title': 'Biology'}, headers=headers)
+    assert response.status_code == 201
+    return response.get_json()['id']
+
+
+def test_thread_keeps_recent_turns_and_compacts_older_ones(client, db, fake_coach, auth_headers):
+    """Test that threads send history, fold old turns into a summary and keep prompts bounded"""
+    thread_id = start_thread(client, auth_headers)
+    question = 'Can you explain the phases of cell division again, with an example from plant cells?'
+
+    for _ in range(12):
+        response = client.post('/chat/', json={'message': question, 'thread_id': thread_id}, headers=auth_headers)
+        assert response.status_code == 200
+
+    chats = [r for r in fake_coach.requests if 'memory notes' not in r['messages'][0]['content']]
+    summaries = [r for r in fake_coach.requests if 'memory notes' in r['messages'][0]['content']]
+    assert len(chats[1]['messages']) == 4  # system, previous question and answer, new question
+    assert summaries  # older turns were folded at least once
+    assert len(summaries) < len(chats) / 2
+    # Late prompts carry the summary and stay within the window however long the thread gets
+    last = chats[-1]['messages']
+    assert last[1]['content'].endswith('struggles with cell division.')
+    assert sum(len(m['content']) for m in last) < len(chats[1]['messages']) * 400
+
+    thread = client.get(f'/chat/threads/{thread_id}', headers=auth_headers).get_json()
+    assert thread['summary'] == 'Student studies biology; struggles with cell division.'
+    assert len(thread['turns']) == 24
+    assert thread['turns'][0] == dict(thread['turns'][0], role='user', content=question)
+
+    # Stored compressed
+    raw = db.session.query(ChatTurn.content).filter_by(thread_id=thread_id).first()[0]
+    assert question.encode() not in raw
+
+
+def test_thread_falls_back_to_extractive_summary_in_mock_mode(client, db, auth_headers, monkeypatch):
+    """Test that compaction works without the model"""
+    monkeypatch.setattr(chat, 'USE_OPENAI_API', False)
+    thread_id = start_thread(client, auth_headers)
+    for i in range(8):
+        message = f'Question {i}. I keep mixing up prophase and metaphase, how do I remember them?'
+        assert client.post('/chat/', json={'message': message, 'thread_id': thread_id},
+                           headers=auth_headers).status_code == 200
+
+    thread = client.get(f'/chat/threads/{thread_id}', headers=auth_headers).get_json()
+    assert 'Student: Question' in thread['summary']
+    assert len(thread['summary']) <= 60 * 4
+    assert len(thread['turns']) == 16
+
+
+def test_threads_are_private(client, db, auth_headers, app):
+    """Test that threads need a token and belong to one user"""
+    thread_id = start_thread(client, auth_headers)
+    token = jwt.encode({'user_id': 2, 'exp': datetime.utcnow() + timedelta(days=1)},
+                       app.config['JWT_SECRET_KEY'], algorithm='HS256')
+    other = {'Authorization': f'Bearer {token}'}
+
+    assert client.post('/chat/', json={'message': 'Hi', 'thread_id': thread_id}, headers=other).status_code == 404
+    assert client.get(f'/chat/threads/{thread_id}', headers=other).status_code == 404
+    assert client.post('/chat/', json={'message': 'Hi', 'thread_id': thread_id}).status_code == 401
+    assert client.get('/chat/threads', headers=other).get_json() == []
+    expired = jwt.encode({'user_id': 1, 'exp': datetime.utcnow() - timedelta(seconds=1)},
+                         app.config['JWT_SECRET_KEY'], algorithm='HS256')
+    response = client.get('/chat/threads', headers={'Authorization': f'Bearer {expired}'})
+    assert response.status_code == 401 and response.get_json()['error'] == 'Token has expired'
+
+    assert [t['id'] for t in client.get('/chat/threads', headers=auth_headers).get_json()] == [thread_id]
+    assert client.delete(f'/chat/threads/{thread_id}', headers=auth_headers).status_code == 200
+    assert client.get(f'/chat/threads/{thread_id}', headers=auth_headers).status_code == 404
@@ -0,0 +1,68 @@
+import asyncio
+import random
+import time
+import httpx
+import openai
+import pytest
+from backend.benchmarks.load_test import LatencyHistogram, drive
+from backend.tools.fake_openai import FakeOpenAIServer, parse_latency
+
+CHAT = {'model': 'gpt-4o', 'messages': [{'role': 'user', 'content': 'Hello there'}]}
+
+
+def test_latency_distributions():
+    """Test that latency specs sample the documented shapes"""
+    rng = random.Random(1)
+    assert parse_latency('fixed:0.25', rng)() == 0.25
+    assert all(0.1 <= parse_latency('uniform:0.1,0.3', rng)() <= 0.3 for _ in range(100))
+    samples = sorted(parse_latency('lognormal:0.5,0.5', rng)() for _ in range(2001))
+    assert 0.45 < samples[1000] < 0.55  # median
+    with pytest.raises(ValueError):
+        parse_latency('pareto:1')
+
+
+def test_quota_and_error_injection():
+    """Test rpm quotas answer 429 with Retry-After and error_rate injects server errors"""
+    with FakeOpenAIServer(rpm=3) as server:
+        statuses = [httpx.post(server.base_url + '/chat/completions', json=CHAT) for _ in range(4)]
+    assert [r.status_code for r in statuses] == [200, 200, 200, 429]
+    assert int(statuses[-1].headers['Retry-After']) >= 1
+    assert server.stats == {'requests': 4, 'ok': 3, 'errors': 0, 'rate_limited': 1}
+
+    with FakeOpenAIServer(error_rate=0.5, seed=3) as server:
+        codes = {httpx.post(server.base_url + '/chat/completions', json=CHAT).status_code for _ in range(20)}
+    assert 200 in codes and codes & {500, 502, 503}
+
+
+def test_stream_reports_usage_and_gateway_honours_retry_after(use_llm):
+    """Test streamed usage chunks and that retries wait out the provider's Retry-After"""
+    with FakeOpenAIServer(reply='Short answer.') as server:
+        gateway = use_llm(server.base_url, max_retries=1)
+        chunks = list(gateway.stream(CHAT['messages']))
+        assert chunks[-1].usage.completion_tokens > 0
+        assert gateway.metrics.snapshot()['chat_stream']['completion_tokens'] > 0
+
+        server.fail(times=1, status=429)
+        started = time.monotonic()
+        assert gateway.chat(CHAT['messages']).choices[0].message.content == 'Short answer.'
+        assert time.monotonic() - started >= 1.0
+
+        server.fail(times=1, status=429)
+        with pytest.raises(openai.RateLimitError):
+            gateway.chat(CHAT['messages'], deadline=0.5)  # Retry-After is beyond the deadline
+
+
+def test_open_loop_driver_reports_latencies():
+    """Test the load driver keeps its schedule and records every request"""
+    with FakeOpenAIServer(latency='fixed:0.05') as server:
+        result = asyncio.run(drive(server.base_url + '/chat/completions', lambda i: CHAT, qps=40, duration=0.5))
+    assert result.statuses == {200: 20}
+    assert result.latency.summary()['count'] == 20
+    assert result.latency.percentile(50) >= 0.05
+    assert result.elapsed < 1.5
+
+    histogram = LatencyHistogram()
+    for seconds in (0.001, 0.0015, 0.1, 2.0):
+        histogram.record(seconds)
+    assert histogram.bucket(0.001) == 0 and histogram.bucket(0.002) == 2
+    assert len(histogram.render().splitlines()) == histogram.bucket(2.0) + 1
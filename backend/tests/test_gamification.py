@@ -191,4 +191,215 @@ def test_get_leaderboard(client, db, auth_headers):
         assert 'user_id' in entry
         assert 'username' in entry
         assert 'total_points' in entry
-        assert 'level' in entry
\ No newline at end of file
+        assert 'level' in entry
+def test_completing_sessions_updates_stats_and_awards(client, db, auth_headers):
+    """Test that completed sessions feed the achievement engine aggregates"""
+    from backend.database.models import StudySession, User
+    from backend.utils.achievement_engine import get_user_stats
+    from datetime import datetime, timedelta
+
+    user = User(username='streaker', email='streaker@example.com', password='x')
+    db.session.add(user)
+    db.session.commit()
+
+    base = datetime.utcnow() - timedelta(days=5)
+    sessions = [
+        StudySession(user_id=user.id, subject='Math', duration=30, scheduled_time=base + timedelta(days=i))
+        for i in range(3)
+    ]
+    db.session.add_all(sessions)
+    db.session.commit()
+
+    for session in sessions:
+        response = client.put(f'/study_sessions/complete/{session.id}')
+        assert response.status_code == 200
+
+    stats = get_user_stats(user.id)
+    assert stats.completed_count == 3
+    assert stats.total_minutes == 90
+    assert stats.current_streak == 3
+    assert stats.longest_streak == 3
+    assert stats.max_subject_sessions == 3
+
+    response = client.post(f'/gamification/check-achievements/{user.id}', headers=auth_headers)
+    assert response.status_code == 200
+    names = {a['name'] for a in json.loads(response.data)['achievements']}
+    assert names == {'First Steps', 'Study Streak'}
+
+    # A second check must not award the same badges again
+    response = client.post(f'/gamification/check-achievements/{user.id}', headers=auth_headers)
+    assert json.loads(response.data)['achievements'] == []
+
+    # Undoing the middle day breaks the current streak
+    client.put(f'/study_sessions/redo/{sessions[1].id}')
+    stats = get_user_stats(user.id)
+    assert stats.completed_count == 2
+    assert stats.current_streak == 1
+    assert stats.longest_streak == 1
+
+def test_rebuild_stats_matches_sessions(client, db):
+    """Test that the backfill rebuilds aggregates from StudySession rows"""
+    from backend.database.models import StudySession, User
+    from backend.utils.achievement_engine import rebuild_stats, get_user_stats
+    from datetime import datetime
+
+    user = User(username='backfill', email='backfill@example.com', password='x')
+    db.session.add(user)
+    db.session.commit()
+
+    day = datetime(2025, 3, 10, 9, 0)
+    db.session.add_all([
+        StudySession(user_id=user.id, subject='Physics', duration=60, scheduled_time=day, completed=True),
+        StudySession(user_id=user.id, subject='Physics', duration=45, scheduled_time=day, completed=True),
+        StudySession(user_id=user.id, subject='Chemistry', duration=20, scheduled_time=day, completed=False),
+    ])
+    db.session.commit()
+
+    rebuild_stats([user.id])
+    stats = get_user_stats(user.id)
+    assert stats.completed_count == 2
+    assert stats.total_minutes == 105
+    assert stats.max_daily_sessions == 2
+    assert stats.max_subject_sessions == 2
+    assert stats.last_study_date == day.date()
+
+def test_achievement_catalog_is_cached_and_invalidated(app, db):
+    """Test that the catalog is reused until an Achievement row changes"""
+    from backend.utils.achievement_catalog import get_catalog, invalidate_catalog
+
+    catalog = get_catalog()
+    assert get_catalog() is catalog
+    assert catalog.get_by_name('First Steps') is not None
+    assert catalog.get(catalog.get_by_name('First Steps').id).name == 'First Steps'
+
+    db.session.add(Achievement(name='Night Owl', description='Study after midnight', points=20))
+    db.session.commit()
+
+    refreshed = get_catalog()
+    assert refreshed is not catalog
+    assert refreshed.version != catalog.version
+    assert refreshed.get_by_name('Night Owl').points == 20
+
+    # The row is rolled back with the test transaction, so drop it from the cache too
+    invalidate_catalog()
+
+def test_achievement_catalog_sees_other_workers_changes(app, db, monkeypatch):
+    """Test that rows written elsewhere (no ORM events here) show up once the check interval passes"""
+    from datetime import datetime
+    from sqlalchemy import insert
+    from backend.utils.achievement_catalog import get_catalog, invalidate_catalog
+
+    catalog = get_catalog()
+    db.session.execute(insert(Achievement).values(name='Early Bird', description='Study before 7am',
+                                                  points=15, updated_at=datetime.utcnow()))
+    assert get_catalog() is catalog  # within the interval the cached copy is served
+
+    monkeypatch.setitem(app.config, 'ACHIEVEMENT_CATALOG_CHECK_SECONDS', 0)
+    assert get_catalog().get_by_name('Early Bird').points == 15
+    invalidate_catalog()
+
+@pytest.mark.parametrize('on_conflict', [True, False], ids=['on-conflict', 'update-then-insert'])
+def test_point_ledger_applies_batched_entries(app, db, monkeypatch, on_conflict):
+    """Test that a ledger folds several entries into one increment per user, with or without ON CONFLICT"""
+    from backend.database.models import User
+    from backend.utils.point_ledger import PointLedger
+    if not on_conflict:
+        monkeypatch.setattr('backend.database.upsert._UPSERT_INSERTS', {})
+
+    user = User(username='ledger', email='ledger@example.com', password='x')
+    db.session.add(user)
+    db.session.commit()
+
+    ledger = PointLedger()
+    ledger.add(user.id, 60, 'Session')
+    ledger.add(user.id, 50, 'Achievement: Focus Master')
+    results = ledger.apply()
+    db.session.commit()
+
+    assert results[user.id].total_points == 110
+    assert results[user.id].level == 2
+    assert results[user.id].level_up is True
+    assert PointTransaction.query.filter_by(user_id=user.id).count() == 2
+
+    # Existing rows are incremented in place
+    ledger.add(user.id, 5, 'Bonus')
+    results = ledger.apply()
+    db.session.commit()
+
+    points = UserPoints.query.filter_by(user_id=user.id).first()
+    assert points.total_points == 115
+    assert points.level == 2
+    assert results[user.id].level_up is False
+
+def test_skiplist_matches_sorted_list():
+    """Test the indexable skiplist against a plain sorted list"""
+    import random
+    from backend.utils.leaderboard import IndexableSkipList
+
+    skiplist, expected = IndexableSkipList(), []
+    rng = random.Random(42)
+    for _ in range(2000):
+        key = (rng.randint(-500, 0), rng.randint(1, 10 ** 6))
+        if expected and rng.random() < 0.3:
+            victim = expected.pop(rng.randrange(len(expected)))
+            skiplist.remove(victim)
+        elif key not in expected:
+            skiplist.insert(key)
+            expected.append(key)
+        expected.sort()
+
+    assert len(skiplist) == len(expected)
+    assert skiplist.slice(0, len(expected)) == expected
+    for i in range(0, len(expected), 37):
+        assert skiplist.rank(expected[i]) == i
+        assert skiplist.slice(i, 5) == expected[i:i + 5]
+
+def test_leaderboard_rank_and_neighbours(client, db, auth_headers):
+    """Test paging the leaderboard and looking up a user's rank"""
+    from backend.database.models import User
+    from backend.utils.leaderboard import rebuild_leaderboard
+    from backend.routes.gamification import add_points
+
+    users = [User(username=f'ranked{i}', email=f'ranked{i}@example.com', password='x') for i in range(5)]
+    db.session.add_all(users)
+    db.session.commit()
+    rebuild_leaderboard()
+
+    for i, user in enumerate(users):
+        add_points(user.id, 10000 + i * 100, 'Test')
+
+    response = client.get('/gamification/leaderboard?limit=3')
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert [entry['username'] for entry in data] == ['ranked4', 'ranked3', 'ranked2']
+    assert [entry['rank'] for entry in data] == [1, 2, 3]
+
+    response = client.get('/gamification/leaderboard?limit=2&offset=3')
+    assert [entry['username'] for entry in json.loads(response.data)] == ['ranked1', 'ranked0']
+
+    response = client.get(f'/gamification/leaderboard/user/{users[2].id}?radius=1', headers=auth_headers)
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert data['rank'] == 3
+    assert data['total_points'] == 10200
+    assert [entry['username'] for entry in data['neighbours']] == ['ranked3', 'ranked2', 'ranked1']
+
+def test_leaderboard_stores_break_ties_alike(db):
+    """Test that the SQL and memory stores order equal totals by user id and agree on ranks"""
+    from backend.database.models import User
+    from backend.utils.leaderboard import MemoryLeaderboard, SqlLeaderboard, rebuild_leaderboard
+
+    users = [User(username=f'tied{i}', email=f'tied{i}@example.com', password='x') for i in range(4)]
+    db.session.add_all(users)
+    db.session.flush()
+    db.session.add_all(UserPoints(user_id=user.id, total_points=90000, level=1) for user in users)
+    db.session.commit()
+
+    sql, memory = SqlLeaderboard(), MemoryLeaderboard()
+    rebuild_leaderboard(memory)
+    assert sql.range(0, 4) == memory.range(0, 4) == [(user.id, 90000) for user in users]
+    assert sql.size() == memory.size()
+    for user in users:
+        assert sql.rank(user.id) == memory.rank(user.id)
+        assert sql.score(user.id) == memory.score(user.id) == 90000
+    assert sql.rank(999999) is None
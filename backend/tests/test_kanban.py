@@ -1,5 +1,7 @@
 import json
+import jwt
 import pytest
+from datetime import datetime, timedelta
 from backend.database.models import Task
 
 def test_add_task(client, db, auth_headers):
@@ -137,4 +139,145 @@ def test_get_all_tasks(client, db, auth_headers):
         assert 'id' in task
         assert 'title' in task
         assert 'status' in task
-        assert 'user_id' in task
\ No newline at end of file
+        assert 'user_id' in task
+def test_update_task_rejects_unknown_fields(client, db, auth_headers):
+    """Test that update_task only writes editable fields"""
+    task = Task.query.filter_by(title='Complete math homework').first()
+    response = client.put(f'/kanban/{task.id}', json={'user_id': 2, 'title': 'Hijacked'}, headers=auth_headers)
+    assert response.status_code == 400
+    assert b'user_id' in response.data
+    assert client.put(f'/kanban/{task.id}', json={'status': 'archived'}, headers=auth_headers).status_code == 400
+    # The JSON parser accepts NaN and Infinity, which would break ordering and the midpoint maths
+    for position in ('NaN', 'Infinity', '-Infinity'):
+        response = client.put(f'/kanban/{task.id}', data=f'{{"position": {position}}}',
+                              content_type='application/json', headers=auth_headers)
+        assert response.status_code == 400
+        response = client.post('/kanban/batch', data=f'{{"ops": [{{"op": "update", "id": {task.id}, "position": {position}}}]}}',
+                               content_type='application/json', headers=auth_headers)
+        assert response.status_code == 400
+    db.session.refresh(task)
+    assert (task.user_id, task.title) == (1, 'Complete math homework')
+
+    # Moving to another column without a position puts the card at the bottom
+    response = client.put(f'/kanban/{task.id}', json={'status': 'done'}, headers=auth_headers)
+    done = Task.query.filter_by(user_id=1, status='done').order_by(Task.position).all()
+    assert done[-1].id == task.id and response.get_json()['position'] > done[0].position
+
+
+def board(client, headers, status):
+    tasks = client.get('/kanban/user/1', headers=headers).get_json()
+    return [t['title'] for t in tasks if t['status'] == status]
+
+
+def test_batch_applies_ops_in_one_transaction(client, db, auth_headers, record_queries):
+    """Test create/move/update/delete in one request, with moves writing a single row"""
+    ops = [{'op': 'create', 'title': f'Card {i}'} for i in range(20)]
+    with record_queries() as queries:
+        response = client.post('/kanban/batch', json={'ops': ops}, headers=auth_headers)
+    assert response.status_code == 200
+    ids = [r['id'] for r in response.get_json()['results']]
+    assert board(client, auth_headers, 'todo') == ['Complete math homework'] + [f'Card {i}' for i in range(20)]
+    assert len([q for q in queries if 'FROM task' in q[0]]) == 1  # the board, read once
+
+    essay = Task.query.filter_by(title='Submit essay').first()
+    response = client.post('/kanban/batch', json={'ops': [
+        {'op': 'move', 'id': ids[19], 'status': 'todo', 'before_id': ids[0]},  # last card to the top of the cards
+        {'op': 'move', 'id': ids[5], 'status': 'inProgress'},
+        {'op': 'update', 'id': ids[6], 'title': 'Card six'},
+        {'op': 'delete', 'id': essay.id},
+    ]}, headers=auth_headers)
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert results[1] == {'op': 'move', 'id': ids[5], 'status': 'inProgress', 'position': results[1]['position']}
+
+    todo = board(client, auth_headers, 'todo')
+    assert todo[:3] == ['Complete math homework', 'Card 19', 'Card 0'] and 'Card six' in todo
+    assert board(client, auth_headers, 'inProgress') == ['Read science chapter', 'Card 5']
+    assert board(client, auth_headers, 'done') == []
+
+
+def test_batch_is_all_or_nothing(client, db, auth_headers, app):
+    """Test that a bad op rejects the whole batch and other users' cards are not reachable"""
+    task = Task.query.filter_by(title='Complete math homework').first()
+    response = client.post('/kanban/batch', json={'ops': [
+        {'op': 'update', 'id': task.id, 'title': 'Changed'},
+        {'op': 'delete', 'id': 999999},
+    ]}, headers=auth_headers)
+    assert response.status_code == 404 and response.get_json()['op'] == 1
+    assert Task.query.get(task.id).title == 'Complete math homework'
+
+    assert client.post('/kanban/batch', json={'ops': [{'op': 'update', 'id': task.id, 'user_id': 2}]},
+                       headers=auth_headers).status_code == 400
+    assert client.post('/kanban/batch', json={'ops': []}, headers=auth_headers).status_code == 400
+    assert client.post('/kanban/batch', json={'ops': [{'op': 'delete', 'id': task.id}]}).status_code == 401
+
+    # Ids must be plain integers: unhashable values are a 400, not a 500, and true is not task 1
+    for op in ({'op': 'delete', 'id': [task.id]}, {'op': 'update', 'id': {'id': task.id}, 'title': 'x'},
+               {'op': 'move', 'id': task.id, 'after_id': [1]}, {'op': 'delete', 'id': True},
+               {'op': 'create', 'title': 'x', 'before_id': '1'}):
+        response = client.post('/kanban/batch', json={'ops': [op]}, headers=auth_headers)
+        assert response.status_code == 400 and response.get_json()['op'] == 0
+    assert Task.query.get(task.id) is not None
+
+
+def test_repeated_drops_into_one_gap_renumber_the_column(client, db, auth_headers):
+    """Test that exhausting float precision between two cards falls back to renumbering"""
+    created = client.post('/kanban/batch', json={'ops': [
+        {'op': 'create', 'title': 'Top', 'status': 'done'},
+        {'op': 'create', 'title': 'Bottom', 'status': 'done'},
+    ]}, headers=auth_headers).get_json()['results']
+    top, bottom = created[0]['id'], created[1]['id']
+    ops = [{'op': 'create', 'title': f'Squeezed {i}', 'status': 'done', 'after_id': top} for i in range(60)]
+    assert client.post('/kanban/batch', json={'ops': ops}, headers=auth_headers).status_code == 200
+
+    done = board(client, auth_headers, 'done')
+    assert done[:2] == ['Submit essay', 'Top'] and done[-1] == 'Bottom'
+    assert done[2:-1] == [f'Squeezed {i}' for i in reversed(range(60))]
+
+
+def test_admin_listing_pages_with_keyset_cursor(client, db, auth_headers, app):
+    """Test the global task listing is admin-only, filterable and paged by cursor"""
+    client.post('/kanban/batch', json={'ops': [{'op': 'create', 'title': f'Bulk {i}'} for i in range(5)]},
+                headers=auth_headers)
+    total = Task.query.count()
+
+    seen, cursor = [], None
+    while True:
+        response = client.get('/kanban/', query_string={'limit': 2, **({'cursor': cursor} if cursor else {})},
+                              headers=auth_headers)
+        assert response.status_code == 200 and len(response.get_json()) <= 2
+        seen += [t['id'] for t in response.get_json()]
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            break
+    assert seen == sorted(seen) and len(seen) == total
+
+    done = client.get('/kanban/?status=done&user_id=1', headers=auth_headers).get_json()
+    assert [t['title'] for t in done] == ['Submit essay']
+    # Browsers send UTC timestamps with a trailing Z, which fromisoformat rejects before Python 3.11
+    window = {'from': '2000-01-01T00:00:00Z', 'to': '2999-01-01T00:00:00.000Z'}
+    response = client.get('/kanban/', query_string={**window, 'limit': 1000}, headers=auth_headers)
+    assert response.status_code == 200 and len(response.get_json()) == total
+    assert client.get('/kanban/?cursor=not-a-cursor', headers=auth_headers).status_code == 400
+    for cursor in ('e30', 'W10', 'Ingi', 'WyJ4Il0'):  # {}, [], "x", ["x"]
+        assert client.get('/kanban/', query_string={'cursor': cursor}, headers=auth_headers).status_code == 400
+
+    assert client.get('/kanban/').status_code == 401
+    token = jwt.encode({'user_id': 2, 'exp': datetime.utcnow() + timedelta(days=1)},
+                       app.config['JWT_SECRET_KEY'], algorithm='HS256')
+    assert client.get('/kanban/', headers={'Authorization': f'Bearer {token}'}).status_code == 403
+
+
+def test_admin_export_streams_ndjson_in_chunks(client, db, auth_headers, monkeypatch, record_queries):
+    """Test NDJSON export covers every task while reading a bounded chunk at a time"""
+    monkeypatch.setattr('backend.routes.kanban.EXPORT_CHUNK_SIZE', 3)
+    client.post('/kanban/batch', json={'ops': [{'op': 'create', 'title': f'Export {i}'} for i in range(7)]},
+                headers=auth_headers)
+
+    with record_queries() as queries:
+        response = client.get('/kanban/?format=ndjson', headers=auth_headers)
+        lines = response.get_data(as_text=True).splitlines()
+    assert response.mimetype == 'application/x-ndjson'
+    assert [json.loads(line)['id'] for line in lines] == [t.id for t in Task.query.order_by(Task.id)]
+    chunks = [q for q in queries if 'FROM task' in q[0]]
+    assert len(chunks) == len(lines) // 3 + 1  # full chunks, then the short last one
@@ -1,6 +1,18 @@
 import json
 import pytest
-from backend.database.models import UserProfile
+from backend.database.models import Task, UserProfile
+from backend.routes import chat
+from backend.tools.fake_openai import FakeOpenAIServer
+from backend.utils.coach_context import build_coach_context, get_coach_context_cache
+
+
+@pytest.fixture(autouse=True)
+def coach_contexts(app):
+    with app.app_context():
+        cache = get_coach_context_cache()
+    cache.clear()
+    yield cache
+    cache.clear()
 
 def test_create_profile(client, db, auth_headers):
     """Test creating a user profile"""
@@ -171,4 +183,59 @@ def test_create_duplicate_profile(client, db, auth_headers):
     assert response.status_code == 409
     data = json.loads(response.data)
     assert 'error' in data
-    assert 'already exists' in data['error']
\ No newline at end of file
+    assert 'already exists' in data['error']
+
+
+def test_profile_changes_rebuild_coach_context(client, db, auth_headers, coach_contexts):
+    """Test that the coach context is versioned and only rebuilt when the profile changes"""
+    test_create_profile(client, db, auth_headers)
+    profile = UserProfile.query.filter_by(user_id=1).first()
+    assert profile.context_version == 1
+    assert 'Study style: Visual' in profile.coach_context
+    assert 'Subjects: Mathematics, Computer Science' in profile.coach_context
+    assert coach_contexts.version(1) == 1
+
+    update = {'study_style': 'Visual'}
+    assert client.put('/onboarding/profile/1', json=update, headers=auth_headers).status_code == 200
+    assert coach_contexts.version(1) == 1
+
+    update = {'goals': 'Pass the calculus final'}
+    assert client.put('/onboarding/profile/1', json=update, headers=auth_headers).status_code == 200
+    assert coach_contexts.version(1) == 2
+    assert 'Goals: Pass the calculus final' in coach_contexts.get(1)
+
+
+def test_chat_prompt_includes_coach_context_without_queries(client, db, auth_headers, use_llm, monkeypatch,
+                                                            record_queries):
+    """Test that chat merges the cached coach context into the default system prompt"""
+    test_create_profile(client, db, auth_headers)
+    with FakeOpenAIServer(reply='Try flashcards.') as server:
+        use_llm(server.base_url)
+        monkeypatch.setattr(chat, 'USE_OPENAI_API', True)
+        with record_queries() as statements:
+            assert client.post('/chat/', json={'message': 'How do I start?'}, headers=auth_headers).status_code == 200
+        assert client.post('/chat/', json={'message': 'Plan this', 'system': 'Return JSON.'},
+                           headers=auth_headers).status_code == 200
+
+    system = server.requests[0]['messages'][0]['content']
+    assert system.startswith(chat.DEFAULT_SYSTEM_PROMPT)
+    assert 'Study style: Visual' in system
+    assert not any('user_profile' in statement for statement, _ in statements)
+    assert server.requests[1]['messages'][0]['content'] == 'Return JSON.'
+
+
+def test_coach_context_backfill_leaves_the_request_session_alone(db, coach_contexts):
+    """Test that building a missing context neither commits the caller's pending work nor trips on odd JSON"""
+    db.session.add(UserProfile(user_id=1, study_style='Visual', subjects='"Maths"', quiz_responses='["a", "b"]'))
+    db.session.commit()
+    task = Task(user_id=1, title='Pending', status='todo')
+    db.session.add(task)
+
+    context = coach_contexts.get(1)
+    assert 'Study style: Visual' in context and 'Subjects' not in context
+    assert task in db.session.new
+    db.session.expire_all()
+    assert UserProfile.query.filter_by(user_id=1).one().context_version == 1
+
+    profile = UserProfile(user_id=2, quiz_responses='null')
+    assert build_coach_context(profile) == ''
@@ -0,0 +1,69 @@
+import pytest
+from werkzeug.security import generate_password_hash
+from backend.database.models import User
+from backend.utils import passwords
+from backend.utils.passwords import (MIN_COST, PasswordHasher, PasswordHasherBusy, calibrate, needs_rehash,
+                                     stored_cost)
+
+LOGIN = {'email': 'test@example.com', 'password': 'password123'}
+
+
+def test_login_rehashes_legacy_pbkdf2_to_scrypt(client, db):
+    """Test that a successful login transparently upgrades the stored hash"""
+    user = db.session.get(User, 1)
+    assert user.password.startswith('pbkdf2:')
+
+    assert client.post('/auth/login', json=LOGIN).status_code == 200
+    db.session.refresh(user)
+    assert user.password.startswith('scrypt:16384:8:1$')
+
+    # Still accepted afterwards, and not rehashed again
+    upgraded = user.password
+    assert client.post('/auth/login', json=LOGIN).status_code == 200
+    db.session.refresh(user)
+    assert user.password == upgraded
+    assert client.post('/auth/login', json=dict(LOGIN, password='wrong')).status_code == 401
+
+
+def test_rehash_only_upgrades():
+    """Test that cost comparisons never downgrade a stronger hash"""
+    legacy = generate_password_hash('pw', method='pbkdf2:sha256:600000')
+    strong = generate_password_hash('pw', method='scrypt:32768:8:1')
+    assert stored_cost(legacy) == (600000,) and stored_cost(strong) == (32768, 8, 1)
+    assert needs_rehash(legacy, 'scrypt', (16384, 8, 1))
+    assert not needs_rehash(strong, 'scrypt', (16384, 8, 1))
+    assert needs_rehash(strong, 'scrypt', (65536, 8, 1))
+    # An impossibly small budget still yields the floor
+    assert calibrate('scrypt', 0) == MIN_COST['scrypt']
+
+
+def test_hash_workers_share_the_cores_between_web_workers(monkeypatch):
+    """Test that each web worker's default pool is its share of the cores, never zero"""
+    monkeypatch.setattr(passwords.os, 'cpu_count', lambda: 8)
+    assert PasswordHasher(cost='16384:8:1', web_workers=4).workers == 2
+    assert PasswordHasher(cost='16384:8:1', web_workers=16).workers == 1
+    assert PasswordHasher(cost='16384:8:1').workers == 8
+    assert PasswordHasher(cost='16384:8:1', workers=0, web_workers=4).workers == 0
+
+
+def test_pool_hashes_and_sheds_load(client, db, monkeypatch):
+    """Test hashing on the process pool and that a full queue answers 503 with Retry-After"""
+    hasher = PasswordHasher(cost='16384:8:1', workers=1, max_pending=1)
+    try:
+        stored = hasher.hash('s3cret')
+        assert hasher.verify(stored, 's3cret') == (True, None)
+        assert hasher.verify(stored, 'nope') == (False, None)
+        assert hasher.verify(None, 's3cret') == (False, None)
+
+        monkeypatch.setattr(passwords, '_hasher', hasher)
+        hasher.timeout = 0.1
+        assert hasher._pending.acquire()  # queue full
+        response = client.post('/auth/login', json=LOGIN)
+        hasher._pending.release()
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+    finally:
+        hasher.shutdown()
+
+    with pytest.raises(ValueError):
+        PasswordHasher(scheme='md5')
@@ -0,0 +1,113 @@
+import pytest
+from datetime import datetime
+from backend.database.models import (
+    User, StudySession, Task, StudyGroup, GroupMembership, GroupStudySession,
+    Achievement, UserAchievement, PointTransaction
+)
+
+SMALL, LARGE = 2, 12
+
+
+def make_user(db, name):
+    user = User(username=name, email=f'{name}@example.com', password='x')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def seed_my_groups(db, n):
+    user = make_user(db, f'joiner{n}')
+    groups = [StudyGroup(name=f'Group {i}', join_code=f'QC{n:02d}{i:02d}') for i in range(n)]
+    db.session.add_all(groups)
+    db.session.commit()
+    db.session.add_all([GroupMembership(group_id=g.id, user_id=user.id) for g in groups])
+    db.session.commit()
+    return f'/groups/my?user_id={user.id}'
+
+
+def seed_group_members(db, n):
+    group = StudyGroup(name='Counted', join_code=f'QCM{n:02d}')
+    db.session.add(group)
+    db.session.commit()
+    users = [make_user(db, f'member{n}_{i}') for i in range(n)]
+    db.session.add_all([GroupMembership(group_id=group.id, user_id=u.id) for u in users])
+    db.session.commit()
+    return f'/groups/{group.id}/members'
+
+
+def seed_group_sessions(db, n):
+    group = StudyGroup(name='Sessions', join_code=f'QCS{n:02d}')
+    db.session.add(group)
+    db.session.commit()
+    db.session.add_all([
+        GroupStudySession(group_id=group.id, subject='Math', scheduled_time=datetime.utcnow(), duration=30)
+        for _ in range(n)
+    ])
+    db.session.commit()
+    return f'/groups/{group.id}/sessions'
+
+
+def seed_study_sessions(db, n):
+    user = make_user(db, f'sessions{n}')
+    db.session.add_all([
+        StudySession(user_id=user.id, subject='Math', duration=30, scheduled_time=datetime.utcnow())
+        for _ in range(n)
+    ])
+    db.session.commit()
+    return f'/study_sessions/{user.id}'
+
+
+def seed_tasks(db, n):
+    user = make_user(db, f'tasks{n}')
+    db.session.add_all([Task(user_id=user.id, title=f'Task {i}') for i in range(n)])
+    db.session.commit()
+    return f'/kanban/user/{user.id}'
+
+
+def seed_user_achievements(db, n):
+    user = make_user(db, f'badges{n}')
+    achievements = [Achievement(name=f'Badge {n}-{i}', description='Counted', points=1) for i in range(n)]
+    db.session.add_all(achievements)
+    db.session.commit()
+    db.session.add_all([UserAchievement(user_id=user.id, achievement_id=a.id) for a in achievements])
+    db.session.commit()
+    return f'/gamification/user/{user.id}/achievements'
+
+
+def seed_transactions(db, n):
+    user = make_user(db, f'points{n}')
+    db.session.add_all([PointTransaction(user_id=user.id, amount=1, reason='Counted') for _ in range(n)])
+    db.session.commit()
+    return f'/gamification/user/{user.id}/transactions'
+
+
+@pytest.fixture
+def fresh_catalog():
+    from backend.utils.achievement_catalog import invalidate_catalog
+    yield
+    # Achievements created here are rolled back with the test transaction
+    invalidate_catalog()
+
+
+@pytest.mark.parametrize('seed', [
+    seed_my_groups,
+    seed_group_members,
+    seed_group_sessions,
+    seed_study_sessions,
+    seed_tasks,
+    seed_user_achievements,
+    seed_transactions,
+])
+def test_query_count_is_independent_of_result_size(client, db, auth_headers, record_queries, fresh_catalog, seed):
+    """Fail if an endpoint issues more queries as its result grows (N+1)"""
+    counts = {}
+    for n in (SMALL, LARGE):
+        path = seed(db, n)
+        client.get(path, headers=auth_headers)  # warm per-worker caches
+        with record_queries() as statements:
+            response = client.get(path, headers=auth_headers)
+        assert response.status_code == 200
+        assert len(response.get_json()) == min(n, 20)
+        counts[n] = len(statements)
+
+    assert counts[SMALL] == counts[LARGE], f'{seed.__name__}: {counts}'
@@ -0,0 +1,87 @@
+import re
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import insert, text
+from backend.database.models import (
+    User, StudySession, Task, StudyGroup, GroupMembership, GroupStudySession,
+    PointTransaction, UserProfile
+)
+
+# Tables that are read in full on purpose (the achievement catalog is tiny and cached)
+FULL_SCAN_ALLOWED = {'achievement'}
+
+GROUP_ID = 9001
+SEED_USERS = 300
+
+
+def full_scans(connection, statement, parameters):
+    """Return the tables the planner would read sequentially for a statement."""
+    if connection.dialect.name == 'sqlite':
+        rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+        matches = [re.match(r'SCAN (\w+)', row[-1]) for row in rows]
+    else:
+        rows = connection.exec_driver_sql('EXPLAIN ' + statement, parameters).fetchall()
+        matches = [re.search(r'Seq Scan on (\w+)', row[0]) for row in rows]
+    return {m.group(1) for m in matches if m} - FULL_SCAN_ALLOWED
+
+
+@pytest.fixture
+def large_dataset(db):
+    """Seed enough rows for the planner to prefer indexes, with user 1 as a small slice."""
+    now = datetime.utcnow()
+    first_id = db.session.query(db.func.max(User.id)).scalar() + 1
+    user_ids = range(first_id, first_id + SEED_USERS)
+
+    db.session.execute(insert(User), [
+        {'id': i, 'username': f'plan{i}', 'email': f'plan{i}@example.com', 'password': 'x'} for i in user_ids
+    ])
+    db.session.execute(insert(StudySession), [
+        {'user_id': i, 'subject': f'Subject {j % 7}', 'duration': 30,
+         'scheduled_time': now - timedelta(days=j), 'completed': j % 2 == 0}
+        for i in user_ids for j in range(20)
+    ])
+    db.session.execute(insert(Task), [
+        {'user_id': i, 'title': f'Task {j}', 'status': 'todo'} for i in user_ids for j in range(5)
+    ])
+    db.session.execute(insert(PointTransaction), [
+        {'user_id': i, 'amount': 5, 'reason': 'Seed', 'created_at': now} for i in user_ids for j in range(10)
+    ])
+    db.session.execute(insert(UserProfile), [{'user_id': i, 'study_style': 'visual'} for i in user_ids])
+    db.session.execute(insert(StudyGroup), [
+        {'id': GROUP_ID + g, 'name': f'Group {g}', 'join_code': f'PLAN{g:04d}'} for g in range(30)
+    ])
+    db.session.execute(insert(GroupMembership), [
+        {'group_id': GROUP_ID + g, 'user_id': i} for g in range(30) for i in user_ids if (i + g) % 10 == 0
+    ] + [{'group_id': GROUP_ID, 'user_id': 1}])
+    db.session.execute(insert(GroupStudySession), [
+        {'group_id': GROUP_ID + g, 'subject': 'Seed', 'scheduled_time': now, 'duration': 60}
+        for g in range(30) for _ in range(5)
+    ])
+    db.session.commit()
+    db.session.execute(text('ANALYZE'))
+    return db
+
+
+@pytest.mark.parametrize('path', [
+    '/study_sessions/1',
+    '/kanban/user/1',
+    '/groups/my?user_id=1',
+    f'/groups/{GROUP_ID}/members',
+    f'/groups/{GROUP_ID}/sessions',
+    '/gamification/user/1/achievements',
+    '/gamification/user/1/points',
+    '/gamification/user/1/transactions',
+    '/onboarding/profile/1',
+])
+def test_route_queries_use_indexes(client, large_dataset, auth_headers, record_queries, path):
+    """Fail if a route's query would fall back to a sequential scan"""
+    db = large_dataset
+    with record_queries() as statements:
+        response = client.get(path, headers=auth_headers)
+    assert response.status_code in (200, 404)
+    assert statements, f'{path} issued no queries'
+
+    connection = db.session.connection()
+    for statement, parameters in statements:
+        scanned = full_scans(connection, statement, parameters)
+        assert not scanned, f'{path} scans {sorted(scanned)}: {statement}'
@@ -0,0 +1,372 @@
+import json
+import re
+import pytest
+from datetime import datetime, timedelta
+from backend.database.models import User, StudySession, JobWatermark
+from backend.tools.fake_openai import FakeOpenAIServer
+from backend.utils import scheduler
+from backend.utils.reschedule_prompts import (
+    ScheduleParseError, estimate_tokens, pack_batches, parse_batch_schedule, parse_schedule, section_cost, user_section
+)
+from backend.utils.reschedule_solver import ReschedulingSolver, WEEKDAYS
+
+TOMORROW_EVENING = (datetime.now() + timedelta(days=1)).replace(hour=18, minute=0, second=0, microsecond=0)
+
+
+def reschedule_all(body):
+    """Fake model: move every session id in the prompt to tomorrow evening"""
+    prompt = body['messages'][-1]['content']
+    batch = next((line for line in prompt.splitlines() if line.startswith('{"users"')), None)
+    if batch is not None:
+        return json.dumps({
+            str(user['user_id']): {str(s['id']): TOMORROW_EVENING.isoformat() for s in user['missed_sessions']}
+            for user in json.loads(batch)['users']
+        })
+    ids = re.findall(r'"id": (\d+)', prompt)
+    return json.dumps({session_id: TOMORROW_EVENING.isoformat() for session_id in ids})
+
+
+@pytest.fixture
+def fake_model(app, monkeypatch, use_llm):
+    with FakeOpenAIServer(reply=reschedule_all, first_token_delay=0.2) as server:
+        use_llm(server.base_url)
+        monkeypatch.setitem(app.config, 'RESCHEDULE_WORKERS', 8)
+        monkeypatch.setitem(app.config, 'RESCHEDULE_RATE_LIMIT', 0)
+        yield server
+
+
+def seed_missed(db, users, per_user=2, prefix='missed'):
+    now = datetime.now()
+    sessions = []
+    for i in range(users):
+        user = User(username=f'{prefix}{i}', email=f'{prefix}{i}@example.com', password='x')
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(StudySession(user_id=user.id, subject='History', duration=30,
+                                    scheduled_time=now - timedelta(days=3, hours=i), completed=True))
+        for j in range(per_user):
+            session = StudySession(user_id=user.id, subject='Math', duration=45,
+                                   scheduled_time=now - timedelta(hours=j + 1), completed=False)
+            db.session.add(session)
+            sessions.append(session)
+    db.session.commit()
+    return [s.id for s in sessions]
+
+
+def test_reschedule_runs_users_concurrently(app, db, fake_model, record_queries, monkeypatch):
+    """Test that model calls fan out in parallel and history is prefetched in one query"""
+    monkeypatch.setitem(app.config, 'RESCHEDULE_PROMPT_TOKEN_BUDGET', 0)
+    session_ids = seed_missed(db, users=6)
+
+    with record_queries() as statements:
+        report = scheduler.ai_reschedule_missed_sessions(app)
+
+    assert report.users >= 6
+    assert report.failures == 0
+    assert report.ai_rescheduled == report.sessions
+    assert report.elapsed < 0.2 * report.users  # sequential calls would take at least this long
+    assert report.percentile(95) >= 0.2
+    # watermarks + missed sessions + windowed history + upcoming sessions + re-lock for the write
+    assert len(statements) == 5
+
+    for session_id in session_ids:
+        assert db.session.get(StudySession, session_id).scheduled_time == TOMORROW_EVENING
+
+
+def test_reschedule_falls_back_when_model_fails(app, db, fake_model, monkeypatch, use_llm):
+    """Test that a failing model call falls back to the solver's plan"""
+    use_llm('http://127.0.0.1:9/v1')
+    monkeypatch.setitem(app.config, 'RESCHEDULE_MAX_RETRIES', 1)
+    session_ids = seed_missed(db, users=2)
+
+    report = scheduler.ai_reschedule_missed_sessions(app)
+
+    assert report.failures == report.users
+    assert report.retries == 0  # retries are only counted on eventual success
+    assert report.fallback_rescheduled == report.sessions
+    for session_id in session_ids:
+        assert db.session.get(StudySession, session_id).scheduled_time > datetime.now()
+
+
+def test_rescheduled_ids_are_scoped_to_the_user(app, db, fake_model):
+    """Test that a batch reply moving another user's session is ignored"""
+    session_ids = seed_missed(db, users=2, per_user=1)
+    other = session_ids[1]
+    original = db.session.get(StudySession, other).scheduled_time
+    owners = dict(db.session.query(StudySession.id, StudySession.user_id).filter(StudySession.id.in_(session_ids)))
+    fake_model.reply = lambda body: json.dumps({
+        str(owners[session_id]): {str(other): TOMORROW_EVENING.isoformat()} for session_id in session_ids
+    })
+
+    report = scheduler.ai_reschedule_missed_sessions(app)
+
+    # Only the owner's call may move it
+    assert report.ai_rescheduled == 1
+    assert db.session.get(StudySession, other).scheduled_time != original
+
+
+def habit(weekday, hour, count=20):
+    return [{"weekday": WEEKDAYS[weekday], "hour": hour, "subject": "Math", "duration": 60}] * count
+
+
+def test_solver_follows_study_pattern_and_avoids_overlaps():
+    """Test the solver picks the user's usual slot, skips busy ones and spreads sessions"""
+    now = datetime(2025, 4, 28, 9, 30)  # a Monday
+    missed = [{"id": 1, "duration": 60}, {"id": 2, "duration": 60}]
+    history = habit(2, 18) + habit(4, 18)  # Wednesdays and Fridays at 18:00
+
+    plan = ReschedulingSolver().solve(history, missed, [], now)
+    assert sorted(plan.times.values()) == [datetime(2025, 4, 30, 18), datetime(2025, 5, 2, 18)]
+    assert plan.confidence > 0.8
+
+    busy = [(datetime(2025, 4, 30, 17, 45), 90)]
+    plan = ReschedulingSolver().solve(history, missed, busy, now)
+    assert datetime(2025, 4, 30, 18) not in plan.times.values()
+    assert datetime(2025, 5, 2, 18) in plan.times.values()
+
+
+def test_solver_has_low_confidence_without_history():
+    """Test that an empty history still gives a waking-hours plan, flagged as uncertain"""
+    now = datetime(2025, 4, 28, 23, 10)
+    plan = ReschedulingSolver().solve([], [{"id": 7, "duration": 30}], [], now)
+    assert plan.confidence == 0
+    assert plan.times[7] > now
+    assert 8 <= plan.times[7].hour < 22
+
+
+def test_confident_users_skip_the_model(app, db, fake_model):
+    """Test that users with a clear pattern are rescheduled locally without a model call"""
+    now = datetime.now()
+    user = User(username='habitual', email='habitual@example.com', password='x')
+    db.session.add(user)
+    db.session.flush()
+    usual = (now - timedelta(days=7)).replace(hour=19, minute=0, second=0, microsecond=0)
+    db.session.add_all([
+        StudySession(user_id=user.id, subject='Math', duration=60,
+                     scheduled_time=usual - timedelta(weeks=w), completed=True)
+        for w in range(20)
+    ])
+    missed = StudySession(user_id=user.id, subject='Math', duration=60,
+                          scheduled_time=now - timedelta(hours=2), completed=False)
+    db.session.add(missed)
+    db.session.commit()
+    missed_id = missed.id
+
+    report = scheduler.ai_reschedule_missed_sessions(app)
+
+    assert report.solver_rescheduled >= 1
+    assert not any(f"'id': {missed_id}," in r['messages'][-1]['content'] for r in fake_model.requests)
+    new_time = db.session.get(StudySession, missed_id).scheduled_time
+    assert (new_time.weekday(), new_time.hour) == (usual.weekday(), 19)
+
+
+@pytest.fixture
+def lock_engine(tmp_path):
+    from sqlalchemy import create_engine
+    from backend.database.models import SchedulerLock
+    engine = create_engine(f"sqlite:///{tmp_path / 'scheduler.db'}")
+    SchedulerLock.__table__.create(engine)
+    yield engine
+    engine.dispose()
+
+
+def test_lease_lock_allows_a_single_holder(lock_engine):
+    """Test that only one owner holds the lease until it is released or expires"""
+    from backend.utils.leader_lock import LeaseLock
+    first = LeaseLock(lock_engine, 'jobs', ttl=60, owner='a')
+    second = LeaseLock(lock_engine, 'jobs', ttl=60, owner='b')
+
+    assert first.acquire()
+    assert not second.acquire()
+    assert first.acquire()  # renewal
+
+    first.release()
+    assert second.acquire()
+
+    expired = LeaseLock(lock_engine, 'jobs', ttl=-1, owner='b')
+    assert expired.acquire()  # b renews with an already-lapsed lease
+    assert first.acquire()
+
+
+def test_single_runner_scheduler_elects_one_leader(lock_engine):
+    """Test that only the lock holder runs jobs and a successor keeps the persisted schedule"""
+    from backend.utils.leader_lock import LeaseLock
+    runners = [
+        scheduler.SingleRunnerScheduler(lock_engine, LeaseLock(lock_engine, 'jobs', owner=name),
+                                        scheduler.scheduled_jobs({}))
+        for name in ('a', 'b')
+    ]
+    try:
+        for runner in runners:
+            runner.step()
+        assert [runner.is_leader for runner in runners] == [True, False]
+        next_run = runners[0].scheduler.get_job('reschedule_missed_sessions').next_run_time
+
+        runners[0].stop()
+        runners[1].step()
+        assert runners[1].is_leader
+        assert runners[1].scheduler.get_job('reschedule_missed_sessions').next_run_time == next_run
+    finally:
+        for runner in runners:
+            runner.stop()
+
+
+def test_incremental_runs_only_scan_newly_overdue_sessions(app, db, fake_model):
+    """Test that a run picks up sessions overdue since the last watermark (with overlap) or changed since it"""
+    from backend.database.models import JobWatermark, SessionRescheduleState
+    seed_missed(db, users=1, per_user=1)
+    first = scheduler.ai_reschedule_missed_sessions(app)
+    assert first.sessions == 1
+    watermark = db.session.get(JobWatermark, scheduler.RESCHEDULE_JOB).value
+    # updated_at is compared against a watermark taken on its own (UTC) clock
+    assert db.session.get(JobWatermark, scheduler.RESCHEDULE_CHANGES_JOB).value <= datetime.utcnow()
+
+    user_id = db.session.query(User.id).filter_by(username='missed0').scalar()
+    long_ago = datetime.utcnow() - timedelta(days=1)
+
+    def add(subject, scheduled_time, **fields):
+        session = StudySession(user_id=user_id, subject=subject, duration=30, scheduled_time=scheduled_time,
+                               completed=False, **fields)
+        db.session.add(session)
+        return session
+
+    stale = add('Old', watermark - timedelta(hours=2), updated_at=long_ago)
+    fresh = add('New', watermark + timedelta(milliseconds=1))
+    backdated = add('Backdated', watermark - timedelta(hours=2))  # created after the run, in the past
+    skipped = add('Locked', watermark - timedelta(minutes=10), updated_at=long_ago)  # within the overlap
+    db.session.commit()
+    stale_id, stale_time = stale.id, stale.scheduled_time
+    picked_ids = [fresh.id, backdated.id, skipped.id]
+
+    second = scheduler.ai_reschedule_missed_sessions(app)
+
+    assert second.sessions == 3
+    assert db.session.get(StudySession, stale_id).scheduled_time == stale_time
+    for session_id in picked_ids:
+        state = db.session.get(SessionRescheduleState, session_id)
+        assert state.attempts == 1
+        assert state.last_outcome == 'ai'
+
+
+def test_sessions_changed_while_planning_are_left_alone(app, db, fake_model, monkeypatch):
+    """Test that the claim is committed before the model is called and user edits made meanwhile win"""
+    from backend.database.models import SessionRescheduleState
+    moved, completed, kept = seed_missed(db, users=1, per_user=3)
+    users_time = datetime.now() + timedelta(days=3)
+    plan_batch = scheduler.ReschedulePipeline.plan_batch
+
+    def plan_while_user_edits(self, user_sessions, now, pool):
+        states = {state.session_id: state.last_outcome for state in SessionRescheduleState.query}
+        assert states == dict.fromkeys((moved, completed, kept, held, abandoned), scheduler.RESCHEDULE_CLAIMED)
+        result = plan_batch(self, user_sessions, now, pool)
+        db.session.get(StudySession, moved).scheduled_time = users_time
+        db.session.get(StudySession, completed).completed = True
+        db.session.commit()
+        return result
+
+    monkeypatch.setattr(scheduler.ReschedulePipeline, 'plan_batch', plan_while_user_edits)
+    # A claim held by a live run is skipped; one left behind by a run that died is taken over
+    held, abandoned = seed_missed(db, users=1, per_user=2, prefix='claimed')
+    db.session.add_all([
+        SessionRescheduleState(session_id=held, attempts=1, last_rescheduled_at=datetime.now(),
+                               last_outcome=scheduler.RESCHEDULE_CLAIMED),
+        SessionRescheduleState(session_id=abandoned, attempts=1, last_outcome=scheduler.RESCHEDULE_CLAIMED,
+                               last_rescheduled_at=datetime.now() - scheduler.RESCHEDULE_CLAIM_TTL * 2),
+    ])
+    db.session.commit()
+    report = scheduler.ai_reschedule_missed_sessions(app)
+
+    assert report.changed == 2
+    assert report.sessions == 4
+    assert db.session.get(StudySession, moved).scheduled_time == users_time
+    assert db.session.get(StudySession, kept).scheduled_time == TOMORROW_EVENING
+    outcomes = {state.session_id: (state.attempts, state.last_outcome) for state in SessionRescheduleState.query}
+    assert outcomes == {moved: (1, 'changed'), completed: (1, 'changed'), kept: (1, 'ai'),
+                        held: (1, scheduler.RESCHEDULE_CLAIMED), abandoned: (2, 'ai')}
+
+
+def test_sessions_stop_being_rescheduled_after_max_attempts(app, db, fake_model, monkeypatch):
+    """Test that sessions which used up their attempts are left alone"""
+    from backend.database.models import SessionRescheduleState
+    monkeypatch.setitem(app.config, 'RESCHEDULE_MAX_ATTEMPTS', 2)
+    gave_up, retried = seed_missed(db, users=1, per_user=2)
+    db.session.add_all([
+        SessionRescheduleState(session_id=gave_up, attempts=2),
+        SessionRescheduleState(session_id=retried, attempts=1),
+    ])
+    db.session.commit()
+
+    report = scheduler.ai_reschedule_missed_sessions(app)
+
+    assert report.sessions == 1
+    assert db.session.get(SessionRescheduleState, gave_up).attempts == 2
+    assert db.session.get(SessionRescheduleState, retried).attempts == 2
+
+
+def test_batch_prompts_cover_many_users_per_request(app, db, fake_model, monkeypatch):
+    """Test that uncertain users are packed into as few model requests as the token budget allows"""
+    session_ids = seed_missed(db, users=6)
+
+    report = scheduler.ai_reschedule_missed_sessions(app)
+    assert report.requests == 1
+    assert len(fake_model.requests) == 1
+    assert report.ai_rescheduled == report.sessions
+    for session_id in session_ids:
+        assert db.session.get(StudySession, session_id).scheduled_time == TOMORROW_EVENING
+
+    # A tight budget splits the same work over several requests
+    monkeypatch.setitem(app.config, 'RESCHEDULE_PROMPT_TOKEN_BUDGET', 500)
+    db.session.query(JobWatermark).delete()
+    more_ids = seed_missed(db, users=6, prefix='tight')
+    report = scheduler.ai_reschedule_missed_sessions(app)
+    assert 1 < report.requests < report.users
+    assert report.ai_rescheduled == report.sessions == len(more_ids)
+
+
+def test_parse_schedule_validates_the_reply():
+    """Test that replies are parsed as JSON only and checked against the expected shape"""
+    now = datetime(2025, 4, 28, 12)
+    reply = json.dumps({"1": "2025-04-29T18:00:00", "2": "2025-04-27T18:00:00", "99": "2025-04-29T10:00:00"})
+    assert parse_schedule(reply, allowed_ids={1, 2}, now=now) == {1: datetime(2025, 4, 29, 18)}
+
+    for bad in ["{'1': '2025-04-29T18:00:00'}",  # Python literal, not JSON
+                "__import__('os').getcwd()",
+                '["2025-04-29T18:00:00"]',
+                '{"one": "2025-04-29T18:00:00"}',
+                '{"1": "tomorrow evening"}',
+                '{"1": 1745949600}']:
+        with pytest.raises(ScheduleParseError):
+            parse_schedule(bad)
+
+    batch = json.dumps({"7": {"1": "2025-04-29T18:00:00", "2": "2025-04-29T19:00:00"}, "8": {"3": "2025-04-30T09:00:00"}})
+    assert parse_batch_schedule(batch, {7: {1}, 9: {4}}, now) == {7: {1: datetime(2025, 4, 29, 18)}}
+
+    # One malformed entry drops only that user, not everyone packed into the prompt
+    batch = json.dumps({"7": {"1": "2025-04-29T18:00:00"}, "8": {"3": "tomorrow"}, "9": {"x": "2025-04-29T10:00:00"},
+                        "ten": {"5": "2025-04-29T10:00:00"}, "11": {"6": "2025-04-30T09:00:00"}})
+    errors = {}
+    assert parse_batch_schedule(batch, {7: {1}, 8: {3}, 9: {4}, 11: {6}}, now, errors) == {
+        7: {1: datetime(2025, 4, 29, 18)}, 11: {6: datetime(2025, 4, 30, 9)}}
+    assert sorted(errors) == [8, 9]
+    with pytest.raises(ScheduleParseError):
+        parse_batch_schedule('["not", "an", "object"]', {7: {1}})
+
+
+def test_pack_batches_respects_token_budget():
+    """Test the packer keeps order, stays within budget and isolates oversized users"""
+    def section(user_id, sessions):
+        missed = [{"id": user_id * 100 + i, "subject": "Math", "duration": 30,
+                   "original_time": "2025-04-28T10:00:00"} for i in range(sessions)]
+        return user_section(user_id, [], missed)
+
+    sections = [section(i, 2) for i in range(10)] + [section(99, 200)] + [section(100, 1)]
+    budget, overhead = 600, 200
+    batches = pack_batches(sections, budget, max_users=4, overhead=overhead)
+
+    assert [s["user_id"] for batch in batches for s in batch] == [s["user_id"] for s in sections]
+    for batch in batches:
+        assert len(batch) <= 4
+        if len(batch) > 1:
+            assert overhead + sum(section_cost(s) for s in batch) <= budget
+    assert [s["user_id"] for s in batches[-2]] == [99]
+    assert estimate_tokens("x" * 400) == 101
@@ -300,4 +300,100 @@ def test_get_group_sessions(client, db, auth_headers):
     # Verify our test sessions are in the response
     session_subjects = [s['subject'] for s in data]
     assert 'Session Topic 1' in session_subjects
-    assert 'Session Topic 2' in session_subjects
\ No newline at end of file
+    assert 'Session Topic 2' in session_subjects
+
+def test_group_members_pagination(client, db, auth_headers):
+    """Test paging through group members with limit and offset"""
+    from backend.database.models import User
+
+    group = StudyGroup(name='Paged Group', description='Pagination', join_code='PAGE01')
+    db.session.add(group)
+    db.session.commit()
+
+    users = [User(username=f'paged{i}', email=f'paged{i}@example.com', password='x') for i in range(5)]
+    db.session.add_all(users)
+    db.session.commit()
+    db.session.add_all([GroupMembership(group_id=group.id, user_id=u.id) for u in users])
+    db.session.commit()
+
+    response = client.get(f'/groups/{group.id}/members?limit=2&offset=2', headers=auth_headers)
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert [m['username'] for m in data] == ['paged2', 'paged3']
+    assert response.headers['X-Next-Offset'] == '4'
+
+    # Following X-Next-Offset walks every member; the last page has no marker
+    seen, offset = [], 0
+    while offset is not None:
+        response = client.get(f'/groups/{group.id}/members', query_string={'limit': 2, 'offset': offset},
+                              headers=auth_headers)
+        seen += [m['username'] for m in json.loads(response.data)]
+        offset = response.headers.get('X-Next-Offset')
+    assert seen == [f'paged{i}' for i in range(5)]
+
+def test_group_session_edits_propagate_to_members(client, db, auth_headers):
+    """Test that group session edits and deletes reach members' linked sessions"""
+    from backend.database.models import User, StudySession
+    from datetime import datetime, timedelta
+
+    group = StudyGroup(name='Fan-out Group', description='Propagation', join_code='FANOUT1')
+    db.session.add(group)
+    db.session.commit()
+    users = [User(username=f'fan{i}', email=f'fan{i}@example.com', password='x') for i in range(3)]
+    db.session.add_all(users)
+    db.session.commit()
+    db.session.add_all([GroupMembership(group_id=group.id, user_id=u.id) for u in users])
+    db.session.commit()
+
+    response = client.post(
+        f'/groups/{group.id}/sessions',
+        data=json.dumps({
+            'subject': 'Fan-out Chemistry',
+            'scheduled_time': (datetime.utcnow() + timedelta(days=2)).isoformat() + 'Z',
+            'duration': 45
+        }),
+        content_type='application/json',
+        headers=auth_headers
+    )
+    assert response.status_code == 201
+    data = json.loads(response.data)
+    assert data['member_sessions'] == 3
+    group_session_id = data['group_session_id']
+
+    linked = StudySession.query.filter_by(group_session_id=group_session_id).all()
+    assert sorted(s.user_id for s in linked) == sorted(u.id for u in users)
+
+    # Copies get the same column values as sessions created through the model
+    reference = StudySession(user_id=users[0].id, subject='Reference', duration=45,
+                             scheduled_time=linked[0].scheduled_time)
+    db.session.add(reference)
+    db.session.flush()
+    for column in ('start_time', 'completed', 'created_at', 'updated_at'):
+        assert all((getattr(s, column) is None) == (getattr(reference, column) is None) for s in linked), column
+    assert all(s.completed is False for s in linked)
+    db.session.delete(reference)
+    db.session.commit()
+
+    # One member already completed their copy; it must not be rewritten or deleted
+    linked[0].completed = True
+    db.session.commit()
+
+    response = client.put(
+        f'/groups/{group.id}/sessions/{group_session_id}',
+        data=json.dumps({'duration': 60}),
+        content_type='application/json',
+        headers=auth_headers
+    )
+    assert response.status_code == 200
+    assert json.loads(response.data)['member_sessions'] == 2
+    db.session.expire_all()
+    durations = sorted(s.duration for s in StudySession.query.filter_by(group_session_id=group_session_id))
+    assert durations == [45, 60, 60]
+
+    response = client.delete(f'/groups/{group.id}/sessions/{group_session_id}', headers=auth_headers)
+    assert response.status_code == 200
+    assert json.loads(response.data)['member_sessions'] == 2
+    remaining = StudySession.query.filter_by(subject='Fan-out Chemistry').all()
+    assert len(remaining) == 1
+    assert remaining[0].completed is True
+    assert remaining[0].group_session_id is None
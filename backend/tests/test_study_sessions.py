@@ -184,4 +184,41 @@ def test_update_study_session(client, db, auth_headers):
     # Verify session is updated in database
     session = StudySession.query.get(new_session['id'])
     assert session.subject == 'Advanced Physics'
-    assert session.duration == 90
\ No newline at end of file
+    assert session.duration == 90
+def test_get_study_sessions_keyset_pagination(client, db, auth_headers):
+    """Test cursor pagination, filters and sparse fieldsets"""
+    from backend.database.models import User
+
+    user = User(username='pager', email='pager@example.com', password='x')
+    db.session.add(user)
+    db.session.commit()
+
+    base = datetime(2025, 1, 1, 9, 0)
+    db.session.add_all([
+        StudySession(user_id=user.id, subject=f'Subject {i}', duration=30,
+                     scheduled_time=base + timedelta(days=i // 2), completed=i % 3 == 0)
+        for i in range(7)
+    ])
+    db.session.commit()
+
+    subjects, cursor = [], None
+    while True:
+        url = f'/study_sessions/{user.id}?limit=3&fields=id,subject'
+        response = client.get(url + (f'&cursor={cursor}' if cursor else ''), headers=auth_headers)
+        assert response.status_code == 200
+        page = json.loads(response.data)
+        assert all(set(s) == {'id', 'subject'} for s in page)
+        subjects += [s['subject'] for s in page]
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            break
+    assert subjects == [f'Subject {i}' for i in range(7)]
+
+    response = client.get(
+        f'/study_sessions/{user.id}?from=2025-01-02T00:00:00&to=2025-01-04T00:00:00&completed=false',
+        headers=auth_headers
+    )
+    assert [s['subject'] for s in json.loads(response.data)] == ['Subject 2', 'Subject 4', 'Subject 5']
+
+    response = client.get(f'/study_sessions/{user.id}?fields=password', headers=auth_headers)
+    assert response.status_code == 400
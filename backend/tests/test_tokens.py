@@ -0,0 +1,156 @@
+import jwt
+import pytest
+from datetime import datetime, timedelta
+from backend.database.models import RefreshToken, RevokedToken, User
+from backend.utils import revocation, tokens
+from backend.utils.revocation import BloomFilter
+from backend.utils.tokens import TokenVerifier, issue_tokens, parse_signing_keys, revoke_user
+
+
+@pytest.fixture(autouse=True)
+def fresh_caches(monkeypatch):
+    monkeypatch.setattr(tokens, '_verifier', None)
+    monkeypatch.setattr(tokens, '_user_cache', None)
+    monkeypatch.setattr(revocation, '_revocations', None)
+
+
+def claims(**extra):
+    return dict({'user_id': 1, 'exp': datetime.utcnow() + timedelta(hours=1)}, **extra)
+
+
+def test_verified_tokens_are_cached_until_exp(monkeypatch):
+    """Test that repeat tokens skip jwt.decode and expire from the cache at exp"""
+    verifier = TokenVerifier(legacy_secret='s')
+    token = verifier.encode(claims(exp=datetime.utcnow() + timedelta(seconds=60)))
+    header, _, signature = token.split('.')
+    forged = jwt.encode(claims(user_id=2), 'other', algorithm='HS256').split('.')[1]
+    assert verifier.verify(token)['user_id'] == 1
+
+    with monkeypatch.context() as patch:
+        patch.setattr(jwt, 'decode', lambda *a, **k: pytest.fail('decoded a cached token'))
+        assert verifier.verify(token)['user_id'] == 1
+    # Same signature with a different payload is not a cache hit
+    with pytest.raises(jwt.InvalidSignatureError):
+        verifier.verify(f"{header}.{forged}.{signature}")
+
+    later = tokens.time.time() + 61
+    monkeypatch.setattr(tokens.time, 'time', lambda: later)
+    with pytest.raises(jwt.ExpiredSignatureError):
+        verifier.verify(token)
+    assert not verifier._entries
+
+
+def test_key_rotation_by_kid():
+    """Test that new tokens carry the active kid and retired keys stop verifying"""
+    verifier = TokenVerifier(parse_signing_keys('old=one,new=two'), active_kid='old', legacy_secret='legacy')
+    old = verifier.encode(claims())
+    legacy = jwt.encode(claims(), 'legacy', algorithm='HS256')
+    assert jwt.get_unverified_header(old)['kid'] == 'old'
+    assert verifier.verify(old) and verifier.verify(legacy)
+
+    verifier.set_keys(parse_signing_keys('old=one,new=two'), active_kid='new', legacy_secret='legacy')
+    new = verifier.encode(claims())
+    assert jwt.get_unverified_header(new)['kid'] == 'new'
+    assert verifier.verify(old) and verifier.verify(new)
+
+    verifier.set_keys(parse_signing_keys('new=two'), active_kid='new')
+    for retired in (old, legacy):
+        with pytest.raises(jwt.InvalidTokenError):
+            verifier.verify(retired)
+    with pytest.raises(ValueError):
+        verifier.set_keys({'new': 'two'}, active_kid='missing')
+
+
+def test_current_user_is_hydrated_lazily_from_the_user_cache(client, db, auth_headers, record_queries):
+    """Test /auth/me loads the user once, then serves it from the per-worker cache"""
+    with record_queries() as loads:
+        first = client.get('/auth/me', headers=auth_headers)
+    assert [q for q in loads if 'FROM user' in q[0]]
+    assert first.status_code == 200
+    assert first.get_json() == {'user_id': 1, 'username': 'testuser', 'email': 'test@example.com'}
+
+    with record_queries() as queries:
+        again = client.get('/auth/me', headers=auth_headers)
+    assert again.get_json() == first.get_json()
+    assert not [q for q in queries if 'FROM user' in q[0]]
+
+    assert client.get('/auth/me').status_code == 401
+    expired = jwt.encode({'user_id': 1, 'exp': datetime.utcnow() - timedelta(seconds=1)}, 'test_jwt_secret',
+                         algorithm='HS256')
+    response = client.get('/auth/me', headers={'Authorization': f'Bearer {expired}'})
+    assert response.status_code == 401 and b'expired' in response.data
+
+
+def bearer(token):
+    return {'Authorization': f'Bearer {token}'}
+
+
+def test_login_issues_short_access_token_and_rotating_refresh_token(client, db):
+    """Test refresh rotation, and that replaying a spent refresh token revokes the whole login"""
+    login = client.post('/auth/login', json={'email': 'test@example.com', 'password': 'password123'}).get_json()
+    assert login['expires_in'] == 900
+    claims = jwt.decode(login['token'], 'test_jwt_secret', algorithms=['HS256'])
+    assert claims['exp'] - claims['iat'] == 900 and claims['jti']
+
+    rotated = client.post('/auth/refresh', json={'refresh_token': login['refresh_token']})
+    assert rotated.status_code == 200
+    fresh = rotated.get_json()
+    assert fresh['refresh_token'] != login['refresh_token']
+    assert client.get('/auth/me', headers=bearer(fresh['token'])).status_code == 200
+
+    replay = client.post('/auth/refresh', json={'refresh_token': login['refresh_token']})
+    assert replay.status_code == 401
+    assert client.post('/auth/refresh', json={'refresh_token': fresh['refresh_token']}).status_code == 401
+    response = client.get('/auth/me', headers=bearer(fresh['token']))
+    assert response.status_code == 401 and b'revoked' in response.data
+    assert client.post('/auth/refresh', json={}).status_code == 400
+
+
+def test_logout_revokes_access_and_refresh_tokens(client, db):
+    """Test /auth/logout takes effect on the next request"""
+    issued = issue_tokens(db.session.get(User, 1))
+    db.session.commit()
+    assert client.get('/auth/me', headers=bearer(issued['token'])).status_code == 200
+
+    response = client.post('/auth/logout', json={'refresh_token': issued['refresh_token']},
+                           headers=bearer(issued['token']))
+    assert response.get_json() == {'message': 'Logged out'}
+    assert client.get('/auth/me', headers=bearer(issued['token'])).status_code == 401
+    assert client.post('/auth/refresh', json={'refresh_token': issued['refresh_token']}).status_code == 401
+    assert RefreshToken.query.filter_by(user_id=1, revoked_at=None).count() == 0
+
+
+def test_revocation_checks_stay_in_memory(client, db, record_queries):
+    """Test unrevoked tokens never touch revoked_token, and a user cut-off only hits older tokens"""
+    user = db.session.get(User, 1)
+    before = issue_tokens(user)
+    db.session.commit()
+    client.get('/auth/me', headers=bearer(before['token']))  # first sync loads the filter
+
+    with record_queries() as queries:
+        for _ in range(5):
+            assert client.get('/auth/me', headers=bearer(before['token'])).status_code == 200
+    assert not [q for q in queries if 'revoked_token' in q[0]]
+
+    revoke_user(1)
+    db.session.commit()
+    assert client.get('/auth/me', headers=bearer(before['token'])).status_code == 401
+    assert client.post('/auth/refresh', json={'refresh_token': before['refresh_token']}).status_code == 401
+
+    # Tokens issued after the cut-off (moved back so this one is clearly later) work
+    cut_off = RevokedToken.query.filter_by(key='user:1').one()
+    cut_off.revoked_at -= timedelta(seconds=5)
+    after = issue_tokens(user)
+    db.session.commit()
+    assert client.get('/auth/me', headers=bearer(after['token'])).status_code == 200
+
+
+def test_bloom_filter_error_rate():
+    """Test no false negatives and roughly the configured false positive rate"""
+    bloom = BloomFilter(capacity=5000, error_rate=0.01)
+    for i in range(5000):
+        bloom.add(f'jti-{i}')
+    assert all(f'jti-{i}' in bloom for i in range(5000))
+    false_positives = sum(f'other-{i}' in bloom for i in range(20000))
+    assert false_positives / 20000 < 0.02
+    assert len(bloom.bits) < 6500  # about 1.2 bytes per entry
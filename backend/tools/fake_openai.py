@@ -0,0 +1,272 @@
+"""Local OpenAI-compatible chat completions server for tests and offline development.
+
+Run it with:
+    python -m backend.tools.fake_openai --port 8100 --chunk-delay 0.05
+    python -m backend.tools.fake_openai --latency lognormal:0.8,0.5 --error-rate 0.02 --rpm 600
+
+and point the app at it with OPENAI_BASE_URL=http://127.0.0.1:8100/v1.
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_DISTRIBUTIONS = {
+    'fixed': lambda rng, seconds: seconds,
+    'uniform': lambda rng, low, high: rng.uniform(low, high),
+    'normal': lambda rng, mean, sd: max(0.0, rng.gauss(mean, sd)),
+    # median and sigma of the underlying normal, the usual shape of model latencies
+    'lognormal': lambda rng, median, sigma: rng.lognormvariate(math.log(median), sigma),
+    'exp': lambda rng, mean: rng.expovariate(1.0 / mean) if mean else 0.0,
+}
+
+
+def parse_latency(spec, rng=None):
+    """Turn 'fixed:0.2', 'uniform:0.1,0.5', 'normal:0.3,0.1', 'lognormal:0.8,0.5' or 'exp:0.3'
+    into a function returning a latency in seconds."""
+    rng = rng or random.Random()
+    name, _, params = spec.partition(':')
+    if name not in _DISTRIBUTIONS:
+        raise ValueError(f"Unknown latency distribution {name!r}; use one of {', '.join(_DISTRIBUTIONS)}")
+    args = [float(value) for value in params.split(',') if value]
+    sample = _DISTRIBUTIONS[name]
+    return lambda: sample(rng, *args)
+
+
+class FakeOpenAIServer:
+    """Serves POST /v1/chat/completions, streamed or not.
+
+    The reply is `reply` when given (a string, or a callable taking the request
+    body), otherwise an echo of the last user message.
+    Streaming replies are split into `chunk_size`-character chunks with
+    `chunk_delay` seconds between them, after `first_token_delay` plus a
+    sample of `latency` (a spec for parse_latency, or a function).
+
+    Failures: fail() scripts the next responses; `error_rate` and
+    `rate_limit_rate` answer that fraction of requests with a 5xx or a 429;
+    `rpm` caps requests per minute like a provider quota, answering 429 with
+    Retry-After beyond it. `stats` counts what was served.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, reply=None, chunk_size=4,
+                 chunk_delay=0.0, first_token_delay=0.0, latency=None, error_rate=0.0,
+                 rate_limit_rate=0.0, rpm=None, seed=None, keep_requests=True):
+        self.reply = reply
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.first_token_delay = first_token_delay
+        self._rng = random.Random(seed)
+        self.latency = parse_latency(latency, self._rng) if isinstance(latency, str) else latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.rpm = rpm
+        self.keep_requests = keep_requests
+        self.requests = []
+        self.stats = {'requests': 0, 'ok': 0, 'errors': 0, 'rate_limited': 0}
+        self._failures = []
+        self._lock = threading.Lock()
+        self._quota = (float(rpm or 0), time.monotonic())
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def fail(self, times=1, status=503):
+        """Answer the next `times` requests with an HTTP error (429s carry Retry-After)."""
+        self._failures.extend([status] * times)
+
+    def _admit(self, body):
+        """Return None to serve the request, or (status, retry_after) to refuse it."""
+        with self._lock:
+            self.stats['requests'] += 1
+            if self.keep_requests:
+                self.requests.append(body)
+            if self._failures:
+                status = self._failures.pop(0)
+                return status, 1 if status == 429 else None
+            if self.rpm:
+                # Token bucket holding one minute of quota
+                tokens, updated = self._quota
+                now = time.monotonic()
+                tokens = min(float(self.rpm), tokens + (now - updated) * self.rpm / 60.0)
+                if tokens < 1:
+                    self._quota = (tokens, now)
+                    return 429, math.ceil((1 - tokens) * 60.0 / self.rpm)
+                self._quota = (tokens - 1, now)
+            roll = self._rng.random()
+            if roll < self.rate_limit_rate:
+                return 429, 1
+            if roll < self.rate_limit_rate + self.error_rate:
+                return self._rng.choice([500, 502, 503]), None
+            return None
+
+    def _delay(self):
+        with self._lock:
+            sampled = self.latency() if self.latency is not None else 0.0
+        return self.first_token_delay + sampled
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def reply_for(self, body):
+        if callable(self.reply):
+            return self.reply(body)
+        if self.reply is not None:
+            return self.reply
+        user_messages = [m.get('content', '') for m in body.get('messages', []) if m.get('role') == 'user']
+        return f"Echo: {user_messages[-1] if user_messages else ''}"
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                if not self.path.rstrip('/').endswith('/chat/completions'):
+                    self.send_error(404)
+                    return
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                refused = server._admit(body)
+                if refused is not None:
+                    self._error(*refused)
+                    return
+                text = server.reply_for(body)
+                model = body.get('model', 'gpt-4o')
+                time.sleep(server._delay())
+                if body.get('stream'):
+                    self._stream(text, model, body)
+                else:
+                    self._complete(text, model, body)
+                server._count('ok')
+
+            def _error(self, status, retry_after=None):
+                server._count('rate_limited' if status == 429 else 'errors')
+                kind = 'rate_limit_exceeded' if status == 429 else 'server_error'
+                payload = json.dumps({'error': {'message': f'Injected error {status}', 'type': kind}}).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                if retry_after is not None:
+                    self.send_header('Retry-After', str(retry_after))
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _usage(self, text, body):
+                prompt_tokens = sum(len(m.get('content', '')) for m in body.get('messages', [])) // 4
+                completion_tokens = max(len(text) // 4, 1)
+                return {
+                    'prompt_tokens': prompt_tokens,
+                    'completion_tokens': completion_tokens,
+                    'total_tokens': prompt_tokens + completion_tokens,
+                }
+
+            def _complete(self, text, model, body):
+                payload = json.dumps({
+                    'id': 'chatcmpl-fake',
+                    'object': 'chat.completion',
+                    'created': int(time.time()),
+                    'model': model,
+                    'choices': [{
+                        'index': 0,
+                        'message': {'role': 'assistant', 'content': text},
+                        'finish_reason': 'stop',
+                    }],
+                    'usage': self._usage(text, body),
+                }).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _stream(self, text, model, body):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Cache-Control', 'no-cache')
+                self.end_headers()
+
+                pieces = [text[i:i + server.chunk_size] for i in range(0, len(text), server.chunk_size)]
+                for i, piece in enumerate(pieces):
+                    if i:
+                        time.sleep(server.chunk_delay)
+                    delta = {'content': piece}
+                    if i == 0:
+                        delta['role'] = 'assistant'
+                    self._event(model, delta, None)
+                self._event(model, {}, 'stop')
+                if (body.get('stream_options') or {}).get('include_usage'):
+                    self._event(model, None, None, self._usage(text, body))
+                self.wfile.write(b'data: [DONE]\n\n')
+                self.wfile.flush()
+
+            def _event(self, model, delta, finish_reason, usage=None):
+                chunk = {
+                    'id': 'chatcmpl-fake',
+                    'object': 'chat.completion.chunk',
+                    'created': int(time.time()),
+                    'model': model,
+                    # The final usage chunk has no choices
+                    'choices': [] if delta is None else [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+                }
+                if usage is not None:
+                    chunk['usage'] = usage
+                self.wfile.write(f'data: {json.dumps(chunk)}\n\n'.encode())
+                self.wfile.flush()
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8100)
+    parser.add_argument('--reply', default=None, help='fixed reply text (default: echo the user message)')
+    parser.add_argument('--chunk-size', type=int, default=4)
+    parser.add_argument('--chunk-delay', type=float, default=0.0, help='seconds between streamed chunks')
+    parser.add_argument('--first-token-delay', type=float, default=0.0)
+    parser.add_argument('--latency', default=None,
+                        help='extra first-token latency, e.g. fixed:0.2, uniform:0.1,0.5, lognormal:0.8,0.5, exp:0.3')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with a 5xx')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='fraction answered with a 429')
+    parser.add_argument('--rpm', type=float, default=None, help='requests per minute before answering 429')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(args.host, args.port, args.reply, args.chunk_size,
+                              args.chunk_delay, args.first_token_delay, latency=args.latency,
+                              error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+                              rpm=args.rpm, seed=args.seed, keep_requests=False)
+    print(f"Fake OpenAI server listening on {server.base_url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
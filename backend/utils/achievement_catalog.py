@@ -0,0 +1,80 @@
+# backend/utils/achievement_catalog.py
+import threading
+import time
+from collections import namedtuple
+from flask import current_app
+from sqlalchemy import event, func
+from backend.database.models import Achievement, db
+
+# Immutable snapshot of an Achievement row; exposes the same attributes the routes read
+CatalogEntry = namedtuple('CatalogEntry', ['id', 'name', 'description', 'points', 'badge_image'])
+
+_lock = threading.Lock()
+_catalog = None
+_checked_at = 0.0     # monotonic time the catalog was last compared with the table; 0 forces a check
+
+
+class AchievementCatalog:
+    """Per-worker view of the Achievement table, indexed by id and by name; `version` is the table's."""
+
+    def __init__(self, entries, version):
+        self.version = version
+        self.entries = sorted(entries, key=lambda e: e.id)
+        self.by_id = {e.id: e for e in self.entries}
+        self.by_name = {}
+        for e in self.entries:
+            # Keep the first row when a name was seeded twice, like .filter_by(name=...).first()
+            self.by_name.setdefault(e.name, e)
+
+    def get(self, achievement_id):
+        return self.by_id.get(achievement_id)
+
+    def get_by_name(self, name):
+        return self.by_name.get(name)
+
+
+def get_catalog():
+    """Return the cached catalog, reloading it if the table changed.
+
+    The table's version is (row count, latest updated_at). It is read at
+    most every ACHIEVEMENT_CATALOG_CHECK_SECONDS, so changes made by other
+    workers show up within that interval; changes made here, right away.
+    """
+    catalog = _catalog
+    interval = float(current_app.config.get('ACHIEVEMENT_CATALOG_CHECK_SECONDS', 5))
+    if catalog is not None and time.monotonic() - _checked_at < interval:
+        return catalog
+    return _reload()
+
+
+def invalidate_catalog():
+    global _checked_at
+    with _lock:
+        _checked_at = 0.0
+
+
+def _table_version():
+    count, updated_at = db.session.query(func.count(Achievement.id), func.max(Achievement.updated_at)).one()
+    return count, updated_at
+
+
+def _reload():
+    global _catalog, _checked_at
+    with _lock:
+        checked_at = time.monotonic()
+        version = _table_version()
+        if _catalog is None or _catalog.version != version:
+            entries = [
+                CatalogEntry(a.id, a.name, a.description, a.points, a.badge_image)
+                for a in Achievement.query.all()
+            ]
+            _catalog = AchievementCatalog(entries, version)
+        _checked_at = checked_at
+        return _catalog
+
+
+@event.listens_for(Achievement, 'after_insert')
+@event.listens_for(Achievement, 'after_update')
+@event.listens_for(Achievement, 'after_delete')
+def _achievement_changed(mapper, connection, target):
+    invalidate_catalog()
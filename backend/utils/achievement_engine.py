@@ -0,0 +1,213 @@
+# backend/utils/achievement_engine.py
+from datetime import timedelta
+from sqlalchemy import func, insert
+from backend.database.models import (
+    UserAchievement, StudySession,
+    UserStudyStats, UserSubjectStats, UserDailyStats, db
+)
+from backend.utils.achievement_catalog import get_catalog
+
+# Achievement rules, evaluated against a user's UserStudyStats row
+ACHIEVEMENT_RULES = {
+    'First Steps':    lambda stats: stats.completed_count >= 1,
+    'Study Streak':   lambda stats: stats.longest_streak >= 3,
+    'Focus Master':   lambda stats: stats.max_daily_sessions >= 5,
+    'Subject Expert': lambda stats: stats.max_subject_sessions >= 10,
+    'Time Wizard':    lambda stats: stats.total_minutes >= 24 * 60,
+}
+
+
+def record_completed_session(session):
+    """Add a session to its user's aggregates.
+
+    Call this *before* flipping the session to completed (or after editing a
+    completed session), so a lazy rebuild of missing stats does not count it twice.
+    """
+    stats = _stats_for(session.user_id)
+    _apply(stats, session.subject, session.duration, session.scheduled_time.date(), 1)
+
+
+def remove_completed_session(session):
+    """Remove a completed session from its user's aggregates.
+
+    Call this *before* the session is marked incomplete, edited or deleted.
+    """
+    stats = _stats_for(session.user_id)
+    _apply(stats, session.subject, session.duration, session.scheduled_time.date(), -1)
+
+
+def get_user_stats(user_id):
+    return _stats_for(user_id)
+
+
+def pending_achievements(user_id):
+    """Return catalog entries the user qualifies for but has not earned yet."""
+    stats = _stats_for(user_id)
+    catalog = get_catalog()
+    candidates = [catalog.get_by_name(name) for name, rule in ACHIEVEMENT_RULES.items() if rule(stats)]
+    candidates = [entry for entry in candidates if entry is not None]
+    if not candidates:
+        return []
+
+    earned = {achievement_id for (achievement_id,) in db.session.query(UserAchievement.achievement_id).filter(
+        UserAchievement.user_id == user_id,
+        UserAchievement.achievement_id.in_([entry.id for entry in candidates])
+    )}
+    return [entry for entry in candidates if entry.id not in earned]
+
+
+def rebuild_stats(user_ids=None):
+    """Rebuild aggregates from StudySession rows; all users when user_ids is None.
+
+    Returns the number of users with stats rows.
+    """
+    completed = [StudySession.completed == True]
+    if user_ids is not None:
+        completed.append(StudySession.user_id.in_(user_ids))
+        for model in (UserStudyStats, UserSubjectStats, UserDailyStats):
+            model.query.filter(model.user_id.in_(user_ids)).delete(synchronize_session=False)
+    else:
+        for model in (UserStudyStats, UserSubjectStats, UserDailyStats):
+            model.query.delete(synchronize_session=False)
+
+    day = func.date(StudySession.scheduled_time, type_=db.Date)
+
+    subject_rows = db.session.query(
+        StudySession.user_id, StudySession.subject, func.count(StudySession.id)
+    ).filter(*completed).group_by(StudySession.user_id, StudySession.subject).all()
+
+    daily_rows = db.session.query(
+        StudySession.user_id, day, func.count(StudySession.id)
+    ).filter(*completed).group_by(StudySession.user_id, day).order_by(StudySession.user_id, day).all()
+
+    totals = db.session.query(
+        StudySession.user_id, func.count(StudySession.id), func.coalesce(func.sum(StudySession.duration), 0)
+    ).filter(*completed).group_by(StudySession.user_id).all()
+
+    if subject_rows:
+        db.session.execute(insert(UserSubjectStats), [
+            {'user_id': user_id, 'subject': subject, 'sessions': count}
+            for user_id, subject, count in subject_rows
+        ])
+    if daily_rows:
+        db.session.execute(insert(UserDailyStats), [
+            {'user_id': user_id, 'day': d, 'sessions': count}
+            for user_id, d, count in daily_rows
+        ])
+
+    days_by_user = {}
+    max_daily = {}
+    for user_id, d, count in daily_rows:
+        days_by_user.setdefault(user_id, []).append(d)
+        max_daily[user_id] = max(max_daily.get(user_id, 0), count)
+
+    max_subject = {}
+    for user_id, _, count in subject_rows:
+        max_subject[user_id] = max(max_subject.get(user_id, 0), count)
+
+    stats_rows = {}
+    for user_id, count, minutes in totals:
+        current, longest, last = _streaks(days_by_user.get(user_id, []))
+        stats_rows[user_id] = {
+            'user_id': user_id,
+            'completed_count': count,
+            'total_minutes': int(minutes),
+            'current_streak': current,
+            'longest_streak': longest,
+            'last_study_date': last,
+            'max_daily_sessions': max_daily.get(user_id, 0),
+            'max_subject_sessions': max_subject.get(user_id, 0),
+        }
+
+    # Users without completed sessions still get an (empty) row so they aren't rebuilt again
+    for user_id in (user_ids or []):
+        stats_rows.setdefault(user_id, {
+            'user_id': user_id, 'completed_count': 0, 'total_minutes': 0,
+            'current_streak': 0, 'longest_streak': 0, 'last_study_date': None,
+            'max_daily_sessions': 0, 'max_subject_sessions': 0,
+        })
+
+    if stats_rows:
+        db.session.execute(insert(UserStudyStats), list(stats_rows.values()))
+    return len(stats_rows)
+
+
+def _stats_for(user_id):
+    stats = UserStudyStats.query.filter_by(user_id=user_id).first()
+    if stats is None:
+        # First touch for this user (e.g. sessions completed before the engine existed)
+        rebuild_stats([user_id])
+        stats = UserStudyStats.query.filter_by(user_id=user_id).first()
+    return stats
+
+
+def _apply(stats, subject, minutes, day, sign):
+    stats.completed_count = max(stats.completed_count + sign, 0)
+    stats.total_minutes = max(stats.total_minutes + sign * minutes, 0)
+
+    subject_stats = UserSubjectStats.query.filter_by(user_id=stats.user_id, subject=subject).first()
+    if subject_stats is None:
+        subject_stats = UserSubjectStats(user_id=stats.user_id, subject=subject, sessions=0)
+        db.session.add(subject_stats)
+    subject_stats.sessions = max(subject_stats.sessions + sign, 0)
+
+    daily_stats = UserDailyStats.query.filter_by(user_id=stats.user_id, day=day).first()
+    if daily_stats is None:
+        daily_stats = UserDailyStats(user_id=stats.user_id, day=day, sessions=0)
+        db.session.add(daily_stats)
+    daily_stats.sessions = max(daily_stats.sessions + sign, 0)
+
+    if sign > 0:
+        stats.max_subject_sessions = max(stats.max_subject_sessions, subject_stats.sessions)
+        stats.max_daily_sessions = max(stats.max_daily_sessions, daily_stats.sessions)
+        if daily_stats.sessions == 1:
+            _extend_streak(stats, day)
+        return
+
+    # Removals are rare (redo/delete/edit), so recompute the derived values from the small tables
+    if subject_stats.sessions == 0:
+        db.session.delete(subject_stats)
+    if daily_stats.sessions == 0:
+        db.session.delete(daily_stats)
+    db.session.flush()
+    stats.max_subject_sessions = db.session.query(
+        func.coalesce(func.max(UserSubjectStats.sessions), 0)
+    ).filter_by(user_id=stats.user_id).scalar()
+    stats.max_daily_sessions = db.session.query(
+        func.coalesce(func.max(UserDailyStats.sessions), 0)
+    ).filter_by(user_id=stats.user_id).scalar()
+    if daily_stats.sessions == 0:
+        _recompute_streaks(stats)
+
+
+def _extend_streak(stats, day):
+    last = stats.last_study_date
+    if last is not None and day < last:
+        # Back-dated session: the new day may bridge two older runs
+        _recompute_streaks(stats)
+        return
+
+    if last is not None and day == last + timedelta(days=1):
+        stats.current_streak += 1
+    else:
+        stats.current_streak = 1
+    stats.last_study_date = day
+    stats.longest_streak = max(stats.longest_streak, stats.current_streak)
+
+
+def _recompute_streaks(stats):
+    days = [d for (d,) in db.session.query(UserDailyStats.day)
+            .filter(UserDailyStats.user_id == stats.user_id, UserDailyStats.sessions > 0)
+            .order_by(UserDailyStats.day).all()]
+    stats.current_streak, stats.longest_streak, stats.last_study_date = _streaks(days)
+
+
+def _streaks(days):
+    """Return (current, longest, last_day) for a sorted list of distinct days."""
+    current = longest = 0
+    previous = None
+    for day in days:
+        current = current + 1 if previous is not None and day - previous == timedelta(days=1) else 1
+        longest = max(longest, current)
+        previous = day
+    return current, longest, previous
@@ -0,0 +1,119 @@
+# backend/utils/coach_context.py
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+from sqlalchemy.orm import Session
+from backend.database.models import UserProfile, db
+
+
+def build_coach_context(profile):
+    """Prompt text describing the student from their onboarding profile ('' if there is nothing to say)."""
+    lines = []
+    if profile.grade_level:
+        lines.append(f"Level: {profile.grade_level}")
+    if profile.study_style:
+        lines.append(f"Study style: {profile.study_style}")
+    if profile.preferred_study_time:
+        lines.append(f"Prefers to study: {profile.preferred_study_time}")
+    subjects = profile.get_subjects()
+    if subjects and isinstance(subjects, list):
+        lines.append(f"Subjects: {', '.join(str(subject) for subject in subjects)}")
+    if profile.goals:
+        lines.append(f"Goals: {profile.goals}")
+    responses = profile.get_quiz_responses()
+    for question, answer in sorted(responses.items() if isinstance(responses, dict) else []):
+        lines.append(f"{question.replace('_', ' ').capitalize()}: {answer}")
+    if not lines:
+        return ''
+    return ("About this student (from onboarding):\n" + '\n'.join(f"- {line}" for line in lines)
+            + "\nTailor your advice to this profile.")
+
+
+def refresh_coach_context(profile):
+    """Rebuild profile.coach_context, bumping context_version if the text changed; returns whether it did."""
+    context = build_coach_context(profile)
+    if context == profile.coach_context:
+        return False
+    profile.coach_context = context
+    profile.context_version = (profile.context_version or 0) + 1
+    return True
+
+
+def _load(user_id):
+    # Own session: the backfill below commits, which must not commit the calling request's pending work
+    with Session(db.session.get_bind()) as session:
+        row = (session.query(UserProfile.id, UserProfile.coach_context, UserProfile.context_version)
+               .filter(UserProfile.user_id == user_id)
+               .first())
+        if row is None:
+            return 0, ''
+        if row.coach_context is None:
+            # Profile saved before contexts were precomputed: build it once and keep it
+            profile = session.get(UserProfile, row.id)
+            refresh_coach_context(profile)
+            version, context = profile.context_version, profile.coach_context
+            session.commit()
+            return version, context
+        return row.context_version, row.coach_context
+
+
+class CoachContextCache:
+    """In-process LRU of user_id -> (context_version, coach context text).
+
+    The worker that changes a profile writes the new version through with
+    put(); other workers pick it up once their entry is `ttl` seconds old.
+    A miss costs one narrow query and no JSON parsing.
+    """
+
+    def __init__(self, max_entries=10000, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[2] > time.monotonic():
+                self._entries.move_to_end(user_id)
+                return entry[1]
+        version, context = _load(user_id)
+        self.put(user_id, version, context)
+        return context
+
+    def put(self, user_id, version, context):
+        now = time.monotonic()
+        with self._lock:
+            current = self._entries.get(user_id)
+            # A slow loader must not replace a newer version written through by the profile update
+            if current is not None and current[0] > version and current[2] > now:
+                return
+            self._entries[user_id] = (version, context, now + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def version(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            return entry[0] if entry is not None else None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = None
+_init_lock = threading.Lock()
+
+
+def get_coach_context_cache():
+    global _cache
+    if _cache is None:
+        with _init_lock:
+            if _cache is None:
+                config = current_app.config
+                _cache = CoachContextCache(int(config.get('COACH_CONTEXT_CACHE_SIZE', 10000)),
+                                           float(config.get('COACH_CONTEXT_TTL', 300)))
+    return _cache
@@ -0,0 +1,163 @@
+# backend/utils/conversation.py
+import re
+import zlib
+from datetime import datetime
+from sqlalchemy import insert, update
+from backend.database.models import ChatThread, ChatTurn, db
+from backend.llm import ANONYMOUS, estimate_tokens, get_gateway, usage_ledger
+
+# Compaction waits until the open turns exceed the window by this factor, then
+# keeps only half a window, so one summary call covers many turns
+COMPACT_AT = 1.5
+KEEP_AFTER_COMPACT = 0.5
+SUMMARY_PREFIX = "Summary of the earlier conversation with this student:\n"
+
+
+def compress(text):
+    return zlib.compress(text.encode('utf-8'), 6)
+
+
+def decompress(blob):
+    return zlib.decompress(blob).decode('utf-8') if blob else ''
+
+
+def extractive_summary(previous, turns, max_tokens):
+    """Summary without a model: the previous summary plus the first sentence of each turn, trimmed to fit."""
+    lines = [previous] if previous else []
+    for role, text in turns:
+        first = re.split(r'(?<=[.!?])\s', text.strip(), maxsplit=1)[0]
+        lines.append(f"{'Student' if role == 'user' else 'Coach'}: {first[:200]}")
+    summary = '\n'.join(lines)
+    max_chars = max_tokens * 4
+    # Drop the oldest material first
+    return summary[-max_chars:] if len(summary) > max_chars else summary
+
+
+class ConversationMemory:
+    """One user's chat thread as seen by a single request.
+
+    Turns are stored zlib-compressed. Prompts carry the thread's running
+    summary plus the turns not yet folded into it; once those exceed
+    `window_tokens` by COMPACT_AT, compact() folds the oldest of them into
+    the summary, keeping the newest half window verbatim.
+    """
+
+    def __init__(self, thread, turns, window_tokens=1500, summary_tokens=300):
+        self.thread = thread
+        self.turns = turns  # [(id, role, text, tokens)] not yet summarized, oldest first
+        self.window_tokens = window_tokens
+        self.summary_tokens = summary_tokens
+        self.summary = decompress(thread.summary)
+
+    @classmethod
+    def load(cls, user_id, thread_id, **options):
+        """Return the user's thread with its open turns, or None if there is no such thread."""
+        thread = ChatThread.query.filter_by(id=thread_id, user_id=user_id).first()
+        if thread is None:
+            return None
+        rows = (db.session.query(ChatTurn.id, ChatTurn.role, ChatTurn.content, ChatTurn.tokens)
+                .filter(ChatTurn.thread_id == thread.id, ChatTurn.summarized.is_(False))
+                .order_by(ChatTurn.id)
+                .all())
+        turns = [(row.id, row.role, decompress(row.content), row.tokens) for row in rows]
+        return cls(thread, turns, **options)
+
+    def prompt(self, system_prompt, user_message):
+        """Messages for the next call: system prompt, summary, the newest turns that fit the window, the new message."""
+        messages = [{"role": "system", "content": system_prompt}]
+        if self.summary:
+            messages.append({"role": "system", "content": SUMMARY_PREFIX + self.summary})
+        recent, used = [], 0
+        for _, role, text, tokens in reversed(self.turns):
+            if used + tokens > self.window_tokens:
+                break
+            recent.append({"role": role, "content": text})
+            used += tokens
+        messages.extend(reversed(recent))
+        messages.append({"role": "user", "content": user_message})
+        return messages
+
+    def add_exchange(self, user_message, answer):
+        """Store the new user/assistant turns; the caller commits."""
+        now = datetime.utcnow()
+        for role, text in (('user', user_message), ('assistant', answer)):
+            tokens = estimate_tokens(text)
+            turn_id = db.session.execute(
+                insert(ChatTurn.__table__).values(thread_id=self.thread.id, role=role, content=compress(text),
+                                                  tokens=tokens, summarized=False, created_at=now)
+            ).inserted_primary_key[0]
+            self.turns.append((turn_id, role, text, tokens))
+        if not self.thread.title:
+            self.thread.title = user_message[:200]
+        self.thread.updated_at = now
+
+    def needs_compaction(self):
+        return sum(turn[3] for turn in self.turns) > self.window_tokens * COMPACT_AT
+
+    def compact(self, summarize=None):
+        """Fold the older open turns into the summary; returns the number of turns folded.
+
+        summarize(previous_summary, [(role, text)], max_tokens) returns the new
+        summary; without one, or if it fails, an extractive summary is used.
+        The caller commits.
+        """
+        if not self.needs_compaction():
+            return 0
+        keep, used = 0, 0
+        for turn in reversed(self.turns):
+            if used + turn[3] > self.window_tokens * KEEP_AFTER_COMPACT:
+                break
+            keep += 1
+            used += turn[3]
+        folded = self.turns[:len(self.turns) - keep]
+        pairs = [(role, text) for _, role, text, _ in folded]
+
+        summary = None
+        if summarize is not None:
+            try:
+                summary = summarize(self.summary, pairs, self.summary_tokens)
+            except Exception as e:
+                print(f"Chat summary failed for thread {self.thread.id}, using extractive summary: {e}")
+        if not summary:
+            summary = extractive_summary(self.summary, pairs, self.summary_tokens)
+
+        db.session.execute(
+            update(ChatTurn.__table__)
+            .where(ChatTurn.__table__.c.id.in_([turn[0] for turn in folded]))
+            .values(summarized=True)
+        )
+        self.thread.summary = compress(summary)
+        self.summary = summary
+        self.turns = self.turns[len(folded):]
+        return len(folded)
+
+    def transcript(self):
+        """Every stored turn of the thread, oldest first."""
+        rows = (db.session.query(ChatTurn.role, ChatTurn.content, ChatTurn.created_at)
+                .filter(ChatTurn.thread_id == self.thread.id)
+                .order_by(ChatTurn.id)
+                .all())
+        return [{'role': row.role, 'content': decompress(row.content), 'created_at': row.created_at.isoformat()}
+                for row in rows]
+
+
+def summarize_with_model(previous, turns, max_tokens, user_id=ANONYMOUS):
+    """Ask the model to fold turns into the running summary, counting the call against user_id's usage."""
+    transcript = '\n'.join(f"{'Student' if role == 'user' else 'Coach'}: {text}" for role, text in turns)
+    response = get_gateway().chat(
+        [
+            {"role": "system", "content": "You maintain compact memory notes for a study coach. Keep facts "
+                                          "about the student, their goals, subjects, difficulties and any "
+                                          "plans agreed. Write terse notes, no preamble."},
+            {"role": "user", "content": f"Current notes:\n{previous or '(none)'}\n\nNew conversation:\n"
+                                        f"{transcript}\n\nReturn the updated notes in under "
+                                        f"{max_tokens * 3 // 4} words."},
+        ],
+        operation='chat_summary',
+        max_tokens=max_tokens,
+        temperature=0.2,
+    )
+    usage = response.usage
+    usage_ledger.record(user_id, 'chat_summary', usage.prompt_tokens if usage else 0,
+                        usage.completion_tokens if usage else 0)
+    return response.choices[0].message.content.strip()
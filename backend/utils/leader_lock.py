@@ -0,0 +1,113 @@
+# backend/utils/leader_lock.py
+import hashlib
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from backend.database.models import SchedulerLock
+
+
+def default_owner():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class AdvisoryLock:
+    """Postgres session-level advisory lock, held on a dedicated connection.
+
+    The lock lives exactly as long as that connection, so a crashed runner
+    releases it without any cleanup. The connection runs in autocommit mode:
+    session-level advisory locks don't need a transaction, and one left open
+    by the keepalive would sit idle in transaction for as long as we lead,
+    holding back vacuum and tripping idle_in_transaction_session_timeout.
+    """
+
+    def __init__(self, engine, name, owner=None):
+        self.engine = engine
+        self.owner = owner or default_owner()
+        # pg_try_advisory_lock takes a signed bigint
+        self.key = int.from_bytes(hashlib.blake2b(name.encode(), digest_size=8).digest(), 'big', signed=True)
+        self._connection = None
+
+    def acquire(self):
+        """Try to become (or confirm we still are) the leader."""
+        if self._connection is not None:
+            try:
+                self._connection.execute(select(1))
+                return True
+            except Exception:
+                self._discard()
+        connection = self.engine.connect().execution_options(isolation_level='AUTOCOMMIT')
+        try:
+            held = connection.execute(select(func.pg_try_advisory_lock(self.key))).scalar()
+        except Exception:
+            connection.close()
+            raise
+        if held:
+            self._connection = connection
+            return True
+        connection.close()
+        return False
+
+    def release(self):
+        if self._connection is not None:
+            try:
+                self._connection.execute(select(func.pg_advisory_unlock(self.key)))
+            finally:
+                self._discard()
+
+    def _discard(self):
+        try:
+            self._connection.close()
+        except Exception:
+            pass
+        self._connection = None
+
+
+class LeaseLock:
+    """Leader lease in the scheduler_lock table, for databases without advisory locks.
+
+    The holder must call acquire() again before `ttl` seconds pass to renew
+    the lease; once it lapses any other runner may take it over.
+    """
+
+    def __init__(self, engine, name, ttl=60, owner=None):
+        self.engine = engine
+        self.name = name
+        self.ttl = ttl
+        self.owner = owner or default_owner()
+
+    def acquire(self):
+        """Take the lease if it is free or expired, or renew it if we hold it."""
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=self.ttl)
+        table = SchedulerLock.__table__
+        with self.engine.begin() as connection:
+            renewed = connection.execute(
+                update(table)
+                .where(table.c.name == self.name)
+                .where((table.c.owner == self.owner) | (table.c.expires_at < now))
+                .values(owner=self.owner, expires_at=expires_at)
+            ).rowcount
+            if renewed:
+                return True
+        try:
+            with self.engine.begin() as connection:
+                connection.execute(insert(table).values(name=self.name, owner=self.owner, expires_at=expires_at))
+            return True
+        except IntegrityError:
+            # Someone else holds an unexpired lease
+            return False
+
+    def release(self):
+        table = SchedulerLock.__table__
+        with self.engine.begin() as connection:
+            connection.execute(delete(table).where(table.c.name == self.name, table.c.owner == self.owner))
+
+
+def leader_lock_for(engine, name, ttl=60):
+    """Advisory lock on Postgres, a lease row everywhere else."""
+    if engine.dialect.name == 'postgresql':
+        return AdvisoryLock(engine, name)
+    return LeaseLock(engine, name, ttl)
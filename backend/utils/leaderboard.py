@@ -0,0 +1,300 @@
+# backend/utils/leaderboard.py
+import random
+import threading
+from flask import current_app
+from sqlalchemy import and_, event, func, literal_column, or_
+from sqlalchemy.orm import Session
+from backend.database.models import UserPoints, db
+
+_MAX_LEVEL = 24  # enough for ~16M entries with p = 0.5
+# Spelled like ix_user_points_ranking (a literal 0, not a bound parameter) so the index matches
+_POINTS = func.coalesce(UserPoints.total_points, literal_column('0'))
+
+
+class _Node:
+    __slots__ = ('key', 'next', 'width')
+
+    def __init__(self, key, level):
+        self.key = key
+        self.next = [None] * level
+        self.width = [1] * level
+
+
+class IndexableSkipList:
+    """Sorted list with O(log n) insert, remove, rank and positional lookup.
+
+    Every forward link also stores how many bottom-level steps it skips, which
+    is what makes rank() and slice() logarithmic.
+    """
+
+    def __init__(self):
+        self.head = _Node(None, _MAX_LEVEL)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def insert(self, key):
+        update = [None] * _MAX_LEVEL
+        steps = [0] * _MAX_LEVEL
+        node, pos = self.head, 0
+        for i in reversed(range(_MAX_LEVEL)):
+            while node.next[i] is not None and node.next[i].key < key:
+                pos += node.width[i]
+                node = node.next[i]
+            update[i], steps[i] = node, pos
+
+        level = 1
+        while level < _MAX_LEVEL and random.random() < 0.5:
+            level += 1
+        new = _Node(key, level)
+        for i in range(_MAX_LEVEL):
+            prev = update[i]
+            if i < level:
+                skipped = pos - steps[i]
+                new.next[i] = prev.next[i]
+                new.width[i] = prev.width[i] - skipped
+                prev.next[i] = new
+                prev.width[i] = skipped + 1
+            else:
+                prev.width[i] += 1
+        self.size += 1
+
+    def remove(self, key):
+        update = [None] * _MAX_LEVEL
+        node = self.head
+        for i in reversed(range(_MAX_LEVEL)):
+            while node.next[i] is not None and node.next[i].key < key:
+                node = node.next[i]
+            update[i] = node
+
+        target = node.next[0]
+        if target is None or target.key != key:
+            raise KeyError(key)
+        for i in range(_MAX_LEVEL):
+            prev = update[i]
+            if prev.next[i] is target:
+                prev.width[i] += target.width[i] - 1
+                prev.next[i] = target.next[i]
+            else:
+                prev.width[i] -= 1
+        self.size -= 1
+
+    def rank(self, key):
+        """0-based position of key, or None if absent."""
+        node, pos = self.head, 0
+        for i in reversed(range(_MAX_LEVEL)):
+            while node.next[i] is not None and node.next[i].key < key:
+                pos += node.width[i]
+                node = node.next[i]
+        candidate = node.next[0]
+        return pos if candidate is not None and candidate.key == key else None
+
+    def slice(self, start, count):
+        """Keys at positions [start, start + count)."""
+        if start < 0 or start >= self.size or count <= 0:
+            return []
+        node, pos, target = self.head, 0, start + 1
+        for i in reversed(range(_MAX_LEVEL)):
+            while node.next[i] is not None and pos + node.width[i] <= target:
+                pos += node.width[i]
+                node = node.next[i]
+
+        keys = []
+        while node is not None and len(keys) < count:
+            keys.append(node.key)
+            node = node.next[0]
+        return keys
+
+
+class SqlLeaderboard:
+    """Leaderboard read straight from user_points, so every worker sees every commit.
+
+    Ranks order by points descending, then user id ascending, like the other
+    stores; ix_user_points_ranking serves both the pages and the rank count.
+    """
+
+    loaded = True
+
+    def update(self, user_id, points):
+        pass  # the row is the leaderboard
+
+    def load(self, scores):
+        pass
+
+    def size(self):
+        return db.session.query(func.count(UserPoints.id)).scalar()
+
+    def score(self, user_id):
+        points = db.session.query(UserPoints.total_points).filter(UserPoints.user_id == user_id).first()
+        return (points[0] or 0) if points is not None else None
+
+    def rank(self, user_id):
+        points = self.score(user_id)
+        if points is None:
+            return None
+        return db.session.query(func.count(UserPoints.id)).filter(or_(
+            _POINTS > points, and_(_POINTS == points, UserPoints.user_id < user_id)
+        )).scalar()
+
+    def range(self, offset, limit):
+        if limit <= 0:
+            return []
+        rows = (db.session.query(UserPoints.user_id, _POINTS)
+                .order_by(_POINTS.desc(), UserPoints.user_id)
+                .offset(offset).limit(limit).all())
+        return [(user_id, points) for user_id, points in rows]
+
+
+class MemoryLeaderboard:
+    """Per-process leaderboard; every worker keeps its own copy.
+
+    Only commits made by this process reach it, so use it where a single
+    process serves the app; with several workers use 'sql' or 'redis'.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._scores = {}
+        self._ranking = IndexableSkipList()
+        self.loaded = False
+
+    def update(self, user_id, points):
+        with self._lock:
+            old = self._scores.get(user_id)
+            if old is not None:
+                self._ranking.remove((-old, user_id))
+            self._scores[user_id] = points
+            self._ranking.insert((-points, user_id))
+
+    def load(self, scores):
+        with self._lock:
+            self._scores = {}
+            self._ranking = IndexableSkipList()
+            for user_id, points in scores:
+                self._scores[user_id] = points
+                self._ranking.insert((-points, user_id))
+            self.loaded = True
+
+    def size(self):
+        return len(self._ranking)
+
+    def score(self, user_id):
+        return self._scores.get(user_id)
+
+    def rank(self, user_id):
+        with self._lock:
+            points = self._scores.get(user_id)
+            if points is None:
+                return None
+            return self._ranking.rank((-points, user_id))
+
+    def range(self, offset, limit):
+        with self._lock:
+            return [(user_id, -neg_points) for neg_points, user_id in self._ranking.slice(offset, limit)]
+
+
+class RedisLeaderboard:
+    """Leaderboard kept in a Redis (or Redis-compatible) sorted set, shared by all workers.
+
+    Scores are negated points and members zero-padded user ids, so the
+    ascending order Redis keeps (ties by member) is points descending, then
+    user id ascending, the same as the other stores.
+    """
+
+    KEY = 'leaderboard:ranking'
+    LOADED_KEY = 'leaderboard:ranking:loaded'
+
+    def __init__(self, url):
+        import redis  # optional dependency, only needed for this backend
+        self._redis = redis.Redis.from_url(url)
+
+    @property
+    def loaded(self):
+        return bool(self._redis.exists(self.LOADED_KEY))
+
+    @staticmethod
+    def _member(user_id):
+        return f'{user_id:012d}'
+
+    def update(self, user_id, points):
+        self._redis.zadd(self.KEY, {self._member(user_id): -points})
+
+    def load(self, scores):
+        pipe = self._redis.pipeline()
+        pipe.delete(self.KEY)
+        batch = {}
+        for user_id, points in scores:
+            batch[self._member(user_id)] = -points
+            if len(batch) >= 10000:
+                pipe.zadd(self.KEY, batch)
+                batch = {}
+        if batch:
+            pipe.zadd(self.KEY, batch)
+        pipe.set(self.LOADED_KEY, 1)
+        pipe.execute()
+
+    def size(self):
+        return self._redis.zcard(self.KEY)
+
+    def score(self, user_id):
+        points = self._redis.zscore(self.KEY, self._member(user_id))
+        return -int(points) if points is not None else None
+
+    def rank(self, user_id):
+        return self._redis.zrank(self.KEY, self._member(user_id))
+
+    def range(self, offset, limit):
+        if limit <= 0:
+            return []
+        rows = self._redis.zrange(self.KEY, offset, offset + limit - 1, withscores=True)
+        return [(int(member), -int(points)) for member, points in rows]
+
+
+_BACKENDS = {
+    'sql': lambda config: SqlLeaderboard(),
+    'memory': lambda config: MemoryLeaderboard(),
+    'redis': lambda config: RedisLeaderboard(config['REDIS_URL']),
+}
+_leaderboard = None
+_init_lock = threading.Lock()
+
+
+def get_leaderboard_store():
+    """Return the configured leaderboard, loading it from the database on first use."""
+    global _leaderboard
+    if _leaderboard is None:
+        with _init_lock:
+            if _leaderboard is None:
+                config = current_app.config
+                _leaderboard = _BACKENDS[config.get('LEADERBOARD_BACKEND', 'sql')](config)
+    if not _leaderboard.loaded:
+        rebuild_leaderboard(_leaderboard)
+    return _leaderboard
+
+
+def rebuild_leaderboard(leaderboard=None):
+    """Reload every user's total from UserPoints; returns the number of entries."""
+    if leaderboard is None:
+        leaderboard = get_leaderboard_store()
+    rows = db.session.query(UserPoints.user_id, UserPoints.total_points).yield_per(10000)
+    leaderboard.load((user_id, points or 0) for user_id, points in rows)
+    return leaderboard.size()
+
+
+def queue_leaderboard_update(user_id, total_points):
+    """Publish a user's new total once the current transaction commits."""
+    db.session.info.setdefault('leaderboard_updates', {})[user_id] = total_points
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_leaderboard_updates(session):
+    updates = session.info.pop('leaderboard_updates', None)
+    if updates and _leaderboard is not None:
+        for user_id, points in updates.items():
+            _leaderboard.update(user_id, points)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_leaderboard_updates(session):
+    session.info.pop('leaderboard_updates', None)
@@ -0,0 +1,226 @@
+# backend/utils/passwords.py
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+SCHEMES = ('scrypt', 'argon2', 'pbkdf2')
+# Never calibrate below these, however slow the machine
+MIN_COST = {'scrypt': (2 ** 14, 8, 1), 'argon2': (2, 19456, 1), 'pbkdf2': (210000,)}
+
+
+class PasswordHasherBusy(Exception):
+    """Too many hashes queued; the caller should ask the client to retry."""
+
+
+def scheme_of(stored):
+    if stored.startswith('$argon2'):
+        return 'argon2'
+    return stored.split(':', 1)[0]
+
+
+def parse_cost(cost):
+    """'32768:8:1' (scrypt n:r:p), '3:65536:1' (argon2 time:memory KiB:parallelism) or '600000' (pbkdf2 iterations)."""
+    return tuple(int(part) for part in str(cost).split(':'))
+
+
+def stored_cost(stored):
+    """Cost parameters a stored hash was made with."""
+    scheme = scheme_of(stored)
+    if scheme == 'argon2':
+        params = dict(item.split('=') for item in stored.split('$')[3].split(','))
+        return int(params['t']), int(params['m']), int(params['p'])
+    method = stored.split('$', 1)[0].split(':')
+    if scheme == 'scrypt':
+        return tuple(int(part) for part in method[1:4]) if len(method) == 4 else (2 ** 15, 8, 1)
+    return (int(method[2]),) if len(method) == 3 else (0,)
+
+
+def work(cost):
+    """Single number ordering costs of one scheme (memory x time)."""
+    product = 1
+    for part in cost:
+        product *= part
+    return product
+
+
+def _argon2(cost):
+    import argon2  # optional dependency, only needed for this scheme
+    time_cost, memory_cost, parallelism = cost
+    return argon2.PasswordHasher(time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism)
+
+
+# Module-level so the process pool can pickle them
+def hash_password(password, scheme, cost):
+    if scheme == 'argon2':
+        return _argon2(cost).hash(password)
+    if scheme == 'scrypt':
+        return generate_password_hash(password, method='scrypt:%d:%d:%d' % cost)
+    return generate_password_hash(password, method='pbkdf2:sha256:%d' % cost)
+
+
+def verify_password(stored, password):
+    if scheme_of(stored) == 'argon2':
+        import argon2
+        try:
+            return argon2.PasswordHasher().verify(stored, password)
+        except argon2.exceptions.VerificationError:
+            return False
+        except argon2.exceptions.InvalidHashError:
+            return False
+    return check_password_hash(stored, password)
+
+
+def verify_and_update(stored, password, scheme, cost):
+    """Check password against stored; returns (ok, new hash if stored is weaker than scheme/cost else None)."""
+    if not verify_password(stored, password):
+        return False, None
+    if needs_rehash(stored, scheme, cost):
+        return True, hash_password(password, scheme, cost)
+    return True, None
+
+
+def needs_rehash(stored, scheme, cost):
+    # Only ever upgrade, so workers calibrated slightly differently don't rehash back and forth
+    if scheme_of(stored) != scheme:
+        return True
+    return work(stored_cost(stored)) < work(cost)
+
+
+def calibrate(scheme, target_seconds):
+    """Largest cost whose hash takes at most target_seconds here (never below MIN_COST)."""
+    def timed(cost):
+        started = time.perf_counter()
+        hash_password('calibration password', scheme, cost)
+        return time.perf_counter() - started
+
+    best = MIN_COST[scheme]
+    if scheme == 'pbkdf2':
+        probe = (100000,)
+        iterations = int(probe[0] * target_seconds / timed(probe))
+        return max(best, (iterations,))
+    if scheme == 'scrypt':
+        n, r, p = best
+        while n < 2 ** 20 and timed((n * 2, r, p)) <= target_seconds:
+            n *= 2
+        return n, r, p
+    time_cost, memory_cost, parallelism = best
+    memory_cost = 65536  # 64 MiB, then spend the rest of the budget on passes
+    while time_cost < 10 and timed((time_cost + 1, memory_cost, parallelism)) <= target_seconds:
+        time_cost += 1
+    return time_cost, memory_cost, parallelism
+
+
+def default_workers(web_workers=1):
+    """Hashing processes for one web worker: the cores shared out between web_workers, at least one."""
+    return max(1, (os.cpu_count() or 1) // max(1, web_workers))
+
+
+class PasswordHasher:
+    """Password hashing off the request threads, on a process pool sized to this worker's share of the cores.
+
+    At most `max_pending` hashes queue at once; beyond that callers wait up
+    to `timeout` seconds and then get PasswordHasherBusy, so a login storm
+    turns into quick 503s instead of every request thread stuck behind the
+    CPU. With workers=0 hashing runs inline; by default every one of the
+    `web_workers` processes gets an equal share of the cores, so the whole
+    server runs about one hashing process per core. Without an explicit
+    `cost` the cost is calibrated to `target_ms` on first use.
+    """
+
+    def __init__(self, scheme='scrypt', cost=None, target_ms=250, workers=None, max_pending=None, timeout=10,
+                 web_workers=1):
+        if scheme not in SCHEMES:
+            raise ValueError(f"Unknown password scheme {scheme!r}; use one of {', '.join(SCHEMES)}")
+        self.scheme = scheme
+        self._cost = parse_cost(cost) if cost else None
+        self.target_ms = target_ms
+        self.workers = default_workers(web_workers) if workers is None else workers
+        self.timeout = timeout
+        self._pending = threading.BoundedSemaphore(max_pending or max(1, self.workers) * 4)
+        self._lock = threading.Lock()
+        self._pool_lock = threading.Lock()
+        self._pool = None
+        self._pool_pid = None
+        self._dummy = None
+
+    @property
+    def cost(self):
+        if self._cost is None:
+            with self._lock:
+                if self._cost is None:
+                    self._cost = self._run(calibrate, self.scheme, self.target_ms / 1000)
+                    print(f"Password hashing: {self.scheme} cost {':'.join(map(str, self._cost))} "
+                          f"(calibrated to {self.target_ms} ms)")
+        return self._cost
+
+    def hash(self, password):
+        return self._run(hash_password, password, self.scheme, self.cost)
+
+    def verify(self, stored, password):
+        """Return (ok, new_hash); new_hash is set when stored should be replaced by a stronger hash."""
+        if not stored:
+            # Spend the same time as a real check so unknown accounts can't be told apart
+            self._run(verify_password, self.dummy_hash(), password)
+            return False, None
+        return self._run(verify_and_update, stored, password, self.scheme, self.cost)
+
+    def dummy_hash(self):
+        if self._dummy is None:
+            self._dummy = self.hash('not a real password')
+        return self._dummy
+
+    def _executor(self):
+        if self._pool is None or self._pool_pid != os.getpid():
+            with self._pool_lock:
+                if self._pool is None or self._pool_pid != os.getpid():
+                    # forkserver: forking a threaded web worker directly is not safe
+                    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context(method))
+                    self._pool_pid = os.getpid()
+        return self._pool
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        if not self._pending.acquire(timeout=self.timeout):
+            raise PasswordHasherBusy("Password hashing queue is full")
+        try:
+            return self._executor().submit(fn, *args).result(timeout=self.timeout)
+        except FutureTimeout:
+            raise PasswordHasherBusy("Password hashing timed out")
+        finally:
+            self._pending.release()
+
+    def shutdown(self):
+        if self._pool is not None and self._pool_pid == os.getpid():
+            self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = None
+
+
+_hasher = None
+_init_lock = threading.Lock()
+
+
+def get_password_hasher():
+    """Return the process-wide hasher configured from PASSWORD_* settings."""
+    global _hasher
+    if _hasher is None:
+        with _init_lock:
+            if _hasher is None:
+                config = current_app.config
+                workers = config.get('PASSWORD_HASH_WORKERS')
+                _hasher = PasswordHasher(
+                    scheme=config.get('PASSWORD_SCHEME', 'scrypt'),
+                    cost=config.get('PASSWORD_COST') or None,
+                    target_ms=float(config.get('PASSWORD_TARGET_MS', 250)),
+                    workers=None if workers in (None, '') else int(workers),
+                    max_pending=int(config.get('PASSWORD_HASH_QUEUE', 0)) or None,
+                    web_workers=int(config.get('WEB_CONCURRENCY', 1)),
+                )
+    return _hasher
@@ -0,0 +1,64 @@
+# backend/utils/point_ledger.py
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import insert
+from backend.database.models import UserPoints, PointTransaction, db
+from backend.database.upsert import upsert
+from backend.utils.leaderboard import queue_leaderboard_update
+
+LedgerResult = namedtuple('LedgerResult', ['total_points', 'level', 'level_up'])
+
+def level_for(total_points):
+    # Simple level system (level = points / 100)
+    return total_points // 100 + 1
+
+
+class PointLedger:
+    """Unit of work for point changes made while handling one request.
+
+    Entries are only queued by add(); apply() writes them inside the current
+    transaction as one atomic increment per user plus one bulk insert of
+    PointTransaction rows. The caller commits.
+    """
+
+    def __init__(self):
+        self.entries = []
+
+    def add(self, user_id, amount, reason=""):
+        self.entries.append({'user_id': user_id, 'amount': amount, 'reason': reason})
+
+    def apply(self):
+        """Write queued entries and return {user_id: LedgerResult}."""
+        if not self.entries:
+            return {}
+
+        deltas = {}
+        for entry in self.entries:
+            deltas[entry['user_id']] = deltas.get(entry['user_id'], 0) + entry['amount']
+
+        results = {}
+        for user_id, delta in deltas.items():
+            total = _increment_points(user_id, delta)
+            queue_leaderboard_update(user_id, total)
+            level = level_for(total)
+            results[user_id] = LedgerResult(total, level, level > level_for(total - delta))
+
+        now = datetime.utcnow()
+        db.session.execute(insert(PointTransaction), [
+            dict(entry, created_at=now) for entry in self.entries
+        ])
+        self.entries = []
+        return results
+
+
+def _increment_points(user_id, delta):
+    """Atomically add delta to the user's total (creating the row if needed) and return the new total."""
+    table = UserPoints.__table__
+    now = datetime.utcnow()
+
+    def add_delta(incoming):
+        new_total = table.c.total_points + incoming['total_points']
+        return {'total_points': new_total, 'level': new_total // 100 + 1, 'updated_at': now}
+
+    row = {'user_id': user_id, 'total_points': delta, 'level': level_for(delta), 'updated_at': now}
+    return upsert(db.session, table, [row], ['user_id'], add_delta, returning=table.c.total_points)[0]
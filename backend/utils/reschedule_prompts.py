@@ -0,0 +1,166 @@
+# backend/utils/reschedule_prompts.py
+import json
+from datetime import datetime
+
+# Rough output cost of one {"session_id": "ISO datetime"} pair in the reply
+TOKENS_PER_SESSION_REPLY = 20
+_PROMPT_RULES = """Please suggest new times for each missed session. Consider:
+1. User's typical study patterns (day of week, time of day)
+2. Don't schedule sessions in the past
+3. Space out multiple sessions reasonably
+4. Try to keep the subject at a similar time of day as past sessions"""
+
+
+class ScheduleParseError(ValueError):
+    """The model's reply is not valid JSON of the expected shape."""
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token for English and JSON)."""
+    return len(text) // 4 + 1
+
+
+def build_reschedule_prompt(pattern_data, sessions_to_reschedule, now):
+    return f"""
+You are an AI study coach helping to reschedule missed study sessions.
+
+User's completed study session patterns:
+{json.dumps(pattern_data)}
+
+Missed study sessions that need rescheduling:
+{json.dumps(sessions_to_reschedule)}
+
+Today's date: {now.strftime('%Y-%m-%d')}
+Current time: {now.strftime('%H:%M')}
+
+{_PROMPT_RULES}
+
+Return a JSON object with session_id as keys and ISO format datetime strings as values.
+Example: {{"1": "2025-04-28T18:00:00", "2": "2025-04-29T10:00:00"}}
+"""
+
+
+def user_section(user_id, pattern_data, sessions_to_reschedule):
+    """One user's entry in a batch prompt."""
+    return {"user_id": user_id, "patterns": pattern_data, "missed_sessions": sessions_to_reschedule}
+
+
+def build_batch_prompt(sections, now):
+    """Prompt covering several users; each user's sessions are planned from that user's patterns only."""
+    return f"""
+You are an AI study coach helping to reschedule missed study sessions for several students.
+Plan each student independently, from that student's own patterns.
+
+Students (one JSON object; each has completed session patterns and missed sessions):
+{json.dumps({"users": sections})}
+
+Today's date: {now.strftime('%Y-%m-%d')}
+Current time: {now.strftime('%H:%M')}
+
+{_PROMPT_RULES}
+
+Return a JSON object keyed by user_id. Each value is an object with session_id as keys
+and ISO format datetime strings as values.
+Example: {{"7": {{"1": "2025-04-28T18:00:00"}}, "9": {{"4": "2025-04-29T10:00:00"}}}}
+"""
+
+
+def section_cost(section):
+    """Estimated prompt plus reply tokens one user adds to a batch."""
+    return estimate_tokens(json.dumps(section)) + TOKENS_PER_SESSION_REPLY * len(section["missed_sessions"])
+
+
+def pack_batches(sections, token_budget, max_users=50, overhead=None):
+    """Greedily pack user sections into batches whose estimated tokens stay within token_budget.
+
+    Sections keep their order. `overhead` is the fixed cost of the prompt
+    around them (instructions, dates); a section that does not fit an empty
+    batch on its own gets a batch to itself.
+    """
+    if overhead is None:
+        overhead = estimate_tokens(build_batch_prompt([], datetime(2000, 1, 1)))
+    batches, current, used = [], [], overhead
+    for section in sections:
+        cost = section_cost(section)
+        if current and (used + cost > token_budget or len(current) >= max_users):
+            batches.append(current)
+            current, used = [], overhead
+        current.append(section)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _parse_times(mapping, allowed_ids, now, where):
+    if not isinstance(mapping, dict):
+        raise ScheduleParseError(f"{where} must be an object of session_id -> datetime")
+    times = {}
+    for key, value in mapping.items():
+        try:
+            session_id = int(key)
+        except (TypeError, ValueError):
+            raise ScheduleParseError(f"{where}: session id {key!r} is not an integer")
+        if not isinstance(value, str):
+            raise ScheduleParseError(f"{where}: time for session {session_id} is not a string")
+        try:
+            new_time = datetime.fromisoformat(value)
+        except ValueError:
+            raise ScheduleParseError(f"{where}: {value!r} is not an ISO datetime")
+        if new_time.tzinfo is not None:
+            # Stored times are naive local; drop the offset after converting
+            new_time = new_time.astimezone().replace(tzinfo=None)
+        # Ignore sessions the model was not asked about and times in the past
+        if allowed_ids is not None and session_id not in allowed_ids:
+            continue
+        if now is not None and new_time <= now:
+            continue
+        times[session_id] = new_time
+    return times
+
+
+def _load_object(content):
+    try:
+        data = json.loads(content)
+    except (TypeError, ValueError) as e:
+        raise ScheduleParseError(f"reply is not valid JSON: {e}")
+    if not isinstance(data, dict):
+        raise ScheduleParseError("reply must be a JSON object")
+    return data
+
+
+def parse_schedule(content, allowed_ids=None, now=None):
+    """Parse a single-user reply into {session_id: datetime}.
+
+    Raises ScheduleParseError if the reply is malformed; entries for other
+    sessions or in the past are dropped.
+    """
+    return _parse_times(_load_object(content), allowed_ids, now, 'reply')
+
+
+def parse_batch_schedule(content, sessions_by_user, now=None, errors=None):
+    """Parse a batch reply into {user_id: {session_id: datetime}}.
+
+    sessions_by_user maps each user in the batch to the session ids it was
+    asked about; sessions can only be moved through their owner's entry.
+    Users missing from the reply are simply absent from the result, and so
+    are users whose entry is malformed: one bad entry only costs that user,
+    not the whole batch. Their errors are added to `errors` ({user_id:
+    message}) when a dict is passed. Raises ScheduleParseError only if the
+    reply as a whole is not a JSON object.
+    """
+    data = _load_object(content)
+    result = {}
+    for key, mapping in data.items():
+        try:
+            user_id = int(key)
+        except (TypeError, ValueError):
+            continue
+        if user_id not in sessions_by_user:
+            continue
+        try:
+            result[user_id] = _parse_times(mapping, sessions_by_user[user_id], now, f"user {user_id}")
+        except ScheduleParseError as e:
+            if errors is not None:
+                errors[user_id] = str(e)
+    return result
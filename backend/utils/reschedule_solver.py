@@ -0,0 +1,102 @@
+# backend/utils/reschedule_solver.py
+from collections import namedtuple
+from datetime import timedelta
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+# times: {session_id: datetime}; confidence: 0..1, how much the plan is backed by the user's history
+SolverPlan = namedtuple('SolverPlan', ['times', 'confidence'])
+
+
+class ReschedulingSolver:
+    """Greedy slot picker driven by the user's own weekday x hour study pattern.
+
+    Each missed session goes to the best free hour in the next `horizon_days`,
+    scored by how often the user completed sessions at that weekday and hour
+    (with the hour-of-day marginal as a fallback for sparse histories). Slots
+    overlapping existing sessions, with `min_gap_minutes` of slack, are
+    skipped; days that already got a session are penalised so multiple
+    sessions spread out, and later days decay slightly so nothing drifts
+    needlessly far.
+    """
+
+    def __init__(self, horizon_days=7, day_start=8, day_end=22, min_gap_minutes=30,
+                 spread_penalty=0.35, day_decay=0.93, confidence_prior=5):
+        self.horizon_days = horizon_days
+        self.day_start = day_start
+        self.day_end = day_end
+        self.min_gap = timedelta(minutes=min_gap_minutes)
+        self.spread_penalty = spread_penalty
+        self.day_decay = day_decay
+        self.confidence_prior = confidence_prior
+
+    def weights(self, history):
+        """7x24 table of slot weights learnt from history dicts ({"weekday", "hour", ...})."""
+        counts = [[0] * 24 for _ in range(7)]
+        hour_counts = [0] * 24
+        for entry in history:
+            weekday = WEEKDAYS.index(entry["weekday"])
+            counts[weekday][entry["hour"]] += 1
+            hour_counts[entry["hour"]] += 1
+
+        table = [[0.0] * 24 for _ in range(7)]
+        for weekday in range(7):
+            for hour in range(24):
+                awake = 1.0 if self.day_start <= hour < self.day_end else 0.0
+                # exact weekday/hour hits count most, then the user's usual hours, then waking hours
+                table[weekday][hour] = counts[weekday][hour] + hour_counts[hour] / 7 + 0.1 * awake
+        return table
+
+    def solve(self, history, missed, busy, now):
+        """Place each missed session ({"id", "duration", ...}) around busy (start, minutes) intervals."""
+        table = self.weights(history)
+        best_weight = max(max(row) for row in table)
+
+        # Work in whole minutes after the first candidate hour; datetimes only for the result
+        start = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        first_day = (start.date() - now.date()).days
+        decay = [self.day_decay ** (first_day + day) for day in range(self.horizon_days + 2)]
+        candidates = []
+        for offset in range(self.horizon_days * 24):
+            day, hour = divmod(start.hour + offset, 24)
+            weight = table[(start.weekday() + day) % 7][hour]
+            if weight > 0:
+                candidates.append((weight * decay[day], weight, offset, day))
+        # Best first, so the scan can stop once no remaining slot can beat the current pick
+        candidates.sort(key=lambda candidate: (-candidate[0], candidate[2]))
+
+        gap = self.min_gap.total_seconds() / 60
+        taken = []
+        for begin, minutes in busy:
+            begin = (begin - start).total_seconds() / 60
+            taken.append((begin - gap, begin + minutes + gap))
+        per_day = {}
+        times, quality = {}, []
+        for session in missed:
+            length = session["duration"] or 0
+            choice, choice_score, choice_weight = None, 0.0, 0.0
+            for score, weight, offset, day in candidates:
+                if score <= choice_score:
+                    break
+                score *= self.spread_penalty ** per_day.get(day, 0)
+                if score <= choice_score:
+                    continue
+                begin, end = offset * 60, offset * 60 + length
+                if any(begin < busy_end and busy_begin < end for busy_begin, busy_end in taken):
+                    continue
+                choice, choice_score, choice_weight = (offset, day), score, weight
+
+            if choice is None:
+                # Fully booked horizon: keep the old behaviour of pushing to tomorrow
+                times[session["id"]] = now + timedelta(days=1)
+                quality.append(0.0)
+                continue
+            offset, day = choice
+            times[session["id"]] = start + timedelta(hours=offset)
+            taken.append((offset * 60 - gap, offset * 60 + length + gap))
+            per_day[day] = per_day.get(day, 0) + 1
+            quality.append(choice_weight / best_weight)
+
+        support = len(history) / (len(history) + self.confidence_prior)
+        confidence = support * (sum(quality) / len(quality)) if quality else 0.0
+        return SolverPlan(times, confidence)
@@ -0,0 +1,345 @@
+# backend/utils/response_cache.py
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from flask import current_app
+
+_NUM_PERM = 64
+_BANDS = 16  # 16 bands x 4 rows: candidates from roughly 0.5 Jaccard upward
+_ROWS = _NUM_PERM // _BANDS
+_PRIME = (1 << 61) - 1
+_SHINGLE = 3
+
+
+def _permutations():
+    # Fixed coefficients so signatures agree across workers and restarts
+    coefficients = []
+    for i in range(_NUM_PERM):
+        digest = hashlib.blake2b(f'minhash-{i}'.encode(), digest_size=16).digest()
+        a = int.from_bytes(digest[:8], 'big') % (_PRIME - 1) + 1
+        b = int.from_bytes(digest[8:], 'big') % _PRIME
+        coefficients.append((a, b))
+    return coefficients
+
+
+_PERMUTATIONS = _permutations()
+
+
+def normalize(text):
+    """Lowercase, drop punctuation and collapse whitespace."""
+    return ' '.join(re.sub(r"[^\w\s]", ' ', (text or '').lower()).split())
+
+
+def canonical(text):
+    """Lowercase and collapse whitespace; punctuation is kept because it can change the question."""
+    return ' '.join((text or '').lower().split())
+
+
+def cache_key(system_prompt, message):
+    raw = canonical(system_prompt) + '\x00' + canonical(message)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def minhash(text):
+    """MinHash signature over character shingles of already-normalized text."""
+    if len(text) <= _SHINGLE:
+        shingles = {text}
+    else:
+        shingles = {text[i:i + _SHINGLE] for i in range(len(text) - _SHINGLE + 1)}
+    hashed = [int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), 'big') for s in shingles]
+    return [min((a * h + b) % _PRIME for h in hashed) for a, b in _PERMUTATIONS]
+
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / _NUM_PERM
+
+
+def band_keys(scope, signature):
+    """LSH bucket ids; scope keeps different system prompts from ever matching."""
+    return [
+        hashlib.sha1(f'{scope}:{i}:{signature[i * _ROWS:(i + 1) * _ROWS]}'.encode()).hexdigest()
+        for i in range(_BANDS)
+    ]
+
+
+class MemoryCacheStore:
+    """Per-process LRU store with TTL; every worker keeps its own copy.
+
+    Expired entries are dropped, bands included, when they are next read,
+    met as near-duplicate candidates, or reach the LRU end on a put.
+    """
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bands = defaultdict(set)
+        self._counters = defaultdict(int)
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            for band in entry['bands']:
+                bucket = self._bands.get(band)
+                if bucket is not None:
+                    bucket.discard(key)
+                    if not bucket:
+                        del self._bands[band]
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry['expires_at'] <= time.time():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            entry['hits'] += 1
+            return dict(entry)
+
+    def put(self, key, entry, bands):
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = dict(entry, bands=bands, hits=0, expires_at=time.time() + self.ttl)
+            for band in bands:
+                self._bands[band].add(key)
+            now = time.time()
+            while self._entries:
+                oldest = next(iter(self._entries))
+                if len(self._entries) <= self.max_entries and self._entries[oldest]['expires_at'] > now:
+                    break
+                self._drop(oldest)
+
+    def candidates(self, bands):
+        with self._lock:
+            keys = set()
+            for band in bands:
+                keys.update(self._bands.get(band, ()))
+            now = time.time()
+            found = []
+            for key in keys:
+                entry = self._entries[key]
+                if entry['expires_at'] <= now:
+                    self._drop(key)
+                else:
+                    found.append((key, entry['signature']))
+            return found
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def counters(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def size(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bands.clear()
+            self._counters.clear()
+
+
+class RedisCacheStore:
+    """Cache kept in Redis and shared by all workers; LRU order lives in a sorted set.
+
+    Each entry remembers its bands, so evicting it also removes it from
+    them; expired entries are removed from the bands they are found in.
+    """
+
+    PREFIX = 'chatcache:'
+
+    def __init__(self, url, max_entries, ttl):
+        import redis  # optional dependency, only needed for this backend
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+    def _key(self, *parts):
+        return self.PREFIX + ':'.join(parts)
+
+    def get(self, key):
+        pipe = self._redis.pipeline()
+        pipe.hgetall(self._key('entry', key))
+        pipe.hincrby(self._key('entry', key), 'hits', 1)
+        raw, hits = pipe.execute()
+        if not raw:
+            # hincrby recreated an expired key; remove it again
+            self._redis.delete(self._key('entry', key))
+            self._redis.zrem(self._key('lru'), key)
+            return None
+        self._redis.zadd(self._key('lru'), {key: time.time()})
+        return {
+            'response': raw['response'],
+            'tokens': int(raw.get('tokens', 0)),
+            'signature': json.loads(raw['signature']) if raw.get('signature') else None,
+            'hits': hits,
+        }
+
+    def put(self, key, entry, bands):
+        entry_key = self._key('entry', key)
+        pipe = self._redis.pipeline()
+        pipe.delete(entry_key)
+        pipe.hset(entry_key, mapping={
+            'response': entry['response'],
+            'tokens': entry['tokens'],
+            'signature': json.dumps(entry['signature']) if entry['signature'] else '',
+            'bands': json.dumps(bands),
+            'hits': 0,
+        })
+        pipe.expire(entry_key, self.ttl)
+        for band in bands:
+            pipe.sadd(self._key('band', band), key)
+            pipe.expire(self._key('band', band), self.ttl)
+        pipe.zadd(self._key('lru'), {key: time.time()})
+        pipe.zcard(self._key('lru'))
+        size = pipe.execute()[-1]
+        if size > self.max_entries:
+            evicted = [member for member, _ in self._redis.zpopmin(self._key('lru'), size - self.max_entries)]
+            if evicted:
+                pipe = self._redis.pipeline()
+                for k in evicted:
+                    pipe.hget(self._key('entry', k), 'bands')
+                evicted_bands = pipe.execute()
+                pipe = self._redis.pipeline()
+                for k, raw_bands in zip(evicted, evicted_bands):
+                    for band in json.loads(raw_bands) if raw_bands else ():
+                        pipe.srem(self._key('band', band), k)
+                pipe.delete(*[self._key('entry', k) for k in evicted])
+                pipe.execute()
+
+    def candidates(self, bands):
+        band_keys = [self._key('band', band) for band in bands]
+        keys = self._redis.sunion(band_keys)
+        if not keys:
+            return []
+        keys = list(keys)
+        pipe = self._redis.pipeline()
+        for key in keys:
+            pipe.hget(self._key('entry', key), 'signature')
+        signatures = pipe.execute()
+        expired = [key for key, sig in zip(keys, signatures) if sig is None]
+        if expired:
+            pipe = self._redis.pipeline()
+            for band_key in band_keys:
+                pipe.srem(band_key, *expired)
+            pipe.zrem(self._key('lru'), *expired)
+            pipe.execute()
+        return [(key, json.loads(sig)) for key, sig in zip(keys, signatures) if sig]
+
+    def incr(self, name, amount=1):
+        self._redis.hincrby(self._key('stats'), name, amount)
+
+    def counters(self):
+        return {name: int(value) for name, value in self._redis.hgetall(self._key('stats')).items()}
+
+    def size(self):
+        return self._redis.zcard(self._key('lru'))
+
+    def clear(self):
+        keys = list(self._redis.scan_iter(self.PREFIX + '*'))
+        if keys:
+            self._redis.delete(*keys)
+
+
+class ResponseCache:
+    """Chat response cache keyed on the normalized (system prompt, message) pair.
+
+    Exact matches are a single hash lookup. With near_duplicates on, misses
+    fall through to a MinHash/LSH lookup among entries for the same system
+    prompt and accept the closest one at or above `threshold` similarity.
+    """
+
+    def __init__(self, store, near_duplicates=False, threshold=0.9):
+        self.store = store
+        self.near_duplicates = near_duplicates
+        self.threshold = threshold
+
+    def lookup(self, system_prompt, message):
+        """Return (response, 'hit'|'near') or (None, 'miss'), updating the stats."""
+        key = cache_key(system_prompt, message)
+        entry = self.store.get(key)
+        kind = 'hit'
+
+        if entry is None and self.near_duplicates:
+            signature = minhash(normalize(message))
+            scope = cache_key(system_prompt, '')
+            best_key, best_score = None, self.threshold
+            for candidate, candidate_sig in self.store.candidates(band_keys(scope, signature)):
+                score = similarity(signature, candidate_sig)
+                if score >= best_score:
+                    best_key, best_score = candidate, score
+            if best_key is not None:
+                entry = self.store.get(best_key)
+                kind = 'near'
+
+        if entry is None:
+            self.store.incr('misses')
+            return None, 'miss'
+        self.store.incr('hits' if kind == 'hit' else 'near_hits')
+        self.store.incr('tokens_saved', entry['tokens'])
+        return entry['response'], kind
+
+    def store_response(self, system_prompt, message, response, tokens=0):
+        signature, bands = None, []
+        if self.near_duplicates:
+            signature = minhash(normalize(message))
+            bands = band_keys(cache_key(system_prompt, ''), signature)
+        self.store.put(
+            cache_key(system_prompt, message),
+            {'response': response, 'tokens': tokens or 0, 'signature': signature},
+            bands,
+        )
+
+    def stats(self):
+        counters = self.store.counters()
+        hits, near_hits, misses = (counters.get(name, 0) for name in ('hits', 'near_hits', 'misses'))
+        lookups = hits + near_hits + misses
+        return {
+            'entries': self.store.size(),
+            'hits': hits,
+            'near_hits': near_hits,
+            'misses': misses,
+            'hit_rate': round((hits + near_hits) / lookups, 4) if lookups else 0.0,
+            'tokens_saved': counters.get('tokens_saved', 0),
+        }
+
+    def clear(self):
+        self.store.clear()
+
+
+_STORES = {
+    'memory': lambda config, size, ttl: MemoryCacheStore(size, ttl),
+    'redis': lambda config, size, ttl: RedisCacheStore(config['REDIS_URL'], size, ttl),
+}
+_cache = None
+_init_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Return the configured chat response cache, or None when caching is disabled."""
+    global _cache
+    config = current_app.config
+    backend = config.get('CHAT_CACHE_BACKEND', 'memory')
+    if backend == 'none':
+        return None
+    if _cache is None:
+        with _init_lock:
+            if _cache is None:
+                size = int(config.get('CHAT_CACHE_MAX_ENTRIES', 5000))
+                ttl = int(config.get('CHAT_CACHE_TTL', 86400))
+                _cache = ResponseCache(
+                    _STORES[backend](config, size, ttl),
+                    near_duplicates=config.get('CHAT_CACHE_NEAR_DUPLICATES', False),
+                    threshold=float(config.get('CHAT_CACHE_SIMILARITY', 0.9)),
+                )
+    return _cache
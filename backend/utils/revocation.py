@@ -0,0 +1,146 @@
+# backend/utils/revocation.py
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timezone
+from flask import current_app
+from backend.database.models import RevokedToken, db
+
+# Full reloads also catch rows whose ids were assigned before, but committed after, an incremental read
+REBUILD_SECONDS = 300
+
+
+def user_key(user_id):
+    """Revocation key that cuts off every token issued to user_id up to the revocation."""
+    return f"user:{user_id}"
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings: no false negatives, about `error_rate` false positives at capacity."""
+
+    def __init__(self, capacity=100000, error_rate=0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class RevocationList:
+    """Revoked token ids (jti) and user cut-offs, kept in revoked_token and mirrored in a Bloom filter.
+
+    Almost every token is not revoked, and for those is_revoked() is a few
+    hash probes in memory. Only Bloom hits (revoked tokens and the rare
+    false positive) are confirmed against the table. Each worker picks up
+    revocations made elsewhere every `sync_interval` seconds by reading the
+    rows added since its last look, and rebuilds the filter without expired
+    entries every REBUILD_SECONDS or once it fills up.
+    """
+
+    def __init__(self, capacity=100000, error_rate=0.001, sync_interval=5):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._bloom = None
+        self._last_id = 0
+        self._synced_at = 0.0
+        self._built_at = 0.0
+
+    def revoke(self, key, expires_at):
+        """Record a revocation (the caller commits); it can be forgotten after expires_at."""
+        db.session.add(RevokedToken(key=key, expires_at=expires_at, revoked_at=datetime.utcnow()))
+        with self._lock:
+            if self._bloom is not None:
+                self._bloom.add(key)
+
+    def is_revoked(self, claims):
+        """Whether an access token with these claims was revoked, by its jti or by a cut-off for its user."""
+        self.sync()
+        jti = claims.get('jti')
+        if jti and jti in self._bloom and self._confirm(jti) is not None:
+            return True
+        key = user_key(claims.get('user_id'))
+        if key in self._bloom:
+            revoked_at = self._confirm(key)
+            issued_at = claims.get('iat', 0)
+            return revoked_at is not None and issued_at <= revoked_at.replace(tzinfo=timezone.utc).timestamp()
+        return False
+
+    def _confirm(self, key):
+        row = (db.session.query(RevokedToken.revoked_at)
+               .filter(RevokedToken.key == key, RevokedToken.expires_at > datetime.utcnow())
+               .order_by(RevokedToken.revoked_at.desc())
+               .first())
+        return row.revoked_at if row is not None else None
+
+    def sync(self, force=False):
+        now = time.monotonic()
+        if not force and self._bloom is not None and now - self._synced_at < self.sync_interval:
+            return
+        with self._lock:
+            if not force and self._bloom is not None and now - self._synced_at < self.sync_interval:
+                return
+            if (self._bloom is None or self._bloom.count >= self._bloom.capacity
+                    or now - self._built_at >= REBUILD_SECONDS):
+                self._rebuild(now)
+            else:
+                rows = (db.session.query(RevokedToken.id, RevokedToken.key)
+                        .filter(RevokedToken.id > self._last_id)
+                        .order_by(RevokedToken.id)
+                        .all())
+                for row in rows:
+                    self._bloom.add(row.key)
+                    self._last_id = row.id
+            self._synced_at = now
+
+    def _rebuild(self, now):
+        rows = (db.session.query(RevokedToken.id, RevokedToken.key)
+                .filter(RevokedToken.expires_at > datetime.utcnow())
+                .order_by(RevokedToken.id)
+                .all())
+        bloom = BloomFilter(max(self.capacity, len(rows) * 2), self.error_rate)
+        for row in rows:
+            bloom.add(row.key)
+        self._last_id = max(self._last_id, rows[-1].id if rows else 0)
+        self._bloom = bloom
+        self._built_at = now
+
+    def clear(self):
+        with self._lock:
+            self._bloom = None
+            self._last_id = 0
+            self._synced_at = 0.0
+            self._built_at = 0.0
+
+
+_revocations = None
+_init_lock = threading.Lock()
+
+
+def get_revocation_list():
+    global _revocations
+    if _revocations is None:
+        with _init_lock:
+            if _revocations is None:
+                config = current_app.config
+                _revocations = RevocationList(int(config.get('REVOCATION_BLOOM_CAPACITY', 100000)),
+                                              float(config.get('REVOCATION_BLOOM_ERROR_RATE', 0.001)),
+                                              float(config.get('REVOCATION_SYNC_SECONDS', 5)))
+    return _revocations
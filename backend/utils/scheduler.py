@@ -1,141 +1,591 @@
 # backend/utils/scheduler.py
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 from apscheduler.schedulers.background import BackgroundScheduler
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
-from backend.database.models import StudySession, User, db
-import openai
-import os
+from sqlalchemy import bindparam, func, or_, update
+from backend.database.models import StudySession, JobWatermark, SessionRescheduleState, db
+from backend.database.upsert import upsert
+from backend.llm import ANONYMOUS, get_gateway, usage_ledger
+from backend.utils.leader_lock import leader_lock_for
+from backend.utils.reschedule_prompts import (
+    build_batch_prompt, build_reschedule_prompt, pack_batches, parse_batch_schedule, parse_schedule, user_section
+)
+from backend.utils.reschedule_solver import ReschedulingSolver
+from backend.utils.tokens import prune_expired_tokens
+import threading
+import time
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-# Ensure API Key is correctly loaded
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-openai_client = openai.Client(api_key=OPENAI_API_KEY)
+HISTORY_SIZE = 10  # completed sessions per user shown to the model
+SOLVER_HISTORY_SIZE = 50  # completed sessions per user the local solver learns from
+_ID_CHUNK = 500  # keep IN (...) lists well under driver parameter limits
+RESCHEDULE_JOB = 'reschedule_missed_sessions'
+# Start of the last run on the UTC clock, for updated_at (RESCHEDULE_JOB is local time, like scheduled_time)
+RESCHEDULE_CHANGES_JOB = 'reschedule_missed_sessions:changes'
+RESCHEDULE_DEADLINE = 120  # seconds per model request, retries included; batch replies are long
+# A session's state row marks it claimed while its batch is planned; older claims are from a run that died
+RESCHEDULE_CLAIMED = 'claimed'
+RESCHEDULE_CLAIM_TTL = timedelta(minutes=30)
+
 
 def send_study_reminder():
     print(f"[Reminder] Time to study! - {datetime.now()}")
 
-def ai_reschedule_missed_sessions(app):
-    """Use AI to intelligently reschedule missed study sessions based on user patterns"""
-    with app.app_context():
-        # Find all missed sessions
-        now = datetime.now()
-        missed_sessions = StudySession.query.filter(
-            StudySession.scheduled_time < now, 
-            StudySession.completed == False
-        ).all()
-        
-        # Group sessions by user for personalized rescheduling
-        user_sessions = {}
-        for session in missed_sessions:
-            if session.user_id not in user_sessions:
-                user_sessions[session.user_id] = []
-            user_sessions[session.user_id].append(session)
-        
-        # Process each user's sessions
+
+class RateLimiter:
+    """Spaces calls at least 1/rate seconds apart across all threads."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class RescheduleReport:
+    """Outcome of one rescheduling run."""
+
+    def __init__(self):
+        self.users = 0
+        self.sessions = 0
+        self.solver_rescheduled = 0
+        self.ai_rescheduled = 0
+        self.fallback_rescheduled = 0
+        self.failures = 0
+        self.changed = 0
+        self.retries = 0
+        self.requests = 0
+        self.latencies = []
+        self.elapsed = 0.0
+
+    @property
+    def throughput(self):
+        return self.users / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, pct):
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+    def as_dict(self):
+        return {
+            'users': self.users,
+            'sessions': self.sessions,
+            'solver_rescheduled': self.solver_rescheduled,
+            'ai_rescheduled': self.ai_rescheduled,
+            'fallback_rescheduled': self.fallback_rescheduled,
+            'failures': self.failures,
+            'changed_meanwhile': self.changed,
+            'model_requests': self.requests,
+            'retries': self.retries,
+            'elapsed_seconds': round(self.elapsed, 3),
+            'users_per_second': round(self.throughput, 2),
+            'p50_latency_seconds': round(self.percentile(50), 3),
+            'p95_latency_seconds': round(self.percentile(95), 3),
+        }
+
+    def __str__(self):
+        return ', '.join(f'{key}={value}' for key, value in self.as_dict().items())
+
+
+def claim_missed_sessions(now, since=None, after_id=0, limit=None, max_attempts=None, changed_since=None, floor=None):
+    """Sessions that became overdue in [since, now), in id order.
+
+    With changed_since, sessions created or edited since then (UTC, like
+    updated_at) that are overdue but scheduled before `since` count too, as
+    long as they are scheduled after `floor`. Sessions already claimed
+    max_attempts times, or claimed by a run still within RESCHEDULE_CLAIM_TTL,
+    are left alone. Rows are locked FOR UPDATE SKIP LOCKED where the
+    database supports it, so concurrent runners split the work instead of
+    racing on it; the caller marks them claimed and commits straight away,
+    so the locks are never held across model calls.
+    """
+    query = db.session.query(
+        StudySession.id, StudySession.user_id, StudySession.subject,
+        StudySession.duration, StudySession.scheduled_time
+    ).filter(
+        StudySession.scheduled_time < now,
+        StudySession.completed == False,
+        StudySession.id > after_id
+    )
+    if floor is not None:
+        query = query.filter(StudySession.scheduled_time >= floor)
+    if since is not None and changed_since is not None:
+        query = query.filter(or_(StudySession.scheduled_time >= since, StudySession.updated_at >= changed_since))
+    elif since is not None:
+        query = query.filter(StudySession.scheduled_time >= since)
+    state = SessionRescheduleState
+    query = query.outerjoin(state, state.session_id == StudySession.id).filter(or_(
+        state.last_outcome == None,
+        state.last_outcome != RESCHEDULE_CLAIMED,
+        state.last_rescheduled_at < now - RESCHEDULE_CLAIM_TTL
+    ))
+    if max_attempts:
+        query = query.filter(or_(state.attempts == None, state.attempts < max_attempts))
+    query = query.order_by(StudySession.id)
+    if limit:
+        query = query.limit(limit)
+    return query.with_for_update(skip_locked=True, of=StudySession).all()
+
+
+def group_by_user(rows):
+    """Missed session rows grouped by user, as plain dicts so worker threads never touch the ORM."""
+    user_sessions = {}
+    for row in rows:
+        user_sessions.setdefault(row.user_id, []).append({
+            "id": row.id,
+            "subject": row.subject,
+            "duration": row.duration,
+            "original_time": row.scheduled_time.isoformat()
+        })
+    return user_sessions
+
+
+def fetch_study_history(user_ids, limit=HISTORY_SIZE):
+    """Each user's last `limit` completed sessions, fetched with one windowed query per id chunk."""
+    history = {user_id: [] for user_id in user_ids}
+    user_ids = list(user_ids)
+    for start in range(0, len(user_ids), _ID_CHUNK):
+        chunk = user_ids[start:start + _ID_CHUNK]
+        ranked = db.session.query(
+            StudySession.user_id, StudySession.subject, StudySession.duration, StudySession.scheduled_time,
+            func.row_number().over(
+                partition_by=StudySession.user_id,
+                order_by=StudySession.scheduled_time.desc()
+            ).label('position')
+        ).filter(
+            StudySession.user_id.in_(chunk),
+            StudySession.completed == True
+        ).subquery()
+
+        rows = db.session.query(ranked).filter(ranked.c.position <= limit).order_by(ranked.c.user_id, ranked.c.position)
+        for row in rows:
+            history[row.user_id].append({
+                "weekday": row.scheduled_time.strftime("%A"),
+                "hour": row.scheduled_time.hour,
+                "subject": row.subject,
+                "duration": row.duration
+            })
+    return history
+
+
+def fetch_busy_intervals(user_ids, start, end):
+    """Upcoming (scheduled_time, duration) per user between start and end, so new times avoid them."""
+    busy = {user_id: [] for user_id in user_ids}
+    user_ids = list(user_ids)
+    for offset in range(0, len(user_ids), _ID_CHUNK):
+        rows = db.session.query(
+            StudySession.user_id, StudySession.scheduled_time, StudySession.duration
+        ).filter(
+            StudySession.user_id.in_(user_ids[offset:offset + _ID_CHUNK]),
+            StudySession.scheduled_time >= start,
+            StudySession.scheduled_time < end
+        )
+        for row in rows:
+            busy[row.user_id].append((row.scheduled_time, row.duration or 0))
+    return busy
+
+
+def request_json(prompt, limiter, max_retries=3):
+    """Send one JSON-mode completion through the LLM gateway; returns (content, retries)."""
+    retries = []
+    limiter.wait()
+    response = get_gateway().chat(
+        [
+            {"role": "system", "content": "You are a helpful study schedule assistant."},
+            {"role": "user", "content": prompt}
+        ],
+        operation='reschedule',
+        deadline=RESCHEDULE_DEADLINE,
+        max_retries=max_retries,
+        on_retry=lambda: retries.append(1),
+        response_format={"type": "json_object"}
+    )
+    usage = response.usage
+    usage_ledger.record(ANONYMOUS, 'reschedule', usage.prompt_tokens if usage else 0,
+                        usage.completion_tokens if usage else 0)
+    return response.choices[0].message.content, len(retries)
+
+
+def suggest_schedule(pattern_data, sessions_to_reschedule, now, limiter, max_retries=3):
+    """Ask the model for one user's new times; returns ({session_id: datetime}, retries). Runs on a worker thread."""
+    prompt = build_reschedule_prompt(pattern_data, sessions_to_reschedule, now)
+    content, retries = request_json(prompt, limiter, max_retries)
+    allowed = {s["id"] for s in sessions_to_reschedule}
+    return parse_schedule(content, allowed, now), retries
+
+
+def suggest_batch_schedule(sections, now, limiter, max_retries=3):
+    """Ask the model for several users' new times in one request; returns ({user_id: {session_id: datetime}}, retries)."""
+    content, retries = request_json(build_batch_prompt(sections, now), limiter, max_retries)
+    sessions_by_user = {section["user_id"]: {s["id"] for s in section["missed_sessions"]} for section in sections}
+    errors = {}
+    schedules = parse_batch_schedule(content, sessions_by_user, now, errors)
+    for user_id, error in errors.items():
+        print(f"AI rescheduling reply unusable for user {user_id}: {error}")
+    return schedules, retries
+
+
+def get_watermarks(*names):
+    """{name: value} for the watermarks that exist, in one query."""
+    return dict(db.session.query(JobWatermark.name, JobWatermark.value).filter(JobWatermark.name.in_(names)).all())
+
+
+def set_watermark(name, value):
+    table = JobWatermark.__table__
+    row = {'name': name, 'value': value, 'updated_at': datetime.utcnow()}
+    upsert(db.session, table, [row], ['name'],
+           lambda incoming: {'value': incoming['value'], 'updated_at': incoming['updated_at']})
+
+
+def record_reschedule_attempts(outcomes, now):
+    """Bump attempts and stamp last_rescheduled_at for {session_id: outcome}, in the current transaction.
+
+    The pipeline calls this with RESCHEDULE_CLAIMED as it claims sessions,
+    and settles the real outcome with record_reschedule_outcomes().
+    """
+    if not outcomes:
+        return
+    table = SessionRescheduleState.__table__
+    rows = [{'session_id': session_id, 'attempts': 1, 'last_rescheduled_at': now, 'last_outcome': outcome}
+            for session_id, outcome in outcomes.items()]
+    upsert(db.session, table, rows, ['session_id'], lambda incoming: {
+        'attempts': table.c.attempts + 1,
+        'last_rescheduled_at': incoming['last_rescheduled_at'],
+        'last_outcome': incoming['last_outcome'],
+    })
+
+
+def record_reschedule_outcomes(outcomes):
+    """Set last_outcome for {session_id: outcome} on existing state rows, in the current transaction."""
+    if not outcomes:
+        return
+    table = SessionRescheduleState.__table__
+    db.session.execute(
+        update(table).where(table.c.session_id == bindparam('b_session_id')).values(last_outcome=bindparam('b_outcome')),
+        [{'b_session_id': session_id, 'b_outcome': outcome} for session_id, outcome in outcomes.items()]
+    )
+
+
+def write_reschedules(rows, updates, outcomes):
+    """Apply a planned batch to the sessions the user has not moved or completed since they were claimed.
+
+    The claimed rows are locked again only for this write, so a user editing
+    a session while its batch waits on the model is never blocked by the job.
+    Returns {session_id: outcome} for every claimed row.
+    """
+    claimed_at = {row.id: row.scheduled_time for row in rows}
+    current = (db.session.query(StudySession.id, StudySession.scheduled_time)
+               .filter(StudySession.id.in_(list(claimed_at)), StudySession.completed == False)
+               .with_for_update(of=StudySession))
+    unchanged = {session_id for session_id, scheduled_time in current if scheduled_time == claimed_at[session_id]}
+    updates = [row for row in updates if row['id'] in unchanged]
+    if updates:
+        db.session.execute(update(StudySession), updates)
+    return {session_id: outcomes.get(session_id, 'unplanned') if session_id in unchanged else 'changed'
+            for session_id in claimed_at}
+
+
+class ReschedulePipeline:
+    """One rescheduling run over every missed session.
+
+    Sessions that became overdue since `since` (and have not used up
+    RESCHEDULE_MAX_ATTEMPTS) are claimed in batches of RESCHEDULE_COMMIT_BATCH. For
+    each batch the history and upcoming sessions of the affected users are
+    prefetched, every user is planned by the local ReschedulingSolver, and
+    plans with confidence below RESCHEDULE_SOLVER_CONFIDENCE go to the model
+    over a bounded thread pool (RESCHEDULE_WORKERS, RESCHEDULE_RATE_LIMIT
+    requests per second) with the solver's plan as the fallback. With a
+    RESCHEDULE_PROMPT_TOKEN_BUDGET those users are packed several to a
+    prompt; 0 sends one prompt per user. A batch is claimed by bumping its
+    SessionRescheduleState rows and committing, which releases the row
+    locks before any model call; its new times are then written back, skipping
+    sessions the user changed meanwhile, and committed with their outcomes.
+    """
+
+    def __init__(self, config):
+        self.workers = int(config.get('RESCHEDULE_WORKERS', 8))
+        self.limiter = RateLimiter(float(config.get('RESCHEDULE_RATE_LIMIT', 5)))
+        self.max_retries = int(config.get('RESCHEDULE_MAX_RETRIES', 3))
+        self.batch_size = int(config.get('RESCHEDULE_COMMIT_BATCH', 200))
+        self.use_llm = config.get('RESCHEDULE_USE_LLM', True)
+        self.min_confidence = float(config.get('RESCHEDULE_SOLVER_CONFIDENCE', 0.6))
+        self.max_attempts = int(config.get('RESCHEDULE_MAX_ATTEMPTS', 3))
+        self.token_budget = int(config.get('RESCHEDULE_PROMPT_TOKEN_BUDGET', 8000))
+        self.max_prompt_users = int(config.get('RESCHEDULE_PROMPT_MAX_USERS', 50))
+        self.solver = ReschedulingSolver()
+        self.report = RescheduleReport()
+
+    def run(self, now=None, since=None, changed_since=None, floor=None):
+        """Reschedule what claim_missed_sessions(now, since, changed_since=..., floor=...) returns."""
+        now = now or datetime.now()
+        started = time.monotonic()
+        after_id = 0
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='reschedule') as pool:
+            while True:
+                rows = claim_missed_sessions(now, since, after_id, self.batch_size, self.max_attempts,
+                                             changed_since, floor)
+                if not rows:
+                    break
+                after_id = rows[-1].id
+                record_reschedule_attempts(dict.fromkeys((row.id for row in rows), RESCHEDULE_CLAIMED), now)
+                db.session.commit()
+                updates, outcomes = self.plan_batch(group_by_user(rows), now, pool)
+                outcomes = write_reschedules(rows, updates, outcomes)
+                self.report.changed += sum(outcome == 'changed' for outcome in outcomes.values())
+                record_reschedule_outcomes(outcomes)
+                db.session.commit()
+                if len(rows) < self.batch_size:
+                    break
+        self.report.elapsed = time.monotonic() - started
+        return self.report
+
+    def plan_batch(self, user_sessions, now, pool):
+        """Return ([{'id', 'scheduled_time'}] updates, {session_id: outcome}) for one claimed batch."""
+        report = self.report
+        history = fetch_study_history(user_sessions.keys(), limit=SOLVER_HISTORY_SIZE)
+        busy = fetch_busy_intervals(user_sessions.keys(), now, now + timedelta(days=self.solver.horizon_days + 1))
+        report.users += len(user_sessions)
+        report.sessions += sum(len(sessions) for sessions in user_sessions.values())
+
+        # Local fast path; only low-confidence plans are worth a model call
+        plans, uncertain = {}, []
+        updates, outcomes = [], {}
+
+        def apply(schedule, outcome):
+            for session_id, new_time in schedule:
+                updates.append({'id': session_id, 'scheduled_time': new_time})
+                outcomes[session_id] = outcome
+
         for user_id, sessions in user_sessions.items():
-            # Get user's completed sessions to analyze patterns
-            user = User.query.get(user_id)
-            completed_sessions = StudySession.query.filter_by(
-                user_id=user_id, 
-                completed=True
-            ).order_by(StudySession.scheduled_time.desc()).limit(10).all()
-            
-            # Extract pattern data
-            pattern_data = []
-            for s in completed_sessions:
-                weekday = s.scheduled_time.strftime("%A")
-                hour = s.scheduled_time.hour
-                pattern_data.append({
-                    "weekday": weekday,
-                    "hour": hour,
-                    "subject": s.subject,
-                    "duration": s.duration
-                })
-            
-            # Missed sessions to reschedule
-            sessions_to_reschedule = []
-            for s in sessions:
-                sessions_to_reschedule.append({
-                    "id": s.id,
-                    "subject": s.subject,
-                    "duration": s.duration,
-                    "original_time": s.scheduled_time.isoformat()
-                })
-            
-            # Only proceed if we have data to analyze
-            if not sessions_to_reschedule:
-                continue
-                
-            # Use AI to suggest new schedule
+            plans[user_id] = self.solver.solve(history[user_id], sessions, busy[user_id], now)
+            if self.use_llm and plans[user_id].confidence < self.min_confidence:
+                uncertain.append(user_id)
+            else:
+                apply(plans[user_id].times.items(), 'solver')
+                report.solver_rescheduled += len(sessions)
+
+        # One model request per user, or several users packed into one prompt within the token budget
+        sections = {user_id: user_section(user_id, history[user_id][:HISTORY_SIZE], user_sessions[user_id])
+                    for user_id in uncertain}
+        if self.token_budget:
+            requests = [[section["user_id"] for section in batch]
+                        for batch in pack_batches(list(sections.values()), self.token_budget, self.max_prompt_users)]
+        else:
+            requests = [[user_id] for user_id in uncertain]
+
+        def timed(user_ids):
+            call_started = time.monotonic()
             try:
-                prompt = f"""
-                You are an AI study coach helping to reschedule missed study sessions.
-                
-                User's completed study session patterns:
-                {pattern_data}
-                
-                Missed study sessions that need rescheduling:
-                {sessions_to_reschedule}
-                
-                Today's date: {now.strftime('%Y-%m-%d')}
-                Current time: {now.strftime('%H:%M')}
-                
-                Please suggest new times for each missed session. Consider:
-                1. User's typical study patterns (day of week, time of day)
-                2. Don't schedule sessions in the past
-                3. Space out multiple sessions reasonably
-                4. Try to keep the subject at a similar time of day as past sessions
-                
-                Return a JSON object with session_id as keys and ISO format datetime strings as values.
-                Example: {{"1": "2025-04-28T18:00:00", "2": "2025-04-29T10:00:00"}}
-                """
-                
-                # Get AI suggestions
-                response = openai_client.chat.completions.create(
-                    model="gpt-4o",
-                    messages=[
-                        {"role": "system", "content": "You are a helpful study schedule assistant."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    response_format={"type": "json_object"}
-                )
-                
-                # Parse the response
-                ai_suggestions = response.choices[0].message.content
-                new_schedule = eval(ai_suggestions)  # Convert string to dict
-                
-                # Update the database with new schedule
-                for session_id, new_time_str in new_schedule.items():
-                    session_id = int(session_id)  # Convert string key to int
-                    new_time = datetime.fromisoformat(new_time_str)
-                    
-                    # Find the session in our list
-                    for session in sessions:
-                        if session.id == session_id:
-                            session.scheduled_time = new_time
-                            db.session.add(session)
-                            print(f"Rescheduled session {session_id} to {new_time}")
-                            break
-                
-                db.session.commit()
-                print(f"[{datetime.now()}] AI Rescheduled {len(new_schedule)} sessions for user {user_id}.")
-                
+                if not self.token_budget:
+                    section = sections[user_ids[0]]
+                    new_schedule, retries = suggest_schedule(section["patterns"], section["missed_sessions"], now,
+                                                             self.limiter, self.max_retries)
+                    return {user_ids[0]: new_schedule}, retries
+                return suggest_batch_schedule([sections[user_id] for user_id in user_ids], now,
+                                              self.limiter, self.max_retries)
+            finally:
+                report.latencies.extend([time.monotonic() - call_started] * len(user_ids))
+
+        futures = {pool.submit(timed, user_ids): user_ids for user_ids in requests}
+        for future in as_completed(futures):
+            user_ids = futures[future]
+            report.requests += 1
+            try:
+                schedules, retries = future.result()
+                report.retries += retries
             except Exception as e:
-                print(f"AI rescheduling error: {str(e)}")
-                # Fallback to simple rescheduling if AI fails
-                for session in sessions:
-                    session.scheduled_time = now + timedelta(days=1)
-                    db.session.add(session)
-                
-                db.session.commit()
-                print(f"[{datetime.now()}] Fallback: Rescheduled {len(sessions)} missed sessions for user {user_id}.")
+                print(f"AI rescheduling error for users {user_ids}: {str(e)}")
+                report.failures += len(user_ids)
+                schedules = {}
+            for user_id in user_ids:
+                # The parser only returns this user's own sessions, at future times
+                new_schedule = schedules.get(user_id, {})
+                apply(new_schedule.items(), 'ai')
+                report.ai_rescheduled += len(new_schedule)
+                # Fall back to the solver's plan for anything the model failed on or skipped
+                rest = [(session_id, new_time) for session_id, new_time in plans[user_id].times.items()
+                        if session_id not in new_schedule]
+                apply(rest, 'fallback')
+                report.fallback_rescheduled += len(rest)
+        return updates, outcomes
+
+
+def ai_reschedule_missed_sessions(app):
+    """Use AI to intelligently reschedule missed study sessions based on user patterns.
+
+    Runs incrementally: only sessions that became overdue since the previous
+    run's watermark, less RESCHEDULE_OVERLAP_MINUTES, are looked at, plus
+    sessions created or moved into the past since then; nothing older than
+    RESCHEDULE_LOOKBACK_DAYS (the whole first run's window). The overlap
+    catches rows another runner had locked (SKIP LOCKED) and rows a failed
+    batch left behind; rescanning is harmless, because rescheduled sessions
+    are no longer overdue and attempts are capped. The watermark only
+    advances when the run finishes, so a crashed run is simply repeated.
+    Returns the run's RescheduleReport; see ReschedulePipeline.
+    """
+    with app.app_context():
+        # scheduled_time is naive local time and updated_at naive UTC; each gets its own clock and watermark
+        now, utc_now = datetime.now(), datetime.utcnow()
+        lookback = timedelta(days=int(app.config.get('RESCHEDULE_LOOKBACK_DAYS', 7)))
+        overlap = timedelta(minutes=int(app.config.get('RESCHEDULE_OVERLAP_MINUTES', 30)))
+        floor = now - lookback
+        watermarks = get_watermarks(RESCHEDULE_JOB, RESCHEDULE_CHANGES_JOB)
+        since, changed_since = floor, None
+        if RESCHEDULE_JOB in watermarks:
+            since = max(watermarks[RESCHEDULE_JOB] - overlap, floor)
+            utc_floor = utc_now - lookback
+            changed_since = max(watermarks.get(RESCHEDULE_CHANGES_JOB, utc_floor) - overlap, utc_floor)
+        report = ReschedulePipeline(app.config).run(now, since, changed_since, floor)
+        set_watermark(RESCHEDULE_JOB, now)
+        set_watermark(RESCHEDULE_CHANGES_JOB, utc_now)
+        db.session.commit()
+        usage_ledger.flush()
+        print(f"[{datetime.now()}] AI rescheduling run since {since}: {report}")
+        return report
+
+_app = None
+
+
+def run_missed_session_rescheduler():
+    """Job entry point for the persistent job store, which can only reference importable functions."""
+    return ai_reschedule_missed_sessions(_app)
+
+
+def run_token_pruning():
+    with _app.app_context():
+        try:
+            deleted = prune_expired_tokens()
+            print(f"[{datetime.now()}] Pruned {deleted} expired refresh tokens and revocations")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Token pruning error: {str(e)}")
+
+
+class SingleRunnerScheduler:
+    """Runs the background jobs in exactly one process across all workers and replicas.
+
+    Every process runs a small election thread; whichever holds the leader
+    lock runs a BackgroundScheduler whose jobs live in the database
+    (apscheduler_jobs), so next run times survive restarts and leader
+    changes. A process that loses the lock shuts its scheduler down.
+    """
+
+    def __init__(self, engine, lock, jobs, renew_interval=20):
+        self.engine = engine
+        self.jobs = jobs
+        self.lock = lock
+        self.renew_interval = renew_interval
+        self.scheduler = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @property
+    def is_leader(self):
+        return self.scheduler is not None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='scheduler-election', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._step_down()
+        self.lock.release()
+
+    def step(self):
+        """One election round: take or renew the lock and start or stop the scheduler to match."""
+        try:
+            leader = self.lock.acquire()
+        except Exception as e:
+            print(f"Scheduler lock error: {str(e)}")
+            leader = False
+        if leader and self.scheduler is None:
+            self.scheduler = self._build_scheduler()
+            print(f"Background scheduler started as leader ({self.lock.owner}).")
+        elif not leader and self.scheduler is not None:
+            self._step_down()
+            print(f"Background scheduler stopped; leadership lost ({self.lock.owner}).")
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self.step()
+            self._stopped.wait(self.renew_interval)
+
+    def _build_scheduler(self):
+        scheduler = BackgroundScheduler(
+            jobstores={'default': SQLAlchemyJobStore(engine=self.engine)},
+            job_defaults={'coalesce': True, 'max_instances': 1, 'misfire_grace_time': 3600}
+        )
+        # Start paused so existing jobs keep their persisted next run time
+        scheduler.start(paused=True)
+        for job_id, func, minutes in self.jobs:
+            job = scheduler.get_job(job_id)
+            if job is None:
+                scheduler.add_job(func, 'interval', minutes=minutes, id=job_id)
+            elif job.trigger.interval != timedelta(minutes=minutes):
+                scheduler.reschedule_job(job_id, trigger='interval', minutes=minutes)
+        scheduler.resume()
+        return scheduler
+
+    def _step_down(self):
+        if self.scheduler is not None:
+            self.scheduler.shutdown(wait=False)
+            self.scheduler = None
+
+
+def scheduled_jobs(config):
+    """(job id, function reference, interval in minutes) for every background job."""
+    return [
+        ('study_reminder', 'backend.utils.scheduler:send_study_reminder', 60),
+        (RESCHEDULE_JOB, 'backend.utils.scheduler:run_missed_session_rescheduler',
+         int(config.get('RESCHEDULE_INTERVAL_MINUTES', 5))),
+        ('prune_expired_tokens', 'backend.utils.scheduler:run_token_pruning', 60),
+    ]
+
 
 # Start the scheduler
 def start_scheduler(app):
-    scheduler = BackgroundScheduler()
-    scheduler.add_job(send_study_reminder, 'interval', minutes=60)  # Runs every hour
-    scheduler.add_job(ai_reschedule_missed_sessions, 'interval', minutes=1440, args=[app])  # Runs daily
+    """Start background jobs according to SCHEDULER_MODE.
+
+    'cluster' (the default) elects one runner across all processes sharing
+    the database, 'local' runs them in this process (only for a single
+    worker: every process would run every job), 'off' starts nothing.
+    """
+    global _app
+    _app = app
+    mode = app.config.get('SCHEDULER_MODE', 'cluster')
+    if mode == 'off':
+        print("Background scheduler disabled.")
+        return None
+
+    if mode == 'cluster':
+        ttl = int(app.config.get('SCHEDULER_LOCK_TTL', 60))
+        with app.app_context():
+            engine = db.engine
+        runner = SingleRunnerScheduler(engine, leader_lock_for(engine, 'background-scheduler', ttl),
+                                       scheduled_jobs(app.config), renew_interval=max(ttl // 3, 1))
+        print("Background scheduler waiting for leadership.")
+        return runner.start()
+
+    scheduler = BackgroundScheduler(job_defaults={'coalesce': True, 'max_instances': 1})
+    for job_id, func, minutes in scheduled_jobs(app.config):
+        scheduler.add_job(func, 'interval', minutes=minutes, id=job_id)
     scheduler.start()
-    print("Background scheduler started.")
\ No newline at end of file
+    print("Background scheduler started.")
+    return scheduler
@@ -0,0 +1,287 @@
+# backend/utils/tokens.py
+import hashlib
+import hmac
+import secrets
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import jwt
+from flask import current_app
+from sqlalchemy.orm import make_transient_to_detached
+from backend.database.models import RefreshToken, RevokedToken, User, db
+from backend.utils.revocation import get_revocation_list, user_key
+
+# Columns kept for cached users; anything else (e.g. the password hash) loads on first access
+USER_CACHE_COLUMNS = ('id', 'username', 'email', 'created_at')
+
+
+class InvalidRefreshToken(Exception):
+    """Refresh token unknown, expired, revoked or already used."""
+
+
+def parse_signing_keys(spec):
+    """'2024-06=secret1,2024-09=secret2' -> {'2024-06': 'secret1', '2024-09': 'secret2'}."""
+    keys = {}
+    for item in (spec or '').split(','):
+        if item.strip():
+            kid, _, secret = item.strip().partition('=')
+            if not secret:
+                raise ValueError(f"JWT signing key {kid!r} has no secret; use kid=secret")
+            keys[kid] = secret
+    return keys
+
+
+class TokenVerifier:
+    """HS256 tokens with key rotation and an LRU of tokens already verified.
+
+    `keys` maps kid -> secret. New tokens are signed with `active_kid` and
+    carry it in their header; tokens without a kid (issued before rotation
+    was configured) are checked against `legacy_secret`. To rotate, add a
+    new kid, make it active, and drop the old one once its tokens expired.
+
+    A verified token is remembered by its signature until its `exp`, so
+    repeat requests with the same token skip the HMAC and claim checks.
+    """
+
+    def __init__(self, keys=None, active_kid=None, legacy_secret=None, max_entries=10000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.set_keys(keys or {}, active_kid, legacy_secret)
+
+    def set_keys(self, keys, active_kid=None, legacy_secret=None):
+        if active_kid is not None and active_kid not in keys:
+            raise ValueError(f"Active JWT key {active_kid!r} is not among the signing keys")
+        if active_kid is None and legacy_secret is None:
+            raise ValueError("No JWT signing key configured")
+        with self._lock:
+            self.keys = dict(keys)
+            self.active_kid = active_kid
+            self.legacy_secret = legacy_secret
+            # Tokens signed with a retired key stop working immediately, cached or not
+            for signature, entry in list(self._entries.items()):
+                if self._secret(entry[3]) is None:
+                    del self._entries[signature]
+
+    def _secret(self, kid):
+        return self.legacy_secret if kid is None else self.keys.get(kid)
+
+    def encode(self, payload):
+        if self.active_kid is None:
+            return jwt.encode(payload, self.legacy_secret, algorithm='HS256')
+        return jwt.encode(payload, self.keys[self.active_kid], algorithm='HS256', headers={'kid': self.active_kid})
+
+    def verify(self, token):
+        """Return the token's claims; raises jwt.ExpiredSignatureError / jwt.InvalidTokenError like jwt.decode."""
+        signature = token.rpartition('.')[2]
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(signature)
+            if entry is not None and hmac.compare_digest(entry[0], token):
+                if entry[2] > now:
+                    self._entries.move_to_end(signature)
+                    return entry[1]
+                del self._entries[signature]
+                raise jwt.ExpiredSignatureError('Signature has expired')
+
+        kid = jwt.get_unverified_header(token).get('kid')
+        secret = self._secret(kid)
+        if secret is None:
+            raise jwt.InvalidTokenError(f"Unknown signing key {kid!r}")
+        claims = jwt.decode(token, secret, algorithms=['HS256'])
+        expires = claims['exp'] if isinstance(claims.get('exp'), (int, float)) else float('inf')
+        with self._lock:
+            if self._secret(kid) == secret:  # not rotated out meanwhile
+                self._entries[signature] = (token, claims, expires, kid)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return claims
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class UserCache:
+    """Per-worker user_id -> detached User snapshot, kept `ttl` seconds.
+
+    get() merges the snapshot into the current session without a query, so
+    handlers get a normal User. Changes made by other workers show up once
+    the entry expires; call invalidate() after changing a user here.
+    """
+
+    def __init__(self, max_entries=10000, ttl=30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(user_id)
+                return db.session.merge(entry[0], load=False)
+        user = db.session.get(User, user_id)
+        if user is not None:
+            snapshot = User(**{column: getattr(user, column) for column in USER_CACHE_COLUMNS})
+            make_transient_to_detached(snapshot)
+            with self._lock:
+                self._entries[user_id] = (snapshot, time.monotonic() + self.ttl)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return user
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_verifier = None
+_user_cache = None
+_init_lock = threading.Lock()
+
+
+def get_token_verifier():
+    global _verifier
+    if _verifier is None:
+        with _init_lock:
+            if _verifier is None:
+                config = current_app.config
+                _verifier = TokenVerifier(
+                    keys=parse_signing_keys(config.get('JWT_SIGNING_KEYS')),
+                    active_kid=config.get('JWT_ACTIVE_KID') or None,
+                    legacy_secret=config.get('JWT_SECRET_KEY') or 'default_secret_key',
+                    max_entries=int(config.get('JWT_VERIFY_CACHE_SIZE', 10000)),
+                )
+    return _verifier
+
+
+def get_user_cache():
+    global _user_cache
+    if _user_cache is None:
+        with _init_lock:
+            if _user_cache is None:
+                config = current_app.config
+                _user_cache = UserCache(int(config.get('USER_CACHE_SIZE', 10000)),
+                                        float(config.get('USER_CACHE_TTL', 30)))
+    return _user_cache
+
+
+def _lifetimes():
+    config = current_app.config
+    return (timedelta(seconds=int(config.get('JWT_ACCESS_SECONDS', 900))),
+            timedelta(seconds=int(config.get('JWT_REFRESH_SECONDS', 30 * 24 * 60 * 60))))
+
+
+def _hash(refresh_token):
+    return hashlib.sha256(refresh_token.encode()).hexdigest()
+
+
+def issue_tokens(user, family_id=None):
+    """Sign a short-lived access token and add a refresh token row for it (the caller commits)."""
+    access_lifetime, refresh_lifetime = _lifetimes()
+    now = datetime.utcnow()
+    jti = uuid.uuid4().hex
+    access_token = get_token_verifier().encode({
+        'user_id': user.id,
+        'username': user.username,
+        'jti': jti,
+        'iat': now,
+        'exp': now + access_lifetime,
+    })
+    refresh_token = secrets.token_urlsafe(32)
+    db.session.add(RefreshToken(user_id=user.id, family_id=family_id or uuid.uuid4().hex,
+                                token_hash=_hash(refresh_token), access_jti=jti, expires_at=now + refresh_lifetime))
+    return {'token': access_token, 'refresh_token': refresh_token,
+            'expires_in': int(access_lifetime.total_seconds())}
+
+
+def rotate_refresh_token(refresh_token):
+    """Spend a refresh token and return new tokens for its user (the caller commits).
+
+    Presenting a token that was already spent means it leaked: the whole
+    family, and the access tokens issued from it, are revoked before
+    InvalidRefreshToken is raised, so the caller must commit then too.
+    """
+    now = datetime.utcnow()
+    row = RefreshToken.query.filter_by(token_hash=_hash(refresh_token)).first()
+    if row is None or row.revoked_at is not None or row.expires_at <= now:
+        raise InvalidRefreshToken('Refresh token is invalid or expired')
+
+    # Conditional update so two concurrent refreshes can't both spend the token
+    spent = (db.session.query(RefreshToken)
+             .filter(RefreshToken.id == row.id, RefreshToken.used_at.is_(None))
+             .update({RefreshToken.used_at: now}, synchronize_session=False))
+    if not spent:
+        print(f"Refresh token reuse for user {row.user_id}; revoking token family {row.family_id}")
+        revoke_family(row.family_id)
+        raise InvalidRefreshToken('Refresh token was already used')
+
+    user = db.session.get(User, row.user_id)
+    if user is None:
+        raise InvalidRefreshToken('User no longer exists')
+    return issue_tokens(user, family_id=row.family_id)
+
+
+def revoke_family(family_id):
+    """Revoke every refresh token of one login and the access tokens still live from it (the caller commits)."""
+    access_lifetime, _ = _lifetimes()
+    now = datetime.utcnow()
+    live_jtis = [jti for (jti,) in (db.session.query(RefreshToken.access_jti)
+                                    .filter(RefreshToken.family_id == family_id,
+                                            RefreshToken.access_jti.isnot(None),
+                                            RefreshToken.created_at > now - access_lifetime))]
+    (db.session.query(RefreshToken)
+     .filter(RefreshToken.family_id == family_id, RefreshToken.revoked_at.is_(None))
+     .update({RefreshToken.revoked_at: now}, synchronize_session=False))
+    revocations = get_revocation_list()
+    for jti in live_jtis:
+        revocations.revoke(jti, now + access_lifetime)
+
+
+def revoke_refresh_token(refresh_token):
+    """Revoke the family of a refresh token if it is known; returns whether it was."""
+    row = RefreshToken.query.filter_by(token_hash=_hash(refresh_token)).first()
+    if row is None:
+        return False
+    revoke_family(row.family_id)
+    return True
+
+
+def revoke_user(user_id):
+    """Sign a user out everywhere, e.g. on suspension: refresh tokens and every access token issued so far."""
+    access_lifetime, _ = _lifetimes()
+    now = datetime.utcnow()
+    (db.session.query(RefreshToken)
+     .filter(RefreshToken.user_id == user_id, RefreshToken.revoked_at.is_(None))
+     .update({RefreshToken.revoked_at: now}, synchronize_session=False))
+    get_revocation_list().revoke(user_key(user_id), now + access_lifetime)
+
+
+def prune_expired_tokens():
+    """Delete refresh tokens and revocations nobody can present any more; returns rows deleted."""
+    now = datetime.utcnow()
+    deleted = RefreshToken.query.filter(RefreshToken.expires_at <= now).delete(synchronize_session=False)
+    deleted += RevokedToken.query.filter(RevokedToken.expires_at <= now).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
+
+
+class TokenRevoked(jwt.InvalidTokenError):
+    """Access token signed correctly but revoked (logout, refresh token reuse or user cut-off)."""
+
+
+def verify_access_token(token):
+    """Claims of a valid, unrevoked access token; raises jwt.InvalidTokenError subclasses otherwise."""
+    claims = get_token_verifier().verify(token)
+    if get_revocation_list().is_revoked(claims):
+        raise TokenRevoked('Token has been revoked')
+    return claims
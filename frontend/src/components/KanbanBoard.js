@@ -102,7 +102,7 @@ const KanbanBoard = () => {
     
     try {
       console.log("Fetching tasks...");
-      const response = await getTasks();
+      const response = await getTasks(localStorage.getItem('user_id'));
       console.log("Raw tasks data:", response);
       
       // Create a new empty object for grouped tasks
@@ -36,6 +36,8 @@ const StudyPlanner = ({ user }) => {
   const [newSession, setNewSession] = useState({ subject: '', start: '', end: '' });
   const modalRef = useRef();
   const [todoTasks, setTodoTasks] = useState([]);
+  const visibleRange = useRef(null); // { start, end } of the dates the calendar shows
+  const latestFetch = useRef(0);
 
   const fetchTodoTasks = async () => {
     try {
@@ -51,9 +53,21 @@ const StudyPlanner = ({ user }) => {
 
 
   const fetchSessions = async () => {
+    if (!visibleRange.current) return; // the calendar reports its range once it has rendered
+    const fetchId = ++latestFetch.current;
     try {
-      const res = await API.get(`/study_sessions/${user.user_id}`);
-      const data = res.data;
+      // Only the visible range is loaded; it is paginated, so follow the cursor to its last page
+      const { start, end } = visibleRange.current;
+      let data = [];
+      let cursor = null;
+      do {
+        const res = await API.get(`/study_sessions/${user.user_id}`, {
+          params: { from: start.toISOString(), to: end.toISOString(), ...(cursor ? { cursor } : {}) }
+        });
+        data = data.concat(res.data);
+        cursor = res.headers['x-next-cursor'];
+      } while (cursor);
+      if (fetchId !== latestFetch.current) return; // the user has already moved to another range
       const events = data.map((s) => ({
         id: s.id,
         title: s.subject,
@@ -73,10 +87,15 @@ const StudyPlanner = ({ user }) => {
   };
 
   useEffect(() => {
-    fetchSessions();
     fetchTodoTasks();
   }, []);
 
+  // Called on the first render and whenever the user navigates or switches views
+  const handleDatesSet = (arg) => {
+    visibleRange.current = { start: arg.start, end: arg.end };
+    fetchSessions();
+  };
+
   const handleDateClick = (arg) => {
     setSelectedSession(null);
     setNewSession({ subject: '', start: arg.dateStr, end: arg.dateStr });
@@ -267,6 +286,7 @@ const StudyPlanner = ({ user }) => {
           }}
           editable={true}
           events={sessions}
+          datesSet={handleDatesSet}
           dateClick={handleDateClick}
           eventDrop={handleEventDrop}
           eventDidMount={(info) => {
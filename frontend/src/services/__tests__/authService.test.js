@@ -63,6 +63,20 @@ describe('authService', () => {
     expect(result).toBe(true);
   });
 
+  test('login keeps the refresh token and logout revokes it', async () => {
+    API.post.mockImplementation(() => Promise.resolve({
+      data: { ...mockResponseData, refresh_token: 'fake-refresh-token' },
+      status: 200
+    }));
+    await authService.login({ email: mockUserData.email, password: mockUserData.password });
+    expect(localStorage.getItem('refreshToken')).toBe('fake-refresh-token');
+
+    expect(authService.logout()).toBe(true);
+    expect(API.post).toHaveBeenLastCalledWith('/auth/logout', { refresh_token: 'fake-refresh-token' });
+    expect(localStorage.getItem('refreshToken')).toBeNull();
+    expect(localStorage.getItem('token')).toBeNull();
+  });
+
   test('isAuthenticated returns true when token exists', () => {
     // Set a token
     localStorage.setItem('token', mockToken);
@@ -38,6 +38,12 @@ describe('chatService', () => {
     expect(result).toEqual(mockResponse);
   });
 
+  test('askAI sends the thread id when continuing a conversation', async () => {
+    await chatService.askAI({ message: mockMessage }, 42);
+
+    expect(API.post).toHaveBeenCalledWith('/chat/', { message: mockMessage, thread_id: 42 });
+  });
+
   test('extractSchedulePlan calls API with correct data and system prompt', async () => {
     // Override the default mock for this specific test
     API.post.mockImplementationOnce(() => Promise.resolve({ 
@@ -17,7 +17,43 @@ API.interceptors.request.use(config => {
   return config;
 });
 
+// One refresh at a time, shared by every request that got a 401 meanwhile
+let refreshing = null;
+
+const refreshAccessToken = () => {
+  if (!refreshing) {
+    const refreshToken = localStorage.getItem('refreshToken');
+    refreshing = API.post('/auth/refresh', { refresh_token: refreshToken })
+      .then(({ data }) => {
+        localStorage.setItem('token', data.token);
+        localStorage.setItem('refreshToken', data.refresh_token);
+        return data.token;
+      })
+      .catch((refreshError) => {
+        localStorage.removeItem('token');
+        localStorage.removeItem('refreshToken');
+        throw refreshError;
+      })
+      .finally(() => {
+        refreshing = null;
+      });
+  }
+  return refreshing;
+};
+
 API.interceptors.response.use(null, async (error) => {
+  const originalRequest = error.config;
+
+  // Access tokens are short-lived: renew once with the refresh token and replay the request
+  if (error.response && error.response.status === 401 && originalRequest &&
+      !originalRequest._refreshed && !['/auth/login', '/auth/refresh'].includes(originalRequest.url) &&
+      localStorage.getItem('refreshToken')) {
+    originalRequest._refreshed = true;
+    const token = await refreshAccessToken();
+    originalRequest.headers.Authorization = `Bearer ${token}`;
+    return API(originalRequest);
+  }
+
   // If the error is a resource error, delay and retry once
   if (error.message === 'Network Error' || 
       error.code === 'ERR_INSUFFICIENT_RESOURCES') {
@@ -26,9 +62,6 @@ API.interceptors.response.use(null, async (error) => {
     // Wait 2 seconds
     await new Promise(resolve => setTimeout(resolve, 2000));
     
-    // Get the original request configuration
-    const originalRequest = error.config;
-    
     // Only retry once
     if (!originalRequest._retry) {
       originalRequest._retry = true;
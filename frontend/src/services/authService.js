@@ -10,6 +10,7 @@ export const getToken = () => {
 
 export const removeToken = () => {
   localStorage.removeItem('token');
+  localStorage.removeItem('refreshToken');
 };
 
 export const register = async (userData) => {
@@ -29,11 +30,20 @@ export const login = async (userData) => {
   if (response.data.token) {
     setToken(response.data.token);
   }
+  if (response.data.refresh_token) {
+    localStorage.setItem('refreshToken', response.data.refresh_token);
+  }
   return response.data;
 };
 
 export const logout = () => {
-  localStorage.removeItem('token');
+  // Revoke server-side too; the local sign-out doesn't wait for it
+  const refreshToken = localStorage.getItem('refreshToken');
+  if (getToken() || refreshToken) {
+    Promise.resolve(API.post('/auth/logout', refreshToken ? { refresh_token: refreshToken } : {}))
+      .catch(() => {});
+  }
+  removeToken();
   return true;
 };
 
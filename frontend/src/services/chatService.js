@@ -1,7 +1,29 @@
 import API from './api';
 
-export const askAI = async (messageData) => {
-  const response = await API.post('/chat/', messageData);
+// Pass a threadId (from startThread) to continue a conversation the server remembers
+export const askAI = async (messageData, threadId) => {
+  const payload = threadId ? { ...messageData, thread_id: threadId } : messageData;
+  const response = await API.post('/chat/', payload);
+  return response.data;
+};
+
+export const startThread = async (title) => {
+  const response = await API.post('/chat/threads', title ? { title } : {});
+  return response.data;
+};
+
+export const getThreads = async () => {
+  const response = await API.get('/chat/threads');
+  return response.data;
+};
+
+export const getThread = async (threadId) => {
+  const response = await API.get(`/chat/threads/${threadId}`);
+  return response.data;
+};
+
+export const deleteThread = async (threadId) => {
+  const response = await API.delete(`/chat/threads/${threadId}`);
   return response.data;
 };
 
@@ -49,11 +49,20 @@ export const getGroupMembers = async (groupId) => {
 
 import API from './api';
 
+// Follow X-Next-Offset until the last page so long listings come back whole
+const getAllPages = async (url, params = {}) => {
+  const items = [];
+  let offset = 0;
+  while (offset !== undefined) {
+    const response = await API.get(url, { params: { ...params, offset } });
+    items.push(...response.data);
+    offset = response.headers['x-next-offset'];
+  }
+  return items;
+};
+
 export const getMyGroups = async (user_id) => {
-  const response = await API.get('/groups/my', {
-    params: { user_id }
-  });
-  return response.data;
+  return getAllPages('/groups/my', { user_id });
 };
 
 export const joinGroup = async (user_id, join_code) => {
@@ -88,6 +97,5 @@ export const getGroupStudySessions = async (groupId) => {
 };
 
 export const getGroupMembers = async (groupId) => {
-  const response = await API.get(`/groups/${groupId}/members`);
-  return response.data;
+  return getAllPages(`/groups/${groupId}/members`);
 };
\ No newline at end of file
@@ -51,4 +51,15 @@ export const deleteTask = async (taskId) => {
     console.error("API error in deleteTask:", error);
     throw error;
   }
-};
\ No newline at end of file
+};
+// Apply several create/update/move/delete ops in one request and one transaction,
+// e.g. [{ op: 'move', id: 7, status: 'done', after_id: 3 }, { op: 'delete', id: 9 }]
+export const batchTasks = async (ops) => {
+  try {
+    const response = await API.post('/kanban/batch', { ops });
+    return response.data.results;
+  } catch (error) {
+    console.error("API error in batchTasks:", error);
+    throw error;
+  }
+};
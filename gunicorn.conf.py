@@ -0,0 +1,9 @@
+import os
+
+# Streaming chat responses hold a connection open for the length of a completion.
+# Threaded workers let those connections park on a thread instead of a whole process.
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+worker_class = 'gthread'
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+threads = int(os.getenv('GUNICORN_THREADS', '32'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))